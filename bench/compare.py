@@ -0,0 +1,28 @@
+import json
+import sys
+
+import prettytable as pt
+
+
+def _seconds(result):
+    # У повторяемых сценариев сравниваем медиану, у разовых - полное время
+    return result.get("median", result.get("seconds"))
+
+
+def compare(before_path, after_path):
+    with open(before_path, encoding='utf-8') as before_file, open(after_path, encoding='utf-8') as after_file:
+        before, after = json.load(before_file), json.load(after_file)
+
+    table = pt.PrettyTable(['Сценарий', 'До, с', 'После, с', 'Изменение'])
+    for name in sorted(set(before["scenarios"]) | set(after["scenarios"])):
+        old = _seconds(before["scenarios"].get(name, {}))
+        new = _seconds(after["scenarios"].get(name, {}))
+        change = f"{(new - old) / old * 100:+.1f}%" if old and new is not None else ''
+        table.add_row([name, '' if old is None else f"{old:.4f}", '' if new is None else f"{new:.4f}", change])
+
+    print(f"{before['commit']} -> {after['commit']} ({after['size']}, seed {after['seed']})")
+    print(table)
+
+
+if __name__ == "__main__":
+    compare(*sys.argv[1:3])
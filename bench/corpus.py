@@ -0,0 +1,148 @@
+import random
+from datetime import datetime, timedelta
+
+from utils.parser_pool import ParsedSentence, ParsedToken
+
+CORPUS_SIZES = {'1k': 1000, '100k': 100000, '10m': 10000000}
+
+TEXT_TOKENS = 5000  # Примерный размер одного синтетического текста
+CHUNK_SENTENCES = 200  # Столько предложений отдаётся TextWriter за раз, как один чанк разбора
+CORPUS_START = datetime(2024, 1, 1, 12, 0)
+
+# Небольшой словарь с правдоподобными формами, редкие слова досинтезируются из слогов
+FEMININE_STEMS = ['работ', 'школ', 'газет', 'машин', 'комнат', 'улиц', 'страниц', 'погод', 'минут', 'карт']
+FEMININE_ENDINGS = ['а', 'ы', 'у', 'ой', 'е']
+MASCULINE_STEMS = ['стол', 'дом', 'город', 'мир', 'народ', 'вопрос', 'ответ', 'завод', 'урок', 'отдел']
+MASCULINE_ENDINGS = ['', 'а', 'у', 'ом', 'е']
+VERBS = [
+    ('читать', ['читает', 'читают', 'читал', 'читала']),
+    ('писать', ['пишет', 'пишут', 'писал', 'писала']),
+    ('делать', ['делает', 'делают', 'делал', 'делала']),
+    ('знать', ['знает', 'знают', 'знал', 'знала']),
+    ('видеть', ['видит', 'видят', 'видел', 'видела']),
+    ('строить', ['строит', 'строят', 'строил', 'строила']),
+    ('искать', ['ищет', 'ищут', 'искал', 'искала']),
+    ('любить', ['любит', 'любят', 'любил', 'любила']),
+    ('изучать', ['изучает', 'изучают', 'изучал', 'изучала']),
+    ('открывать', ['открывает', 'открывают', 'открывал', 'открывала']),
+]
+ADJECTIVE_STEMS = ['нов', 'стар', 'красив', 'важн', 'перв', 'прост', 'русск', 'светл']
+ADJECTIVE_ENDINGS = ['ый', 'ая', 'ое', 'ые', 'ого', 'ой']
+ADVERBS = ['быстро', 'долго', 'часто', 'снова', 'сегодня', 'всегда']
+PREPOSITIONS = ['в', 'на', 'о', 'с', 'у', 'за']
+PRONOUNS = ['он', 'она', 'мы', 'они']
+SYLLABLES = ['ка', 'ро', 'ми', 'ту', 'ле', 'на', 'за', 'во', 'пи', 'ру', 'ше', 'да']
+
+
+class CorpusText:
+    def __init__(self, number, user_index, time, chunks):
+        self.number = number
+        self.user_index = user_index
+        self.time = time
+        self.chunks = chunks  # Списки ParsedSentence с номерами токенов, сквозными внутри чанка
+
+    @property
+    def text(self):
+        return '\n'.join(sent.text for chunk in self.chunks for sent in chunk)
+
+
+class CorpusGenerator:
+    # Один и тот же seed всегда даёт один и тот же корпус, поэтому прогоны сравнимы между коммитами
+    def __init__(self, seed=0):
+        self.rng = random.Random(seed)
+
+    def _zipf(self, items):
+        return self.rng.choices(items, weights=[1 / (rank + 1) for rank in range(len(items))])[0]
+
+    def _noun(self):
+        if self.rng.random() < 0.05:
+            stem = ''.join(self.rng.choice(SYLLABLES) for _ in range(self.rng.randint(2, 4)))
+            return stem + self.rng.choice(FEMININE_ENDINGS), stem + 'а'
+        if self.rng.random() < 0.5:
+            stem = self._zipf(FEMININE_STEMS)
+            return stem + self.rng.choice(FEMININE_ENDINGS), stem + 'а'
+        stem = self._zipf(MASCULINE_STEMS)
+        return stem + self.rng.choice(MASCULINE_ENDINGS), stem
+
+    def _adjective(self):
+        stem = self._zipf(ADJECTIVE_STEMS)
+        return stem + self.rng.choice(ADJECTIVE_ENDINGS), stem + 'ый'
+
+    def _sentence_words(self):
+        # (слово, лемма, часть речи, роль, номер главного слова) в порядке текста
+        words = []
+
+        def add(word, lemma, pos, dep, head):
+            words.append([word, lemma, pos, dep, head])
+            return len(words) - 1
+
+        def noun_group(dep, verb):
+            if self.rng.random() < 0.3:
+                preposition = self.rng.choice(PREPOSITIONS)
+                case = add(preposition, preposition, 'ADP', 'case', None)
+            else:
+                case = None
+            adjective = add(*self._adjective(), 'ADJ', 'amod', None) if self.rng.random() < 0.5 else None
+            noun = add(*self._noun(), 'NOUN', dep if case is None else 'obl', verb)
+            for child in (case, adjective):
+                if child is not None:
+                    words[child][4] = noun
+
+        if self.rng.random() < 0.3:
+            pronoun = self.rng.choice(PRONOUNS)
+            subject = [add(pronoun, pronoun, 'PRON', 'nsubj', None)]
+        else:
+            first = len(words)
+            noun_group('nsubj', None)
+            subject = list(range(first, len(words)))
+        if self.rng.random() < 0.3:
+            adverb = self.rng.choice(ADVERBS)
+            subject.append(add(adverb, adverb, 'ADV', 'advmod', None))
+        lemma, forms = self._zipf(VERBS)
+        verb = add(self.rng.choice(forms), lemma, 'VERB', 'ROOT', None)
+        words[verb][4] = verb
+        for index in subject:
+            if words[index][4] is None:
+                words[index][4] = verb
+        for _ in range(self.rng.randint(1, 3)):
+            first = len(words)
+            noun_group('obj', verb)
+            for index in range(first, len(words)):
+                if words[index][4] is None:
+                    words[index][4] = verb
+        add('.', '.', 'PUNCT', 'punct', verb)
+        return words
+
+    def sentence(self, first_token):
+        words = self._sentence_words()
+        words[0][0] = words[0][0].capitalize()
+
+        text = ''
+        tokens = []
+        for index, (word, lemma, pos, dep, head) in enumerate(words):
+            if text and pos != 'PUNCT':
+                text += ' '
+            tokens.append(ParsedToken(word, pos, dep, lemma, first_token + head, first_token + index, len(text)))
+            text += word
+        return ParsedSentence(text, tokens)
+
+    def texts(self, total_tokens, users=10):
+        produced = 0
+        number = 0
+        while produced < total_tokens:
+            chunks = []
+            text_tokens = 0
+            target = min(TEXT_TOKENS, total_tokens - produced)
+            while text_tokens < target:
+                chunk = []
+                chunk_tokens = 0
+                while len(chunk) < CHUNK_SENTENCES and text_tokens + chunk_tokens < target:
+                    sent = self.sentence(chunk_tokens)
+                    chunk.append(sent)
+                    chunk_tokens += len(sent.tokens)
+                chunks.append(chunk)
+                text_tokens += chunk_tokens
+            # Тексты распределены по пользователям и по дням года для графиков по времени
+            yield CorpusText(number, number % users, CORPUS_START + timedelta(days=number % 365), chunks)
+            produced += text_tokens
+            number += 1
@@ -0,0 +1,73 @@
+import logging
+import time
+from uuid import uuid4
+
+from sqlalchemy.dialects.postgresql import insert
+
+from bench.corpus import CorpusGenerator
+from db.bulk import INGEST_WRITER
+from db.database import async_session, UserInfo
+from utils.ingest import INGEST_FLUSH_SENTENCES, TextWriter
+from utils.render_cache import bump_data_version
+
+logger = logging.getLogger(__name__)
+
+# Синтетические пользователи в конце диапазона user_id: колонки integer, поэтому id не больше 2**31 - 1
+BENCH_USER_BASE = 2_000_000_000
+
+
+class LoadResult:
+    def __init__(self):
+        self.texts = 0
+        self.sentences = 0
+        self.tokens = 0
+        self.seconds = 0.0
+        self.text_ids = []
+
+    @property
+    def rows(self):
+        # sentence + sentence_to_text + token
+        return 2 * self.sentences + self.tokens
+
+    def as_dict(self):
+        return {
+            "writer": INGEST_WRITER,
+            "texts": self.texts,
+            "sentences": self.sentences,
+            "tokens": self.tokens,
+            "seconds": self.seconds,
+            "rows_per_sec": self.rows / self.seconds if self.seconds else None,
+            "tokens_per_sec": self.tokens / self.seconds if self.seconds else None,
+        }
+
+
+async def load_corpus(total_tokens, seed=0, users=10):
+    if BENCH_USER_BASE + users > 2 ** 31:
+        raise ValueError(f"Слишком много синтетических пользователей: {users}")
+    # Разбор заранее известен, поэтому замеряется только запись в базу тем же TextWriter, что и у бота
+    result = LoadResult()
+    async with async_session() as session:
+        await session.execute(insert(UserInfo)
+                              .values([{"user_id": BENCH_USER_BASE + index, "user_name": f"bench_{index}"}
+                                       for index in range(users)])
+                              .on_conflict_do_nothing(index_elements=['user_id']))
+        await session.commit()
+
+        started = time.perf_counter()
+        for corpus_text in CorpusGenerator(seed).texts(total_tokens, users):
+            text_id = uuid4()
+            writer = TextWriter(session, text_id, BENCH_USER_BASE + corpus_text.user_index, corpus_text.time)
+            for chunk in corpus_text.chunks:
+                writer.add(chunk)
+                result.sentences += len(chunk)
+                result.tokens += sum(len(sent.tokens) for sent in chunk)
+                if writer.pending >= INGEST_FLUSH_SENTENCES:
+                    await writer.flush()
+            await writer.flush()
+            result.texts += 1
+            result.text_ids.append((text_id, BENCH_USER_BASE + corpus_text.user_index, corpus_text.time))
+        await bump_data_version(session)
+        result.seconds = time.perf_counter() - started
+
+    logger.info("Корпус загружен: %d текстов, %d токенов за %.1f с", result.texts, result.tokens, result.seconds)
+    return result
@@ -0,0 +1,119 @@
+import argparse
+import asyncio
+import json
+import logging
+import time
+from collections import Counter
+
+from bench.corpus import CorpusGenerator
+from utils.ingest import split_into_chunks
+from utils.parser_pool import PARSE_PROFILES, ParserPool, resolve_profile
+
+LABELS = ('pos', 'dep', 'las', 'lemma')
+
+
+async def parse_with_profile(name, chunks, workers):
+    pool = ParserPool(name, workers=workers)
+    # Загрузка модели в замер не входит
+    await pool.start()
+    try:
+        batches = [chunks[start:start + pool.batch_size] for start in range(0, len(chunks), pool.batch_size)]
+        started = time.perf_counter()
+        results = await asyncio.gather(*(pool.parse_many(batch) for batch in batches))
+        seconds = time.perf_counter() - started
+    finally:
+        pool.shutdown()
+
+    parsed = [doc for batch in results for doc in batch]
+    tokens = sum(len(sent.tokens) for doc in parsed for sent in doc)
+    return parsed, {"model": pool.model_name, "exclude": list(pool.exclude), "batch_size": pool.batch_size,
+                    "tokens": tokens, "seconds": seconds, "tokens_per_sec": tokens / seconds}
+
+
+def agreement(parsed, reference):
+    # Токенизатор у русских моделей общий, поэтому токены сопоставляются по номеру в чанке
+    counts = Counter()
+    for doc, reference_doc in zip(parsed, reference):
+        reference_tokens = {token.i: token for sent in reference_doc for token in sent.tokens}
+        for sent in doc:
+            for token in sent.tokens:
+                other = reference_tokens.get(token.i)
+                if other is None or other.text != token.text:
+                    counts['unaligned'] += 1
+                    continue
+                counts['tokens'] += 1
+                counts['pos'] += token.pos == other.pos
+                counts['dep'] += token.dep == other.dep
+                counts['las'] += token.dep == other.dep and token.head == other.head
+                counts['lemma'] += token.lemma == other.lemma
+
+    aligned = counts['tokens']
+    result = {label: counts[label] / aligned if aligned else 0.0 for label in LABELS}
+    result["aligned"] = aligned / (aligned + counts['unaligned']) if aligned else 0.0
+    return result
+
+
+def load_sample(args):
+    if args.sample:
+        with open(args.sample, encoding='utf-8') as sample:
+            return sample.read()
+    return '\n'.join(corpus_text.text for corpus_text in CorpusGenerator(args.seed).texts(args.tokens))
+
+
+async def run(args):
+    profiles = args.profiles or [name for name in PARSE_PROFILES if name != args.reference]
+    chunks = list(split_into_chunks(load_sample(args)))
+
+    reference, reference_stats = await parse_with_profile(args.reference, chunks, args.workers)
+    results = {args.reference: {**reference_stats, **agreement(reference, reference), "reference": True}}
+    for name in profiles:
+        parsed, stats = await parse_with_profile(name, chunks, args.workers)
+        results[name] = {**stats, **agreement(parsed, reference)}
+
+    print(f"{'профиль':<12} {'модель':<18} {'токенов/с':>10} {'POS':>7} {'DEP':>7} {'LAS':>7} {'лемма':>7}")
+    for name, result in results.items():
+        print(f"{name:<12} {result['model']:<18} {result['tokens_per_sec']:>10.0f} {result['pos']:>7.3f} "
+              f"{result['dep']:>7.3f} {result['las']:>7.3f} {result['lemma']:>7.3f}")
+
+    accurate_enough = [name for name, result in results.items()
+                       if result['pos'] >= args.min_agreement and result['dep'] >= args.min_agreement]
+    if accurate_enough:
+        fastest = max(accurate_enough, key=lambda name: results[name]['tokens_per_sec'])
+        print(f"\nСамый быстрый профиль с совпадением POS и DEP не ниже {args.min_agreement}: {fastest}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output:
+            json.dump({"reference": args.reference, "chunks": len(chunks), "profiles": results}, output,
+                      ensure_ascii=False, indent=2)
+        logging.info("Результаты записаны в %s", args.output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Скорость профилей разбора и совпадение разметки с эталонным")
+    parser.add_argument('profiles', nargs='*', help=f"профили из {', '.join(PARSE_PROFILES)}, по умолчанию все")
+    parser.add_argument('--reference', choices=list(PARSE_PROFILES), default='accurate')
+    parser.add_argument('--tokens', type=int, default=20000, help="размер синтетической выборки")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--sample', help="файл с текстом вместо синтетической выборки")
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--min-agreement', type=float, default=0.97)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+    unknown = set(args.profiles) - set(PARSE_PROFILES)
+    if unknown:
+        parser.error(f"неизвестные профили: {', '.join(sorted(unknown))}")
+    # Без проверки отсутствующая модель обнаружилась бы только в воркере после разбора предыдущих профилей.
+    # Модель берётся с учётом SPACY_MODEL, а spaCy импортируется только здесь, чтобы --help не ждал его загрузки
+    import spacy.util
+
+    names = [args.reference, *(args.profiles or PARSE_PROFILES)]
+    missing = sorted({resolve_profile(name).model for name in names} - set(spacy.util.get_installed_models()))
+    if missing:
+        parser.error(f"не установлены модели spaCy: {', '.join(missing)} (python -m spacy download <модель>)")
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+import argparse
+import asyncio
+import json
+import logging
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime
+
+from bench.corpus import CORPUS_SIZES, CorpusGenerator
+from bench.load import load_corpus
+from db.database import async_session, populate_initial_data
+from db.migrate import upgrade_database
+from utils import stats
+from utils.ingest import split_into_chunks
+from utils.leaderboard import load_leaderboard
+from utils.parser_pool import parser_pool
+from utils.render import chart_renderer
+from utils.render_cache import render_cache
+from utils.reports import generate_excel_report
+
+# Запросы и графики тех же функций, что вызывает бот, без отправки в Telegram
+STATS_LOADERS = {
+    'pos_distribution': stats._load_part_of_speech_distribution,
+    'dep_distribution': stats._load_syntax_dependency_distribution,
+    'sentence_length_distribution': stats._load_sentence_length_distribution,
+    'top_10_words': stats._load_top_10_frequent_words,
+    'pos_vs_sentence_length': stats._load_word_part_of_speech_vs_sentence_length,
+    'user_syntactic_structure_usage': stats._load_user_syntax_statistics,
+    'sentence_length_over_time': stats._load_sentence_length_over_time,
+    'pos_dep_correlation': stats._load_pos_dependency_correlation,
+}
+
+
+async def measure(action, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await action()
+        timings.append(time.perf_counter() - started)
+    return {
+        "repeat": repeat,
+        "min": min(timings),
+        "median": statistics.median(timings),
+        "mean": statistics.mean(timings),
+        "max": max(timings),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def bench_parse(total_tokens, seed):
+    # Тот же синтетический текст, но разобранный настоящей моделью spaCy
+    text = '\n'.join(corpus_text.text for corpus_text in CorpusGenerator(seed).texts(total_tokens))
+    chunks = list(split_into_chunks(text))
+    await parser_pool.start()
+    started = time.perf_counter()
+    parsed = await asyncio.gather(*(parser_pool.parse(chunk) for chunk in chunks))
+    seconds = time.perf_counter() - started
+    tokens = sum(len(sent.tokens) for sentences in parsed for sent in sentences)
+    return {"chunks": len(chunks), "tokens": tokens, "seconds": seconds, "tokens_per_sec": tokens / seconds,
+            "profile": parser_pool.profile_name, "workers": parser_pool.workers, "batch_size": parser_pool.batch_size}
+
+
+async def bench_stats(repeat):
+    results = {}
+    async with async_session() as session:
+        for name, load in STATS_LOADERS.items():
+            results[f"query:{name}"] = await measure(lambda: load(session), repeat)
+
+            chart = await load(session)
+            if chart is None:
+                continue
+            draw, *args = chart
+            results[f"render:{name}"] = await measure(lambda: chart_renderer.render(name, draw, *args), repeat)
+    return results
+
+
+async def bench_report(repeat):
+    async def build():
+        render_cache.clear()
+        await generate_excel_report()
+
+    result = await measure(build, repeat)
+    # Пик памяти снимается отдельным прогоном: под tracemalloc каждая аллокация медленнее и время было бы завышено
+    render_cache.clear()
+    tracemalloc.start()
+    try:
+        await generate_excel_report()
+        result["peak_traced_mb"] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+    finally:
+        tracemalloc.stop()
+    return result
+
+
+async def bench_leaderboard(repeat):
+    async with async_session() as session:
+        return await measure(lambda: load_leaderboard(session), repeat)
+
+
+async def bench_graph(text_ids, repeat):
+    from utils.parser import create_and_send_graph
+
+    text_id, user_id, uploaded = text_ids[0]
+
+    async def build():
+        render_cache.clear()
+        async with async_session() as session:
+            await create_and_send_graph(session, text_id, user_id, uploaded)
+
+    return await measure(build, repeat)
+
+
+async def run(args):
+    total_tokens = CORPUS_SIZES[args.size]
+    results = {
+        "commit": git_commit(),
+        "started_at": datetime.now().isoformat(timespec='seconds'),
+        "python": platform.python_version(),
+        "size": args.size,
+        "tokens": total_tokens,
+        "seed": args.seed,
+        "repeat": args.repeat,
+        "scenarios": {},
+    }
+    scenarios = results["scenarios"]
+
+    await upgrade_database()
+    await populate_initial_data()
+
+    text_ids = []
+    try:
+        if args.parse:
+            scenarios["parse"] = await bench_parse(min(total_tokens, args.parse_tokens), args.seed)
+        if args.load:
+            loaded = await load_corpus(total_tokens, args.seed, args.users)
+            scenarios["persist"] = loaded.as_dict()
+            text_ids = loaded.text_ids
+        scenarios.update(await bench_stats(args.repeat))
+        scenarios["report"] = await bench_report(args.repeat)
+        scenarios["leaderboard"] = await bench_leaderboard(args.repeat)
+        if text_ids:
+            scenarios["graph"] = await bench_graph(text_ids, args.repeat)
+    finally:
+        parser_pool.shutdown()
+        chart_renderer.shutdown()
+
+    with open(args.output, 'w', encoding='utf-8') as output:
+        json.dump(results, output, ensure_ascii=False, indent=2)
+    logging.info("Результаты записаны в %s", args.output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарки загрузки, запросов и графиков")
+    parser.add_argument('--size', choices=CORPUS_SIZES, default='1k')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--no-load', dest='load', action='store_false',
+                        help="не загружать корпус, мерить запросы на уже заполненной базе")
+    parser.add_argument('--no-parse', dest='parse', action='store_false', help="не мерить разбор spaCy")
+    parser.add_argument('--parse-tokens', type=int, default=100000,
+                        help="сколько токенов корпуса разбирать в сценарии parse")
+    parser.add_argument('--output', default='bench-results.json')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
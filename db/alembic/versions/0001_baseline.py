@@ -0,0 +1,153 @@
+"""Базовая схема
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+# Схема на момент перехода на Alembic, зафиксирована DDL и не зависит от текущих моделей.
+# if not exists: базы, созданные до Alembic через create_all, получают только недостающие таблицы
+BASELINE_TABLES = [
+    ("user_info", """
+        create table if not exists user_info (
+            user_id integer primary key,
+            user_name varchar not null unique,
+            unique (user_id))"""),
+    ("sentence", """
+        create table if not exists sentence (
+            sentence_id uuid primary key,
+            text varchar not null,
+            user_id integer not null,
+            pos_ids smallint[],
+            dep_ids smallint[],
+            lemma_ids integer[],
+            heads integer[],
+            token_starts integer[],
+            token_ends integer[])"""),
+    ("sentence_to_text", """
+        create table if not exists sentence_to_text (
+            sentence_id uuid not null references sentence(sentence_id),
+            text_id uuid not null,
+            sentence_number integer not null,
+            meta_timestamp timestamp not null,
+            primary key (sentence_id, text_id))"""),
+    ("word_form", """
+        create table if not exists word_form (
+            id serial primary key,
+            text varchar not null unique)"""),
+    ("lemma", """
+        create table if not exists lemma (
+            id serial primary key,
+            text varchar not null unique)"""),
+    ("pos_tag", """
+        create table if not exists pos_tag (
+            id smallserial primary key,
+            code varchar not null unique)"""),
+    ("dep_tag", """
+        create table if not exists dep_tag (
+            id smallserial primary key,
+            code varchar not null unique)"""),
+    ("token", """
+        create table if not exists token (
+            sentence_id uuid not null references sentence(sentence_id),
+            word_number integer not null,
+            form_id integer not null references word_form(id),
+            lemma_id integer not null references lemma(id),
+            pos_id smallint not null references pos_tag(id),
+            dep_id smallint not null references dep_tag(id),
+            head_idx integer not null,
+            primary key (sentence_id, word_number))"""),
+    ("parse_cache", """
+        create table if not exists parse_cache (
+            hash bytea primary key,
+            parse jsonb not null,
+            created_at timestamp not null default now())"""),
+    ("stats_pos_dep", """
+        create table if not exists stats_pos_dep (
+            pos_id smallint not null,
+            dep_id smallint not null,
+            total bigint not null,
+            primary key (pos_id, dep_id))"""),
+    ("stats_lemma", """
+        create table if not exists stats_lemma (
+            lemma_id integer not null,
+            pos_id smallint not null,
+            dep_id smallint not null,
+            total bigint not null,
+            primary key (lemma_id, pos_id, dep_id))"""),
+    ("stats_sentence_length", """
+        create table if not exists stats_sentence_length (
+            length integer primary key,
+            total bigint not null)"""),
+    ("stats_length_pos", """
+        create table if not exists stats_length_pos (
+            length integer not null,
+            pos_id smallint not null,
+            total bigint not null,
+            primary key (length, pos_id))"""),
+    ("stats_user_dep", """
+        create table if not exists stats_user_dep (
+            user_id integer not null,
+            dep_id smallint not null,
+            total bigint not null,
+            primary key (user_id, dep_id))"""),
+    ("stats_daily_length", """
+        create table if not exists stats_daily_length (
+            day date primary key,
+            sentences bigint not null,
+            words bigint not null)"""),
+    ("pos_mapping", """
+        create table if not exists pos_mapping (
+            id serial primary key,
+            code varchar not null unique,
+            description varchar not null)"""),
+    ("dep_mapping", """
+        create table if not exists dep_mapping (
+            id serial primary key,
+            code varchar not null unique,
+            description varchar not null)"""),
+    ("dep_formats", """
+        create table if not exists dep_formats (
+            id serial primary key,
+            description varchar not null unique,
+            start_format_string varchar not null,
+            end_format_string varchar not null)"""),
+]
+
+BASELINE_INDEXES = [
+    "create index if not exists ix_sentence_to_text_text_id on sentence_to_text (text_id)",
+    "create index if not exists ix_pos_mapping_id on pos_mapping (id)",
+    "create index if not exists ix_dep_mapping_id on dep_mapping (id)",
+    "create index if not exists ix_dep_formats_id on dep_formats (id)",
+]
+
+# Базы, созданные до появления упакованного разбора, догоняются здесь
+SCHEMA_UPGRADES = [
+    "alter table sentence add column if not exists pos_ids smallint[]",
+    "alter table sentence add column if not exists dep_ids smallint[]",
+    "alter table sentence add column if not exists lemma_ids integer[]",
+    "alter table sentence add column if not exists heads integer[]",
+    "alter table sentence add column if not exists token_starts integer[]",
+    "alter table sentence add column if not exists token_ends integer[]",
+]
+
+
+def upgrade():
+    op.execute("create sequence if not exists data_version_seq")
+    for _, statement in BASELINE_TABLES:
+        op.execute(statement)
+    for statement in BASELINE_INDEXES + SCHEMA_UPGRADES:
+        op.execute(statement)
+
+
+def downgrade():
+    # Таблицы удаляются в обратном порядке, чтобы внешние ключи не мешали
+    for table, _ in reversed(BASELINE_TABLES):
+        op.execute(f"drop table if exists {table}")
+    op.execute("drop sequence if exists data_version_seq")
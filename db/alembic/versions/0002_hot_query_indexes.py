@@ -0,0 +1,49 @@
+"""Индексы под запросы бота
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+from alembic import op
+from sqlalchemy import text
+
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def _drop_invalid(name):
+    # Прерванный CREATE INDEX CONCURRENTLY оставляет невалидный индекс, if_not_exists его бы пропустил
+    invalid = op.get_bind().execute(text("""
+        select 1 from pg_index i join pg_class c on c.oid = i.indexrelid
+        where c.relname = :name and not i.indisvalid
+    """), {"name": name}).scalar()
+    if invalid:
+        op.drop_index(name, postgresql_concurrently=True, if_exists=True)
+
+
+def upgrade():
+    # CONCURRENTLY не блокирует запись в таблицы, но не работает внутри транзакции
+    with op.get_context().autocommit_block():
+        # Текст пользователя: where text_id = ... order by sentence_number, покрывающий за счёт sentence_id
+        _drop_invalid('ix_sentence_to_text_text_id_number')
+        op.create_index('ix_sentence_to_text_text_id_number', 'sentence_to_text', ['text_id', 'sentence_number'],
+                        postgresql_include=['sentence_id'], postgresql_concurrently=True, if_not_exists=True)
+        # Новый индекс начинается с text_id и заменяет старый
+        op.drop_index('ix_sentence_to_text_text_id', table_name='sentence_to_text', postgresql_concurrently=True,
+                      if_exists=True)
+
+        # Предложения пользователя
+        _drop_invalid('ix_sentence_user_id')
+        op.create_index('ix_sentence_user_id', 'sentence', ['user_id'], postgresql_concurrently=True,
+                        if_not_exists=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.create_index('ix_sentence_to_text_text_id', 'sentence_to_text', ['text_id'], postgresql_concurrently=True,
+                        if_not_exists=True)
+        op.drop_index('ix_sentence_to_text_text_id_number', table_name='sentence_to_text',
+                      postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_sentence_user_id', table_name='sentence', postgresql_concurrently=True, if_exists=True)
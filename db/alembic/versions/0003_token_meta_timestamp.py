@@ -0,0 +1,22 @@
+"""Время загрузки в token
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Колонка без значения по умолчанию добавляется без перезаписи таблицы, старые строки заполняет
+    # `python -m db.migrate partition`
+    op.execute("alter table token add column if not exists meta_timestamp timestamp")
+
+
+def downgrade():
+    op.execute("alter table token drop column if exists meta_timestamp")
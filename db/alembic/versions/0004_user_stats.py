@@ -0,0 +1,59 @@
+"""Счётчики таблицы лидеров
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("""
+        create table if not exists user_stats (
+            user_id integer primary key,
+            words bigint not null,
+            sentences bigint not null,
+            files bigint not null,
+            last_activity timestamp not null)""")
+    op.execute("create index if not exists ix_user_stats_words on user_stats (words)")
+    op.execute("""
+        create table if not exists user_stats_bucket (
+            period varchar not null,
+            bucket_start date not null,
+            user_id integer not null,
+            words bigint not null,
+            sentences bigint not null,
+            files bigint not null,
+            primary key (period, bucket_start, user_id))""")
+    # Таблица лидеров за период читает первые строки корзины сразу в порядке слов, без сортировки всех участников
+    op.execute("""
+        create index if not exists ix_user_stats_bucket_words on user_stats_bucket (period, bucket_start, words desc)""")
+
+    # Счётчики заполняются из уже загруженных текстов
+    op.execute("truncate user_stats, user_stats_bucket")
+    op.execute("""
+        insert into user_stats(user_id, words, sentences, files, last_activity)
+        select s.user_id, sum(l.words), count(*), count(distinct stt.text_id), max(stt.meta_timestamp)
+        from (select sentence_id, count(*) as words from token group by 1) l
+        join sentence s using(sentence_id)
+        join sentence_to_text stt using(sentence_id)
+        group by 1""")
+    op.execute("""
+        insert into user_stats_bucket(period, bucket_start, user_id, words, sentences, files)
+        select p.period, date_trunc(p.period, stt.meta_timestamp)::date, s.user_id,
+               sum(l.words), count(*), count(distinct stt.text_id)
+        from (select sentence_id, count(*) as words from token group by 1) l
+        join sentence s using(sentence_id)
+        join sentence_to_text stt using(sentence_id)
+        cross join (values ('week'), ('month')) as p(period)
+        group by 1, 2, 3""")
+
+
+def downgrade():
+    op.drop_table('user_stats_bucket')
+    op.drop_table('user_stats')
@@ -0,0 +1,40 @@
+"""Очередь задач загрузки
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("""
+        create table if not exists ingest_job (
+            job_id uuid primary key,
+            user_id integer not null,
+            user_name varchar not null,
+            chat_id bigint not null,
+            message_id bigint,
+            status varchar not null default 'queued',
+            text varchar,
+            file_id varchar,
+            file_name varchar,
+            attempts integer not null default 0,
+            last_error varchar,
+            text_id uuid,
+            uploaded timestamp,
+            created_at timestamp not null default now(),
+            run_after timestamp not null default now(),
+            updated_at timestamp not null default now())""")
+    op.execute("create index if not exists ix_ingest_job_user_id on ingest_job (user_id)")
+    # Воркеры выбирают только задачи в очереди, поэтому индекс частичный
+    op.execute("create index if not exists ix_ingest_job_queued on ingest_job (run_after) where status = 'queued'")
+
+
+def downgrade():
+    op.drop_table('ingest_job')
@@ -0,0 +1,25 @@
+"""Общее хранилище FSM
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("""
+        create table if not exists fsm_state (
+            key varchar primary key,
+            state varchar,
+            data jsonb not null default '{}',
+            updated_at timestamp not null default now())""")
+
+
+def downgrade():
+    op.drop_table('fsm_state')
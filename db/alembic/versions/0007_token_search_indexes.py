@@ -0,0 +1,60 @@
+"""Обратный индекс token для поиска
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18
+"""
+from alembic import op
+from sqlalchemy import text
+
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+# Определения заморожены здесь, как и DDL остальных миграций: db.partitions может меняться дальше
+INDEXES = {
+    'ix_token_lemma_sentence': '(lemma_id, sentence_id) include (pos_id, dep_id)',
+    'ix_token_form_sentence': '(form_id, sentence_id) include (pos_id, dep_id)',
+}
+
+
+def _drop_invalid(name):
+    invalid = op.get_bind().execute(text("""
+        select 1 from pg_index i join pg_class c on c.oid = i.indexrelid
+        where c.relname = :name and not i.indisvalid
+    """), {"name": name}).scalar()
+    if invalid:
+        op.execute(f"drop index concurrently if exists {name}")
+
+
+def _partitions(table):
+    return op.get_bind().execute(text("""
+        select c.relname from pg_inherits i join pg_class c on c.oid = i.inhrelid
+        where i.inhparent = to_regclass(:table)
+        order by 1
+    """), {"table": table}).scalars().all()
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        partitions = _partitions('token')
+        for name, definition in INDEXES.items():
+            if not partitions:
+                _drop_invalid(name)
+                op.execute(f"create index concurrently if not exists {name} on token {definition}")
+                continue
+
+            # На секционированной таблице CONCURRENTLY не работает: индекс родителя создаётся пустым (ON ONLY),
+            # индексы секций строятся по одному без блокировки записи и подключаются к нему
+            op.execute(f"create index if not exists {name} on only token {definition}")
+            for partition in partitions:
+                partition_index = f"{name}_{partition.removeprefix('token_')}"
+                _drop_invalid(partition_index)
+                op.execute(f"create index concurrently if not exists {partition_index} on {partition} {definition}")
+                op.execute(f"alter index {name} attach partition {partition_index}")
+
+
+def downgrade():
+    for name in INDEXES:
+        op.execute(f"drop index if exists {name}")
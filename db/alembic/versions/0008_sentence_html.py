@@ -0,0 +1,21 @@
+"""Готовая разметка предложений
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Старые предложения размечаются командой `python -m db.migrate render-html`, до этого бот размечает их на лету
+    op.execute("alter table sentence add column if not exists html varchar")
+
+
+def downgrade():
+    op.execute("alter table sentence drop column if exists html")
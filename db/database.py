@@ -1,20 +1,25 @@
 import os
 import uuid
 
-from sqlalchemy import Column, Integer, String, ForeignKey, select, func, TIMESTAMP
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import Column, Integer, SmallInteger, BigInteger, String, Date, LargeBinary, ForeignKey, Sequence, \
+    Index, select, func, TIMESTAMP
+from sqlalchemy.dialects.postgresql import UUID, ARRAY, JSONB
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
 DATABASE_URL = os.getenv("DATABASE_URL", "postgresql+asyncpg://postgres:postgres@db:5432/postgres")
+SQL_ECHO = os.getenv("SQL_ECHO", "0") == "1"  # Лог каждого запроса, только для отладки
 
-engine = create_async_engine(DATABASE_URL, echo=True)
+engine = create_async_engine(DATABASE_URL, echo=SQL_ECHO)
 Base = declarative_base()
 
 async_session = sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
 
 
+data_version_seq = Sequence('data_version_seq', metadata=Base.metadata)
+
+
 async def create_tables():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
@@ -27,6 +32,11 @@ class SentenceToText(Base):
     sentence_number = Column(Integer, nullable=False)
     meta_timestamp = Column(TIMESTAMP, nullable=False)
 
+    # Предложения текста читаются по порядку прямо из индекса, sentence_id берётся из него же
+    __table_args__ = (
+        Index('ix_sentence_to_text_text_id_number', 'text_id', 'sentence_number', postgresql_include=['sentence_id']),
+    )
+
 
 class UserInfo(Base):
     __tablename__ = 'user_info'
@@ -39,24 +49,172 @@ class Sentence(Base):
     __tablename__ = 'sentence'
     sentence_id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     text = Column(String, nullable=False)
-    user_id = Column(Integer, nullable=False)
+    user_id = Column(Integer, nullable=False, index=True)
+    # Упакованный разбор: i-й элемент каждого массива относится к i-му токену предложения
+    pos_ids = Column(ARRAY(SmallInteger))
+    dep_ids = Column(ARRAY(SmallInteger))
+    lemma_ids = Column(ARRAY(Integer))
+    heads = Column(ARRAY(Integer))  # Номер главного слова внутри предложения
+    token_starts = Column(ARRAY(Integer))  # Смещения токенов в text
+    token_ends = Column(ARRAY(Integer))
+    html = Column(String)  # Текст, размеченный по членам предложения, готовый к отправке
 
 
-class WordToSentence(Base):
-    __tablename__ = 'word_to_sentence'
-    word_id = Column(UUID(as_uuid=True), ForeignKey('word.word_id'), primary_key=True, default=uuid.uuid4)
-    sentence_id = Column(UUID(as_uuid=True), ForeignKey('sentence.sentence_id'), primary_key=True, default=uuid.uuid4)
-    word_number = Column(Integer, nullable=False)
+class WordForm(Base):
+    __tablename__ = 'word_form'
 
+    id = Column(Integer, primary_key=True)
+    text = Column(String, unique=True, nullable=False)
 
-class Word(Base):
-    __tablename__ = 'word'
-    word_id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    text = Column(String, nullable=False)
-    pos = Column(String, nullable=False)  # Часть речи
-    dep = Column(String, nullable=False)  # Синтаксическая зависимость
-    lemma = Column(String, nullable=False)
+
+class Lemma(Base):
+    __tablename__ = 'lemma'
+
+    id = Column(Integer, primary_key=True)
+    text = Column(String, unique=True, nullable=False)
+
+
+class POSTag(Base):
+    __tablename__ = 'pos_tag'
+
+    id = Column(SmallInteger, primary_key=True)
+    code = Column(String, unique=True, nullable=False)
+
+
+class DEPTag(Base):
+    __tablename__ = 'dep_tag'
+
+    id = Column(SmallInteger, primary_key=True)
+    code = Column(String, unique=True, nullable=False)
+
+
+class Token(Base):
+    __tablename__ = 'token'
+    sentence_id = Column(UUID(as_uuid=True), ForeignKey('sentence.sentence_id'), primary_key=True)
+    word_number = Column(Integer, primary_key=True)
+    form_id = Column(Integer, ForeignKey('word_form.id'), nullable=False)
+    lemma_id = Column(Integer, ForeignKey('lemma.id'), nullable=False)
+    pos_id = Column(SmallInteger, ForeignKey('pos_tag.id'), nullable=False)  # Часть речи
+    dep_id = Column(SmallInteger, ForeignKey('dep_tag.id'), nullable=False)  # Синтаксическая зависимость
     head_idx = Column(Integer, nullable=False)
+    meta_timestamp = Column(TIMESTAMP)  # Время загрузки текста, ключ секционирования по месяцам
+
+    # Обратный индекс для /search: предложения с леммой или словоформой по порядку sentence_id,
+    # фильтры по части речи и роли проверяются по самому индексу
+    __table_args__ = (
+        Index('ix_token_lemma_sentence', 'lemma_id', 'sentence_id', postgresql_include=['pos_id', 'dep_id']),
+        Index('ix_token_form_sentence', 'form_id', 'sentence_id', postgresql_include=['pos_id', 'dep_id']),
+    )
+
+
+# Очередь загрузок: бот сразу отвечает пользователю, а разбор выполняют фоновые воркеры
+class IngestJob(Base):
+    __tablename__ = 'ingest_job'
+    job_id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = Column(Integer, nullable=False, index=True)
+    user_name = Column(String, nullable=False)
+    chat_id = Column(BigInteger, nullable=False)
+    message_id = Column(BigInteger)  # Сообщение, в котором показывается ход обработки
+    status = Column(String, nullable=False, server_default='queued')  # queued, running, done, failed
+    # Текст из сообщения либо file_id и имя файла, файл скачивается уже воркером
+    text = Column(String)
+    file_id = Column(String)
+    file_name = Column(String)
+    attempts = Column(Integer, nullable=False, server_default='0')
+    last_error = Column(String)
+    text_id = Column(UUID(as_uuid=True))
+    uploaded = Column(TIMESTAMP)
+    created_at = Column(TIMESTAMP, nullable=False, server_default=func.now())
+    run_after = Column(TIMESTAMP, nullable=False, server_default=func.now())
+    updated_at = Column(TIMESTAMP, nullable=False, server_default=func.now())
+
+    __table_args__ = (
+        Index('ix_ingest_job_queued', 'run_after', postgresql_where=status == 'queued'),
+    )
+
+
+# Состояния и данные FSM aiogram, общие для всех экземпляров бота
+class FsmState(Base):
+    __tablename__ = 'fsm_state'
+    key = Column(String, primary_key=True)
+    state = Column(String)
+    data = Column(JSONB, nullable=False, server_default='{}')
+    updated_at = Column(TIMESTAMP, nullable=False, server_default=func.now())
+
+
+class ParseCacheEntry(Base):
+    __tablename__ = 'parse_cache'
+    # Хэш нормализованного текста предложения и его разбор в компактном виде
+    hash = Column(LargeBinary, primary_key=True)
+    parse = Column(JSONB, nullable=False)
+    created_at = Column(TIMESTAMP, nullable=False, server_default=func.now())
+
+
+# Агрегаты для графиков /stats, обновляются при загрузке текста
+class StatsPosDep(Base):
+    __tablename__ = 'stats_pos_dep'
+    pos_id = Column(SmallInteger, primary_key=True)
+    dep_id = Column(SmallInteger, primary_key=True)
+    total = Column(BigInteger, nullable=False)
+
+
+class StatsLemma(Base):
+    __tablename__ = 'stats_lemma'
+    lemma_id = Column(Integer, primary_key=True)
+    pos_id = Column(SmallInteger, primary_key=True)
+    dep_id = Column(SmallInteger, primary_key=True)
+    total = Column(BigInteger, nullable=False)
+
+
+class StatsSentenceLength(Base):
+    __tablename__ = 'stats_sentence_length'
+    length = Column(Integer, primary_key=True)
+    total = Column(BigInteger, nullable=False)
+
+
+class StatsLengthPos(Base):
+    __tablename__ = 'stats_length_pos'
+    length = Column(Integer, primary_key=True)
+    pos_id = Column(SmallInteger, primary_key=True)
+    total = Column(BigInteger, nullable=False)
+
+
+class StatsUserDep(Base):
+    __tablename__ = 'stats_user_dep'
+    user_id = Column(Integer, primary_key=True)
+    dep_id = Column(SmallInteger, primary_key=True)
+    total = Column(BigInteger, nullable=False)
+
+
+class StatsDailyLength(Base):
+    __tablename__ = 'stats_daily_length'
+    day = Column(Date, primary_key=True)
+    sentences = Column(BigInteger, nullable=False)
+    words = Column(BigInteger, nullable=False)  # Без знаков препинания
+
+
+# Счётчики таблицы лидеров: за всё время и по календарным неделям и месяцам
+class UserStats(Base):
+    __tablename__ = 'user_stats'
+    user_id = Column(Integer, primary_key=True)
+    words = Column(BigInteger, nullable=False, index=True)
+    sentences = Column(BigInteger, nullable=False)
+    files = Column(BigInteger, nullable=False)
+    last_activity = Column(TIMESTAMP, nullable=False)
+
+
+class UserStatsBucket(Base):
+    __tablename__ = 'user_stats_bucket'
+    period = Column(String, primary_key=True)  # week или month
+    bucket_start = Column(Date, primary_key=True)
+    user_id = Column(Integer, primary_key=True)
+    words = Column(BigInteger, nullable=False)
+    sentences = Column(BigInteger, nullable=False)
+    files = Column(BigInteger, nullable=False)
+
+    __table_args__ = (
+        Index('ix_user_stats_bucket_words', 'period', 'bucket_start', words.desc()),
+    )
 
 
 class POSMapping(Base):
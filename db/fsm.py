@@ -0,0 +1,56 @@
+import logging
+import os
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder
+from aiogram.fsm.storage.memory import MemoryStorage
+from sqlalchemy import select, func
+from sqlalchemy.dialects.postgresql import insert
+
+from db.database import engine, FsmState
+
+logger = logging.getLogger(__name__)
+
+# postgres - состояние видят все экземпляры бота, memory - только текущий процесс (локальный запуск и тесты)
+FSM_STORAGE = os.getenv("FSM_STORAGE", "postgres")
+
+
+class PostgresStorage(BaseStorage):
+    def __init__(self, key_builder=None):
+        self.key_builder = key_builder or DefaultKeyBuilder(with_destiny=True)
+
+    async def _upsert(self, key, **values):
+        async with engine.begin() as conn:
+            await conn.execute(insert(FsmState)
+                               .values(key=self.key_builder.build(key), **values)
+                               .on_conflict_do_update(index_elements=['key'], set_={**values, "updated_at": func.now()})
+                               .execution_options(query_name="fsm.set"))
+
+    async def _get(self, key, column):
+        async with engine.connect() as conn:
+            result = await conn.execute(select(column)
+                                        .where(FsmState.key == self.key_builder.build(key))
+                                        .execution_options(query_name="fsm.get"))
+            return result.scalar()
+
+    async def set_state(self, key, state=None):
+        await self._upsert(key, state=state.state if isinstance(state, State) else state)
+
+    async def get_state(self, key):
+        return await self._get(key, FsmState.state)
+
+    async def set_data(self, key, data):
+        await self._upsert(key, data=dict(data))
+
+    async def get_data(self, key):
+        return dict(await self._get(key, FsmState.data) or {})
+
+    async def close(self):
+        pass
+
+
+def create_storage():
+    if FSM_STORAGE == "memory":
+        logger.info("Состояния FSM хранятся в памяти процесса")
+        return MemoryStorage()
+    return PostgresStorage()
@@ -1,11 +1,240 @@
+import argparse
 import asyncio
-from sqlalchemy.ext.asyncio import create_async_engine
-from sqlalchemy.orm import sessionmaker
-from database import create_tables, populate_initial_data  # Импортируйте вашу функцию создания таблиц
+import json
+import os
+import sys
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import text
+
+from db import queries
+from db.database import engine, populate_initial_data
+from db.packed import locate_tokens, unpack_sentence
+from db.partitions import PARTITIONED_TABLES, partition_table, ensure_partitions
+from db.rollups import rebuild_rollups
+from utils.annotate import load_dep_formats, render_sentence_html
+from utils.render_cache import bump_data_version
+
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'alembic.ini')
+
+PACK_BATCH_SIZE = 1000
+PARSE_CACHE_MAX_AGE_DAYS = int(os.getenv("PARSE_CACHE_MAX_AGE_DAYS", 90))
+
+# Большие таблицы, полный проход по которым в запросе к одному тексту - ошибка
+LARGE_TABLES = {'sentence', 'sentence_to_text', 'token', 'word_form', 'lemma', 'parse_cache', 'user_stats',
+                'user_stats_bucket'}
+
+
+async def upgrade_database(revision='head'):
+    # Alembic синхронный и сам запускает event loop, поэтому работает в отдельном потоке
+    config = Config(ALEMBIC_INI)
+    config.attributes['configure_logger'] = False
+    await asyncio.to_thread(command.upgrade, config, revision)
+
+
+async def normalize_legacy_words(drop_legacy=False):
+    # Переносит старые таблицы word/word_to_sentence в словари и token
+    async with engine.begin() as conn:
+        legacy = await conn.execute(text("select to_regclass('word') is not null"))
+        if not legacy.scalar():
+            print("Таблицы word нет, переносить нечего.")
+            return
+
+        await conn.execute(text("insert into word_form(text) select distinct text from word on conflict do nothing"))
+        await conn.execute(text("insert into lemma(text) select distinct lemma from word on conflict do nothing"))
+        await conn.execute(text("insert into pos_tag(code) select distinct pos from word on conflict do nothing"))
+        await conn.execute(text("insert into dep_tag(code) select distinct dep from word on conflict do nothing"))
+        result = await conn.execute(text("""
+            insert into token(sentence_id, word_number, form_id, lemma_id, pos_id, dep_id, head_idx, meta_timestamp)
+            select ws.sentence_id, ws.word_number, f.id, l.id, p.id, d.id, w.head_idx, stt.meta_timestamp
+            from word w
+            join word_to_sentence ws using(word_id)
+            left join (select sentence_id, min(meta_timestamp) as meta_timestamp from sentence_to_text group by 1) stt
+                using(sentence_id)
+            join word_form f on f.text = w.text
+            join lemma l on l.text = w.lemma
+            join pos_tag p on p.code = w.pos
+            join dep_tag d on d.code = w.dep
+            on conflict do nothing
+        """))
+        print(f"Перенесено слов: {result.rowcount}")
+
+        if drop_legacy:
+            await conn.execute(text("drop table word_to_sentence"))
+            await conn.execute(text("drop table word"))
+
+
+async def prune_parse_cache(days=PARSE_CACHE_MAX_AGE_DAYS):
+    # Старые разборы удаляются пачками, чтобы не держать долгую блокировку; при повторе текст просто разберётся заново
+    deleted = 0
+    while True:
+        async with engine.begin() as conn:
+            result = await conn.execute(text("""
+                delete from parse_cache where hash in (
+                    select hash from parse_cache
+                    where created_at < now() - make_interval(days => :days)
+                    limit :limit)
+            """), {"days": days, "limit": PACK_BATCH_SIZE})
+        if not result.rowcount:
+            break
+        deleted += result.rowcount
+    print(f"Удалено разборов из кэша: {deleted}")
+
+
+async def pack_sentences():
+    # Заполняет упакованный разбор для предложений, сохранённых строками token
+    packed = 0
+    while True:
+        async with engine.begin() as conn:
+            result = await conn.execute(text("""
+                select s.sentence_id, s.text,
+                       array_remove(array_agg(f.text order by t.word_number), null) as forms,
+                       array_remove(array_agg(t.pos_id order by t.word_number), null) as pos_ids,
+                       array_remove(array_agg(t.dep_id order by t.word_number), null) as dep_ids,
+                       array_remove(array_agg(t.lemma_id order by t.word_number), null) as lemma_ids,
+                       array_remove(array_agg(t.head_idx order by t.word_number), null) as heads,
+                       min(t.word_number) as first_word_number
+                from (select sentence_id, text from sentence where pos_ids is null limit :limit) s
+                left join token t using(sentence_id)
+                left join word_form f on f.id = t.form_id
+                group by s.sentence_id, s.text
+            """), {"limit": PACK_BATCH_SIZE})
+            rows = result.fetchall()
+            if not rows:
+                break
+
+            params = []
+            for row in rows:
+                token_starts, token_ends = locate_tokens(row.text, row.forms)
+                params.append({"sentence_id": row.sentence_id, "pos_ids": row.pos_ids, "dep_ids": row.dep_ids,
+                               "lemma_ids": row.lemma_ids,
+                               "heads": [head - row.first_word_number for head in row.heads],
+                               "token_starts": token_starts,
+                               "token_ends": token_ends})
+            await conn.execute(text("""
+                update sentence set pos_ids = :pos_ids, dep_ids = :dep_ids, lemma_ids = :lemma_ids, heads = :heads,
+                    token_starts = :token_starts, token_ends = :token_ends
+                where sentence_id = :sentence_id
+            """), params)
+            packed += len(rows)
+    print(f"Упаковано предложений: {packed}")
+
+
+async def render_sentences_html():
+    # Пересобирает сохранённую разметку после изменения dep_formats, заодно заполняет её у старых предложений
+    rendered = 0
+    last = None
+    async with engine.connect() as conn:
+        dep_formats = await load_dep_formats(conn)
+    while True:
+        async with engine.begin() as conn:
+            result = await conn.execute(text("""
+                select sentence_id, text, pos_ids, dep_ids, lemma_ids, heads, token_starts, token_ends
+                from sentence
+                where pos_ids is not null and (cast(:last as uuid) is null or sentence_id > cast(:last as uuid))
+                order by sentence_id
+                limit :limit
+            """), {"last": last, "limit": PACK_BATCH_SIZE})
+            rows = result.fetchall()
+            if not rows:
+                break
+
+            await conn.execute(text("update sentence set html = :html where sentence_id = :sentence_id"),
+                               [{"sentence_id": row.sentence_id,
+                                 "html": render_sentence_html(unpack_sentence(row), dep_formats)} for row in rows])
+            rendered += len(rows)
+            last = rows[-1].sentence_id
+    print(f"Размечено предложений: {rendered}")
+
+
+def _seq_scans(plan):
+    if plan.get('Node Type') == 'Seq Scan':
+        yield plan['Relation Name']
+    for child in plan.get('Plans', ()):
+        yield from _seq_scans(child)
+
+
+def _has_sort(plan):
+    return plan.get('Node Type') == 'Sort' or any(_has_sort(child) for child in plan.get('Plans', ()))
+
+
+async def check_query_plans():
+    # Seq Scan при выключенном enable_seqscan значит, что подходящего индекса нет, даже если таблица пока маленькая.
+    # Для запросов первых N строк то же значит Sort: выборка сортируется целиком вместо чтения по индексу
+    problems = 0
+    async with engine.begin() as conn:
+        await conn.execute(text("set local enable_seqscan = off"))
+        for query in queries.ALL_QUERIES:
+            name = query.get_execution_options()['query_name']
+            result = await conn.execute(text(f"explain (format json) {query.text}"), queries.EXPLAIN_PARAMS)
+            plan = result.scalar()
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            scans = sorted(set(_seq_scans(plan[0]['Plan'])) & LARGE_TABLES)
+
+            if scans and name in queries.FULL_CORPUS_QUERIES:
+                status = f"полный проход по {', '.join(scans)} (запрос по всему корпусу)"
+            elif scans:
+                status = f"SEQ SCAN по {', '.join(scans)}"
+                problems += 1
+            elif name in queries.TOP_N_QUERIES and _has_sort(plan[0]['Plan']):
+                status = "SORT всей выборки, нет индекса для порядка"
+                problems += 1
+            else:
+                status = "ok"
+            print(f"{name}: {status}")
+    return problems
+
 
 async def main():
-    await create_tables()
+    parser = argparse.ArgumentParser(description="Миграции базы данных")
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.add_parser("create", help="Создать таблицы и заполнить справочники")
+    normalize = subparsers.add_parser("normalize", help="Перенести word/word_to_sentence в token")
+    normalize.add_argument("--drop-legacy", action="store_true", help="Удалить старые таблицы после переноса")
+    subparsers.add_parser("pack", help="Заполнить упакованный разбор предложений из token")
+    subparsers.add_parser("render-html", help="Пересобрать разметку текста после изменения dep_formats")
+    subparsers.add_parser("rollups", help="Пересчитать агрегаты графиков из token")
+    partition = subparsers.add_parser("partition",
+                                      help="Секционировать token и sentence_to_text по месяцам без остановки")
+    partition.add_argument("tables", nargs="*", help=f"таблицы из {', '.join(PARTITIONED_TABLES)}, по умолчанию все")
+    prune = subparsers.add_parser("prune-parse-cache", help="Удалить из кэша разборов записи старше --days дней")
+    prune.add_argument("--days", type=int, default=PARSE_CACHE_MAX_AGE_DAYS)
+    subparsers.add_parser("check", help="Проверить планы запросов бота на последовательное чтение больших таблиц")
+    args = parser.parse_args()
+    if args.command == "partition":
+        unknown = set(args.tables) - set(PARTITIONED_TABLES)
+        if unknown:
+            parser.error(f"неизвестные таблицы: {', '.join(sorted(unknown))}")
+
+    await upgrade_database()
     await populate_initial_data()
+    await ensure_partitions()
+
+    if args.command == "normalize":
+        await normalize_legacy_words(args.drop_legacy)
+    elif args.command == "pack":
+        await pack_sentences()
+    elif args.command == "render-html":
+        await render_sentences_html()
+    elif args.command == "rollups":
+        async with engine.begin() as conn:
+            await rebuild_rollups(conn)
+    elif args.command == "partition":
+        for table in args.tables or PARTITIONED_TABLES:
+            await partition_table(table)
+    elif args.command == "prune-parse-cache":
+        await prune_parse_cache(args.days)
+    elif args.command == "check":
+        if await check_query_plans():
+            sys.exit(1)
+
+    # Эти команды меняют данные графиков и разметки, закэшированные картинки прежней версии больше не отдаются
+    if args.command in ("normalize", "pack", "render-html", "rollups"):
+        async with engine.connect() as conn:
+            await bump_data_version(conn)
+
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
@@ -0,0 +1,45 @@
+from typing import NamedTuple
+
+
+class PackedToken(NamedTuple):
+    text: str
+    pos_id: int
+    dep_id: int
+    lemma_id: int
+    head: int
+
+
+def pack_sentence(tokens, pos_ids, dep_ids, lemma_ids):
+    first = tokens[0].i if tokens else 0
+    return (
+        [pos_ids[token.pos] for token in tokens],
+        [dep_ids[token.dep] for token in tokens],
+        [lemma_ids[token.lemma] for token in tokens],
+        [token.head - first for token in tokens],
+        [token.offset for token in tokens],
+        [token.offset + len(token.text) for token in tokens],
+    )
+
+
+def unpack_sentence(row):
+    if row.pos_ids is None:
+        return []
+    return [
+        PackedToken(row.text[start:end], pos_id, dep_id, lemma_id, head)
+        for pos_id, dep_id, lemma_id, head, start, end in zip(row.pos_ids, row.dep_ids, row.lemma_ids, row.heads,
+                                                              row.token_starts, row.token_ends)
+    ]
+
+
+def locate_tokens(sentence_text, forms):
+    # Восстанавливает смещения токенов для предложений, сохранённых до упаковки
+    starts, ends = [], []
+    cursor = 0
+    for form in forms:
+        start = sentence_text.find(form, cursor)
+        if start < 0:
+            start = cursor
+        starts.append(start)
+        ends.append(start + len(form))
+        cursor = ends[-1]
+    return starts, ends
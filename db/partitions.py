@@ -0,0 +1,187 @@
+import asyncio
+import logging
+import os
+from datetime import date, datetime, timezone
+
+from sqlalchemy import text
+
+from db.database import engine
+
+logger = logging.getLogger(__name__)
+
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", 3))
+PARTITION_CHECK_INTERVAL = int(os.getenv("PARTITION_CHECK_INTERVAL", 24 * 60 * 60))
+BACKFILL_BATCH_SIZE = 5000
+
+# Таблица -> (первичный ключ без ключа секционирования, вторичные индексы)
+PARTITIONED_TABLES = {
+    'token': (['sentence_id', 'word_number'], {
+        'ix_token_lemma_sentence': '(lemma_id, sentence_id) include (pos_id, dep_id)',
+        'ix_token_form_sentence': '(form_id, sentence_id) include (pos_id, dep_id)',
+    }),
+    'sentence_to_text': (['sentence_id', 'text_id'], {
+        'ix_sentence_to_text_text_id_number': '(text_id, sentence_number) include (sentence_id)',
+    }),
+}
+
+# Таблицы, на которые ссылается token, внешние ключи повторяются на секционированной таблице
+FOREIGN_KEYS = {
+    'token': [('sentence_id', 'sentence(sentence_id)'), ('form_id', 'word_form(id)'), ('lemma_id', 'lemma(id)'),
+              ('pos_id', 'pos_tag(id)'), ('dep_id', 'dep_tag(id)')],
+    'sentence_to_text': [('sentence_id', 'sentence(sentence_id)')],
+}
+
+
+def month_start(day, shift=0):
+    month = day.month - 1 + shift
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def partition_name(table, month):
+    return f"{table}_{month:%Y_%m}"
+
+
+async def is_partitioned(conn, table):
+    result = await conn.execute(text("select relkind = 'p' from pg_class where oid = to_regclass(:table)"),
+                                {"table": table})
+    return bool(result.scalar())
+
+
+async def _partitions_end(conn, table):
+    # Верхняя граница последней месячной секции, секция по умолчанию границ не имеет
+    result = await conn.execute(text("""
+        select max((regexp_match(pg_get_expr(c.relpartbound, c.oid), 'TO \\(''([^'']+)''\\)'))[1]::timestamp)
+        from pg_inherits i
+        join pg_class c on c.oid = i.inhrelid
+        where i.inhparent = to_regclass(:table)
+    """), {"table": table})
+    end = result.scalar()
+    return end.date() if end else None
+
+
+async def ensure_partitions(months_ahead=PARTITION_MONTHS_AHEAD, today=None):
+    # Секции создаются заранее, чтобы вставки не попадали в секцию по умолчанию
+    # meta_timestamp хранится в UTC, месяц секции считается по нему же
+    today = today or datetime.now(timezone.utc).date()
+    created = []
+    async with engine.begin() as conn:
+        # Несколько экземпляров бота проверяют секции одновременно, создаёт их только один
+        await conn.execute(text("select pg_advisory_xact_lock(hashtext('ensure_partitions'))"))
+        for table in PARTITIONED_TABLES:
+            if not await is_partitioned(conn, table):
+                continue
+            start = max(filter(None, (await _partitions_end(conn, table), month_start(today))))
+            while start < month_start(today, months_ahead + 1):
+                end = month_start(start, 1)
+                name = partition_name(table, start)
+                await conn.execute(text(f"create table {name} partition of {table} "
+                                        f"for values from ('{start}') to ('{end}')"))
+                created.append(name)
+                start = end
+    if created:
+        logger.info("Созданы секции: %s", ', '.join(created))
+    return created
+
+
+async def maintain_partitions(interval=PARTITION_CHECK_INTERVAL):
+    while True:
+        try:
+            await ensure_partitions()
+        except Exception:
+            logger.exception("Не удалось создать секции")
+        await asyncio.sleep(interval)
+
+
+async def _backfill_token_timestamps():
+    # Старые строки token получают время загрузки своего текста, пачками по предложениям,
+    # чтобы не держать долгих блокировок
+    last = None
+    filled = 0
+    while True:
+        async with engine.begin() as conn:
+            result = await conn.execute(text("""
+                select sentence_id from sentence
+                where cast(:last as uuid) is null or sentence_id > cast(:last as uuid)
+                order by sentence_id
+                limit :limit
+            """), {"last": last, "limit": BACKFILL_BATCH_SIZE})
+            batch = [row.sentence_id for row in result]
+            if not batch:
+                break
+            # Токены предложений без текста получают начало эпохи, чтобы попасть в первую секцию
+            result = await conn.execute(text("""
+                update token t
+                set meta_timestamp = coalesce(
+                    (select min(stt.meta_timestamp) from sentence_to_text stt where stt.sentence_id = t.sentence_id),
+                    timestamp '1970-01-01')
+                where t.sentence_id = any(:batch) and t.meta_timestamp is null
+            """), {"batch": batch})
+            filled += result.rowcount
+            last = batch[-1]
+    print(f"Заполнено время загрузки у токенов: {filled}")
+
+
+async def _constraint_exists(conn, name):
+    result = await conn.execute(text("select 1 from pg_constraint where conname = :name"), {"name": name})
+    return result.scalar() is not None
+
+
+async def partition_table(table):
+    key, indexes = PARTITIONED_TABLES[table]
+    legacy = f"{table}_legacy"
+    cutover = month_start(datetime.now(timezone.utc).date(), 1)
+    check = f"{table}_before_{cutover:%Y_%m}"
+
+    async with engine.connect() as conn:
+        if await is_partitioned(conn, table):
+            print(f"{table} уже секционирована.")
+            return
+
+    if table == 'token':
+        await _backfill_token_timestamps()
+
+    # Всё тяжёлое делается до переключения и не блокирует запись: индекс строится CONCURRENTLY,
+    # ограничение добавляется NOT VALID и проверяется отдельно
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text(f"create unique index concurrently if not exists {table}_partition_key "
+                                f"on {table} ({', '.join(key)}, meta_timestamp)"))
+        if not await _constraint_exists(conn, check):
+            await conn.execute(text(f"alter table {table} add constraint {check} "
+                                    f"check (meta_timestamp is not null and meta_timestamp < '{cutover}') not valid"))
+        await conn.execute(text(f"alter table {table} validate constraint {check}"))
+
+    # Короткая транзакция переключения: проверенное ограничение избавляет ATTACH и SET NOT NULL от полного прохода,
+    # а готовые индексы и внешние ключи старой таблицы подключаются к секционированной вместо построения новых
+    async with engine.begin() as conn:
+        await conn.execute(text(f"lock table {table} in access exclusive mode"))
+        await conn.execute(text(f"alter table {table} alter column meta_timestamp set not null"))
+        # ATTACH подключает индекс секции к первичному ключу родителя, только если индекс поддерживает ограничение,
+        # иначе строит новый уникальный индекс по всей старой таблице под блокировкой. Индекс уже построен,
+        # поэтому ограничение добавляется без прохода по таблице
+        await conn.execute(text(f"alter table {table} add constraint {table}_partition_key "
+                                f"unique using index {table}_partition_key"))
+        await conn.execute(text(f"alter table {table} rename to {legacy}"))
+        await conn.execute(text(f"alter table {legacy} rename constraint {table}_pkey to {legacy}_pkey"))
+        for name in indexes:
+            await conn.execute(text(f"alter index {name} rename to {name}_legacy"))
+
+        await conn.execute(text(f"create table {table} (like {legacy} including defaults) "
+                                f"partition by range (meta_timestamp)"))
+        await conn.execute(text(f"alter table {table} add constraint {table}_pkey "
+                                f"primary key ({', '.join(key)}, meta_timestamp)"))
+        for name, definition in indexes.items():
+            await conn.execute(text(f"create index {name} on {table} {definition}"))
+        for column, target in FOREIGN_KEYS[table]:
+            await conn.execute(text(f"alter table {table} add foreign key ({column}) references {target}"))
+
+        await conn.execute(text(f"alter table {table} attach partition {legacy} "
+                                f"for values from (minvalue) to ('{cutover}')"))
+        reused = await conn.execute(text("select 1 from pg_inherits where inhrelid = to_regclass(:index)"),
+                                    {"index": f"{table}_partition_key"})
+        if reused.scalar() is None:
+            raise RuntimeError(f"ATTACH не подключил {table}_partition_key к первичному ключу {table}")
+        await conn.execute(text(f"create table {table}_default partition of {table} default"))
+
+    print(f"{table} секционирована по месяцам, старые данные в секции {legacy} до {cutover}.")
+    await ensure_partitions()
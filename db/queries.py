@@ -0,0 +1,252 @@
+import uuid
+from datetime import date, datetime
+
+from sqlalchemy import text
+from sqlalchemy.sql.elements import TextClause
+
+# Все запросы чтения, которые выполняет бот. query_name - имя запроса в метриках и в `python -m db.migrate check`.
+# Запросы к одному тексту фильтруют и по времени загрузки, чтобы в секционированной схеме читалась одна секция
+
+RESULT_TEXT = text("""
+    select s.html, s.text, s.pos_ids, s.dep_ids, s.lemma_ids, s.heads, s.token_starts, s.token_ends
+    from sentence_to_text stt
+        join sentence s using (sentence_id)
+    where stt.text_id = :text_id and stt.meta_timestamp = :uploaded and s.user_id = :user_id
+    order by sentence_number
+""").execution_options(query_name="result.text")
+
+RESULT_STATS = text("""
+    select l.text as lemma, dm.description as dep, sum(c.count) as count from (
+        select t.lemma_id, t.dep_id, count(*) from sentence_to_text
+            join sentence s using(sentence_id)
+            cross join unnest(s.lemma_ids, s.dep_ids, s.pos_ids) as t(lemma_id, dep_id, pos_id)
+        where 1=1
+            and text_id = :text_id
+            and meta_timestamp = :uploaded
+            and s.user_id = :user_id
+            and t.pos_id not in (select id from pos_tag where code = 'PUNCT')
+        group by 1, 2) c
+        join lemma l on l.id = c.lemma_id
+        join dep_tag d on d.id = c.dep_id
+        join dep_mapping dm on d.code = dm.code
+    group by 1, 2
+    order by 3 desc
+""").execution_options(query_name="result.stats")
+
+GRAPH_SENTENCES = text("""
+    select s.text, s.pos_ids, s.dep_ids, s.lemma_ids, s.heads, s.token_starts, s.token_ends
+    from sentence_to_text
+        join sentence s using(sentence_id)
+    where text_id = :text_id and meta_timestamp = :uploaded and s.user_id = :user_id
+    order by sentence_number
+""").execution_options(query_name="graph.sentences")
+
+# Для кнопок, созданных до появления времени загрузки в callback_data
+TEXT_UPLOADED = text("""
+    select meta_timestamp from sentence_to_text where text_id = :text_id limit 1
+""").execution_options(query_name="result.uploaded")
+
+DEP_FORMATS = text("""
+    select d.id, coalesce(start_format_string, '') as start_format, coalesce(end_format_string, '') as end_format
+    from dep_tag d
+    left join dep_mapping dm on d.code = dm.code
+    left join dep_formats df using(description)
+""").execution_options(query_name="annotate.dep_formats")
+
+DEP_FORMATS_BY_CODE = text("""
+    select dm.code, coalesce(start_format_string, '') as start_format, coalesce(end_format_string, '') as end_format
+    from dep_mapping dm
+    join dep_formats df using(description)
+""").execution_options(query_name="annotate.dep_formats_by_code")
+
+DEP_DESCRIPTIONS = text("""
+    select d.id, dm.description from dep_tag d
+    join dep_mapping dm on d.code = dm.code
+""").execution_options(query_name="annotate.dep_descriptions")
+
+# Таблица лидеров читает только счётчики user_stats, по индексу на words - не больше limit строк
+LEADERBOARD_ALL = text("""
+    select user_name, words as uniq_words, files as uniq_files
+    from user_stats
+    join user_info using(user_id)
+    order by words desc
+    limit :limit
+""").execution_options(query_name="leaderboard.all")
+
+LEADERBOARD_PERIOD = text("""
+    select user_name, words as uniq_words, files as uniq_files
+    from user_stats_bucket
+    join user_info using(user_id)
+    where period = :period and bucket_start = :bucket_start
+    order by words desc
+    limit :limit
+""").execution_options(query_name="leaderboard.period")
+
+STATS_PART_OF_SPEECH_DISTRIBUTION = text("""
+    SELECT pm.description as pos, SUM(c.count) AS count
+    FROM (SELECT pos_id, SUM(total) AS count FROM stats_pos_dep GROUP BY 1) c
+    join pos_tag p on p.id = c.pos_id
+    join pos_mapping pm on pm.code = p.code
+    where p.code not in ('DET', 'ADP', 'PRT', 'INTJ', 'PART', 'PUNCT')
+    GROUP BY 1;
+""").execution_options(query_name="stats.part_of_speech_distribution")
+
+STATS_SYNTAX_DEPENDENCY_DISTRIBUTION = text("""
+    SELECT description as dep, SUM(c.count) AS count
+    FROM (SELECT dep_id, SUM(total) AS count FROM stats_pos_dep GROUP BY 1) c
+    join dep_tag d on d.id = c.dep_id
+    join dep_mapping dm on dm.code = d.code
+    where dm.description not in ('детерминант', 'знак препинания', 'маркер')
+    GROUP BY 1;
+""").execution_options(query_name="stats.syntax_dependency_distribution")
+
+STATS_SENTENCE_LENGTH_DISTRIBUTION = text("""
+    SELECT length AS word_count, total AS sentence_count
+    FROM stats_sentence_length
+""").execution_options(query_name="stats.sentence_length_distribution")
+
+STATS_TOP_10_FREQUENT_WORDS = text("""
+    SELECT l.text, c.word_count
+    FROM (SELECT lemma_id, SUM(total) as word_count
+          FROM stats_lemma
+          where pos_id not in (select id from pos_tag
+                               where code in ('DET', 'ADP', 'PRT', 'INTJ', 'PART', 'PUNCT', 'CONJ', 'X', 'PRON'))
+              and dep_id not in (select id from dep_tag where code in ('dep', 'case', 'cc', 'mark', 'punct'))
+          GROUP BY 1
+          ORDER BY 2 DESC
+          LIMIT 10) c
+    join lemma l on l.id = c.lemma_id
+    ORDER BY 2 DESC;
+""").execution_options(query_name="stats.top_10_frequent_words")
+
+STATS_WORD_PART_OF_SPEECH_VS_SENTENCE_LENGTH = text("""
+    SELECT length AS sentence_length, pm.description as pos, total AS pos_count
+    FROM stats_length_pos ps
+    join pos_tag p on p.id = ps.pos_id
+    join pos_mapping pm on pm.code = p.code
+    ORDER BY 1, 2;
+""").execution_options(query_name="stats.word_part_of_speech_vs_sentence_length")
+
+STATS_USER_SYNTAX_STATISTICS = text("""
+    SELECT
+        user_name as user_id,
+        dm.description as dep,
+        SUM(total) AS dep_count
+    FROM stats_user_dep raw
+    join user_info ui USING(user_id)
+    join dep_tag d on d.id = raw.dep_id
+    join dep_mapping dm on dm.code = d.code
+    GROUP BY
+        1, 2
+    ORDER BY
+        1, 2;
+""").execution_options(query_name="stats.user_syntax_statistics")
+
+STATS_SENTENCE_LENGTH_OVER_TIME = text("""
+    select
+        day as date,
+        words::float / sentences as avg_sentence_length
+    from stats_daily_length
+    order by day
+""").execution_options(query_name="stats.sentence_length_over_time")
+
+STATS_POS_DEPENDENCY_CORRELATION = text("""
+    with raw as (SELECT pm.description as pos,
+            dm.description as dep,
+            SUM(c.total) AS frequency
+     FROM stats_pos_dep c
+              join pos_tag p on p.id = c.pos_id
+              join dep_tag d on d.id = c.dep_id
+              join pos_mapping pm on pm.code = p.code
+              join dep_mapping dm on dm.code = d.code
+     where 1 = 1
+       and dm.description not in ('детерминант', 'знак препинания', 'маркер')
+       and pm.code not in ('DET', 'ADP', 'PRT', 'INTJ', 'PART', 'PUNCT')
+     GROUP BY 1, 2
+     ORDER BY 1, 2)
+    select pos, dep, round(frequency/sum(frequency) over (partition by pos), 3) as frequency from raw
+""").execution_options(query_name="stats.pos_dependency_correlation")
+
+# Число слов берётся из упакованного разбора предложения, без соединения с token
+REPORT_SENTENCES = text("""
+    SELECT s.sentence_id::text, s.text, u.user_name, coalesce(cardinality(s.pos_ids), 0) AS word_count
+    FROM sentence s
+    JOIN user_info u ON s.user_id = u.user_id
+""").execution_options(query_name="report.sentences")
+
+REPORT_SUMMARY = text("""
+    SELECT u.user_name, COUNT(*) AS total_sentences, AVG(coalesce(cardinality(s.pos_ids), 0)) AS avg_word_count
+    FROM sentence s
+    JOIN user_info u ON s.user_id = u.user_id
+    GROUP BY 1
+    ORDER BY 1
+""").execution_options(query_name="report.summary")
+
+REPORT_WORDS = text("""
+    SELECT f.text, p.code as pos, c.frequency
+    FROM (SELECT form_id, pos_id, COUNT(*) as frequency FROM token GROUP BY 1, 2) c
+    JOIN word_form f ON f.id = c.form_id
+    JOIN pos_tag p ON p.id = c.pos_id
+    ORDER BY frequency DESC
+""").execution_options(query_name="report.words")
+
+SEARCH_LEMMA = text("""
+    select id from lemma where text = :word
+""").execution_options(query_name="search.lemma")
+
+SEARCH_FORM = text("""
+    select id from word_form where text = :word
+""").execution_options(query_name="search.form")
+
+SEARCH_POS = text("""
+    select id from pos_tag where code = :code
+""").execution_options(query_name="search.pos")
+
+SEARCH_DEP = text("""
+    select id from dep_tag where code = :code
+""").execution_options(query_name="search.dep")
+
+# Keyset-пагинация: следующая страница начинается после последнего показанного sentence_id,
+# поэтому каждая страница - короткий проход по индексу (lemma_id, sentence_id)
+_SEARCH_SENTENCES = """
+    select s.sentence_id, s.text, s.pos_ids, s.dep_ids, s.lemma_ids, s.heads, s.token_starts, s.token_ends
+    from (select distinct t.sentence_id
+          from token t
+          where t.{column} = :value_id and t.sentence_id > :after
+            and (cast(:pos_id as smallint) is null or t.pos_id = :pos_id)
+            and (cast(:dep_id as smallint) is null or t.dep_id = :dep_id)
+          order by t.sentence_id
+          limit :limit) hits
+    join sentence s on s.sentence_id = hits.sentence_id
+    order by s.sentence_id
+"""
+
+SEARCH_BY_LEMMA = text(_SEARCH_SENTENCES.format(column="lemma_id")).execution_options(query_name="search.by_lemma")
+
+SEARCH_BY_FORM = text(_SEARCH_SENTENCES.format(column="form_id")).execution_options(query_name="search.by_form")
+
+JOB_COUNTS = text("""
+    select status, count(*) from ingest_job where status in ('queued', 'running') group by status
+""").execution_options(query_name="jobs.counts")
+
+USER_JOBS = text("""
+    select status, file_name, attempts, last_error, created_at
+    from ingest_job
+    where user_id = :user_id
+    order by created_at desc
+    limit :limit
+""").execution_options(query_name="jobs.by_user")
+
+
+ALL_QUERIES = [value for value in list(globals().values()) if isinstance(value, TextClause)]
+
+# Эти запросы читают весь корпус, последовательный проход для них ожидаем
+FULL_CORPUS_QUERIES = {"report.sentences", "report.summary", "report.words"}
+
+# Эти запросы отдают первые строки по порядку индекса и не должны сортировать всю выборку
+TOP_N_QUERIES = {"leaderboard.all", "leaderboard.period"}
+
+# Значения параметров для EXPLAIN: на план влияет только то, что параметр задан
+EXPLAIN_PARAMS = {"text_id": uuid.UUID(int=0), "uploaded": datetime(2000, 1, 1), "user_id": 0, "limit": 10,
+                  "period": "week", "bucket_start": date(2000, 1, 3), "word": "", "code": "", "value_id": 0,
+                  "pos_id": 0, "dep_id": 0, "after": uuid.UUID(int=0)}
@@ -0,0 +1,152 @@
+from collections import Counter
+from datetime import timedelta
+
+from sqlalchemy import func, text
+from sqlalchemy.dialects.postgresql import insert
+
+from db.bulk import MAX_QUERY_PARAMS
+from db.database import StatsPosDep, StatsLemma, StatsSentenceLength, StatsLengthPos, StatsUserDep, \
+    StatsDailyLength, UserStats, UserStatsBucket
+
+
+LEADERBOARD_PERIODS = ('week', 'month')
+
+
+def _is_punct(token):
+    return token.pos.lower() == 'punct' or token.dep.lower() == 'punct'
+
+
+def bucket_start(period, day):
+    # Совпадает с date_trunc в Postgres: неделя начинается с понедельника
+    if period == 'week':
+        return day - timedelta(days=day.weekday())
+    return day.replace(day=1)
+
+
+class RollupDeltas:
+    def __init__(self):
+        self.pos_dep = Counter()
+        self.lemma = Counter()
+        self.sentence_length = Counter()
+        self.length_pos = Counter()
+        self.user_dep = Counter()
+        self.daily_sentences = Counter()
+        self.daily_words = Counter()
+        # Ключи (user_id,) и (period, bucket_start, user_id), значения - [words, sentences, files]
+        self.users = {}
+        self.user_buckets = {}
+        self.last_activity = {}
+
+    def _add_user(self, user_id, day, words=0, sentences=0, files=0):
+        keys = [(self.users, (user_id,))]
+        keys += [(self.user_buckets, (period, bucket_start(period, day), user_id)) for period in LEADERBOARD_PERIODS]
+        for counters, key in keys:
+            total = counters.setdefault(key, [0, 0, 0])
+            total[0] += words
+            total[1] += sentences
+            total[2] += files
+
+    def add_file(self, user_id, time):
+        self._add_user(user_id, time.date(), files=1)
+
+    def touch(self, user_id, time):
+        self.last_activity[(user_id,)] = max(time, self.last_activity.get((user_id,), time))
+
+    def add_sentence(self, user_id, day, tokens, pos_ids, dep_ids, lemma_ids):
+        length = len(tokens)
+        self.sentence_length[(length,)] += 1
+        self._add_user(user_id, day, words=length, sentences=1)
+
+        words = 0
+        for token in tokens:
+            pos_id, dep_id = pos_ids[token.pos], dep_ids[token.dep]
+            self.pos_dep[(pos_id, dep_id)] += 1
+            self.lemma[(lemma_ids[token.lemma], pos_id, dep_id)] += 1
+            self.length_pos[(length, pos_id)] += 1
+            self.user_dep[(user_id, dep_id)] += 1
+            if not _is_punct(token):
+                words += 1
+
+        # Как и раньше, предложения из одних знаков препинания в среднюю длину не входят
+        if words:
+            self.daily_sentences[(day,)] += 1
+            self.daily_words[(day,)] += words
+
+
+async def _upsert(session, model, keys, values, deltas, latest=()):
+    # values складываются с уже накопленными, latest заменяются более поздним значением
+    columns = keys + values + latest
+    rows = [dict(zip(columns, key + tuple(delta))) for key, delta in sorted(deltas.items())]
+    # Ключи отсортированы, чтобы параллельные загрузки блокировали строки в одном порядке
+    chunk_size = max(1, MAX_QUERY_PARAMS // len(columns))
+    for start in range(0, len(rows), chunk_size):
+        stmt = insert(model).values(rows[start:start + chunk_size])
+        set_ = {value: getattr(model, value) + getattr(stmt.excluded, value) for value in values}
+        set_.update({value: func.greatest(getattr(model, value), getattr(stmt.excluded, value)) for value in latest})
+        stmt = stmt.on_conflict_do_update(index_elements=keys, set_=set_)
+        await session.execute(stmt)
+
+
+async def apply_rollup_deltas(session, deltas: RollupDeltas):
+    def totals(counter):
+        return {key: (count,) for key, count in counter.items()}
+
+    await _upsert(session, StatsPosDep, ('pos_id', 'dep_id'), ('total',), totals(deltas.pos_dep))
+    await _upsert(session, StatsLemma, ('lemma_id', 'pos_id', 'dep_id'), ('total',), totals(deltas.lemma))
+    await _upsert(session, StatsSentenceLength, ('length',), ('total',), totals(deltas.sentence_length))
+    await _upsert(session, StatsLengthPos, ('length', 'pos_id'), ('total',), totals(deltas.length_pos))
+    await _upsert(session, StatsUserDep, ('user_id', 'dep_id'), ('total',), totals(deltas.user_dep))
+    await _upsert(session, StatsDailyLength, ('day',), ('sentences', 'words'),
+                  {day: (count, deltas.daily_words[day]) for day, count in deltas.daily_sentences.items()})
+
+    await _upsert(session, UserStats, ('user_id',), ('words', 'sentences', 'files'),
+                  {key: (*total, deltas.last_activity[key]) for key, total in deltas.users.items()},
+                  latest=('last_activity',))
+    await _upsert(session, UserStatsBucket, ('period', 'bucket_start', 'user_id'), ('words', 'sentences', 'files'),
+                  deltas.user_buckets)
+
+
+REBUILD_STATEMENTS = [
+    """truncate stats_pos_dep, stats_lemma, stats_sentence_length, stats_length_pos, stats_user_dep,
+        stats_daily_length, user_stats, user_stats_bucket""",
+    """insert into stats_pos_dep(pos_id, dep_id, total)
+        select pos_id, dep_id, count(*) from token group by 1, 2""",
+    """insert into stats_lemma(lemma_id, pos_id, dep_id, total)
+        select lemma_id, pos_id, dep_id, count(*) from token group by 1, 2, 3""",
+    """insert into stats_sentence_length(length, total)
+        select length, count(*) from (select sentence_id, count(*) as length from token group by 1) s group by 1""",
+    """insert into stats_length_pos(length, pos_id, total)
+        select l.length, t.pos_id, count(*) from token t
+        join (select sentence_id, count(*) as length from token group by 1) l using(sentence_id)
+        group by 1, 2""",
+    """insert into stats_user_dep(user_id, dep_id, total)
+        select s.user_id, t.dep_id, count(*) from token t join sentence s using(sentence_id) group by 1, 2""",
+    """insert into user_stats(user_id, words, sentences, files, last_activity)
+        select s.user_id, sum(l.words), count(*), count(distinct stt.text_id), max(stt.meta_timestamp)
+        from (select sentence_id, count(*) as words from token group by 1) l
+        join sentence s using(sentence_id)
+        join sentence_to_text stt using(sentence_id)
+        group by 1""",
+    """insert into user_stats_bucket(period, bucket_start, user_id, words, sentences, files)
+        select p.period, date_trunc(p.period, stt.meta_timestamp)::date, s.user_id,
+               sum(l.words), count(*), count(distinct stt.text_id)
+        from (select sentence_id, count(*) as words from token group by 1) l
+        join sentence s using(sentence_id)
+        join sentence_to_text stt using(sentence_id)
+        cross join (values ('week'), ('month')) as p(period)
+        group by 1, 2, 3""",
+    """insert into stats_daily_length(day, sentences, words)
+        select date_trunc('day', stt.meta_timestamp)::date, count(*), sum(l.words)
+        from (select sentence_id, count(*) as words from token t
+              join pos_tag p on p.id = t.pos_id
+              join dep_tag d on d.id = t.dep_id
+              where p.code not ilike 'punct' and d.code not ilike 'punct'
+              group by 1) l
+        join sentence_to_text stt using(sentence_id)
+        group by 1""",
+]
+
+
+async def rebuild_rollups(conn):
+    for statement in REBUILD_STATEMENTS:
+        await conn.execute(text(statement))
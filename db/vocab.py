@@ -0,0 +1,63 @@
+import os
+from collections import OrderedDict
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+
+from db.bulk import MAX_QUERY_PARAMS
+from db.database import WordForm, Lemma, POSTag, DEPTag
+
+VOCAB_CACHE_SIZE = int(os.getenv("VOCAB_CACHE_SIZE", 500000))
+
+
+class Vocabulary:
+    def __init__(self, model, column_name, max_size=VOCAB_CACHE_SIZE):
+        self.model = model
+        self.column = getattr(model, column_name)
+        self.column_name = column_name
+        self.max_size = max_size
+        self._ids = OrderedDict()
+
+    def __len__(self):
+        return len(self._ids)
+
+    def _remember(self, value, value_id):
+        self._ids[value] = value_id
+        self._ids.move_to_end(value)
+        if len(self._ids) > self.max_size:
+            self._ids.popitem(last=False)
+
+    async def intern(self, session, values):
+        ids = {}
+        missing = []
+        for value in set(values):
+            value_id = self._ids.get(value)
+            if value_id is None:
+                missing.append(value)
+            else:
+                self._ids.move_to_end(value)
+                ids[value] = value_id
+
+        if missing:
+            # Словари только пополняются, поэтому новые значения фиксируем отдельной транзакцией:
+            # откат загрузки текста не оставит в кэше id, которых нет в базе
+            async with session.bind.begin() as connection:
+                # Одно значение - один параметр запроса
+                for start in range(0, len(missing), MAX_QUERY_PARAMS):
+                    chunk = missing[start:start + MAX_QUERY_PARAMS]
+                    await connection.execute(insert(self.model)
+                                             .values([{self.column_name: value} for value in chunk])
+                                             .on_conflict_do_nothing(index_elements=[self.column_name]))
+                    result = await connection.execute(select(self.column, self.model.id)
+                                                      .where(self.column.in_(chunk)))
+                    for value, value_id in result:
+                        ids[value] = value_id
+                        self._remember(value, value_id)
+
+        return ids
+
+
+forms = Vocabulary(WordForm, 'text')
+lemmas = Vocabulary(Lemma, 'text')
+pos_tags = Vocabulary(POSTag, 'code')
+dep_tags = Vocabulary(DEPTag, 'code')
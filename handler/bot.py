@@ -1,30 +1,72 @@
+import logging
 import os
 import prettytable as pt 
 
 from aiogram import Bot, Dispatcher, Router
-from aiogram.types import Message, FSInputFile, InlineKeyboardButton, CallbackQuery
+from aiogram.types import Message, BufferedInputFile, InlineKeyboardButton, CallbackQuery
 from aiogram import F
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
+from aiogram.filters.callback_data import CallbackData
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from aiogram.utils.markdown import hlink, hbold
-from db.database import async_session, DEP_DESCRIPTION
+from aiogram.utils.media_group import MediaGroupBuilder
+from db import queries
+from db.database import async_session, engine, DEP_DESCRIPTION
+from db.fsm import create_storage
+from db.packed import unpack_sentence
+from db.partitions import maintain_partitions
+from handler.jobs import ResultChoice, enqueue_ingest, ingest_workers
 import asyncio
-from sqlalchemy import text
-from utils.parser import parse_text_and_save, create_and_send_graph, process_file
+from datetime import datetime, timezone
+from uuid import UUID
+from utils.annotate import load_dep_formats, render_sentence_html
+from utils.leaderboard import PERIOD_TITLES, load_leaderboard
+from utils.metrics import HandlerMetricsMiddleware, instrument_engine, start_metrics_server
+from utils.parser import create_and_send_graph
+from utils import charts, startup
+from utils.parser_client import parser, shutdown_parser
+from utils.render import chart_renderer
 
 from utils.reports import generate_excel_report
+from utils.search import FIRST_PAGE, SearchQuery, parse_search, search_page
 from utils.stats import plot_part_of_speech_distribution, plot_syntax_dependency_distribution, \
     plot_sentence_length_distribution, plot_top_10_frequent_words, plot_word_part_of_speech_vs_sentence_length, \
     plot_user_syntax_statistics, plot_sentence_length_over_time, plot_pos_dependency_correlation
 
 TOKEN = os.getenv('TELEGRAM_TOKEN')
+# Если задан публичный адрес, бот принимает обновления вебхуком и может работать в нескольких экземплярах
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/webhook')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')
+WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', 8080))
+# background - модель spaCy и matplotlib прогреваются после начала приёма обновлений,
+# eager - до него, lazy - загружаются при первом использовании
+STARTUP_WARMUP = os.getenv('STARTUP_WARMUP', 'background')
 
 bot = Bot(token=TOKEN)
-dp = Dispatcher()
+dp = Dispatcher(storage=create_storage())
 
 router = Router()
+router.message.middleware(HandlerMetricsMiddleware())
+router.callback_query.middleware(HandlerMetricsMiddleware())
 
-waiting_for_file = {}
+
+class IngestStates(StatesGroup):
+    waiting_for_text = State()
+
+
+class SearchMore(CallbackData, prefix="search"):
+    after: UUID
+
+
+warmup_task = None
+
+JOB_STATUS_TITLES = {"queued": "в очереди", "running": "обрабатывается", "done": "готово", "failed": "ошибка"}
 
 
 @router.message(Command("help"))
@@ -33,7 +75,9 @@ async def cmd_help(message: Message):
                           "/help - Показывает этот список\n"
                           "/init - Бот запросит текст с файлом, чтобы выдать обратно текст, разобранный по членам предложения\n"
                           "/stats - Статистические данные.\n"
-                          "/leaderboard - Таблица лидеров.\n"
+                          "/leaderboard [week|month|all] - Таблица лидеров.\n"
+                          "/jobs - Состояние последних загруженных текстов.\n"
+                          "/search слово [pos:NOUN] [dep:nsubj] - Предложения корпуса с этим словом.\n"
                           ))
 
 
@@ -48,25 +92,20 @@ async def start_command(message: Message):
 
 
 @router.message(Command("init"))
-async def init_command(message: Message):
-    waiting_for_file[message.from_user.id] = True
+async def init_command(message: Message, state: FSMContext):
+    await state.set_state(IngestStates.waiting_for_text)
     await message.answer("Пришли файл (txt/doc/docx) или текст (в сообщении), который ты хочешь проанализировать.")
 
 
 @router.message(Command("leaderboard"))
-async def leaderboard_command(message: Message):
+async def leaderboard_command(message: Message, command: CommandObject):
+    period = (command.args or 'all').strip().lower()
+    if period not in PERIOD_TITLES:
+        await message.answer("Используй /leaderboard week, /leaderboard month или /leaderboard all.")
+        return
+
     async with async_session() as session:
-        result = await session.execute(text("""
-            select user_name, count(word_id) as uniq_words, count(DISTINCT text_id) AS uniq_files from word
-            join word_to_sentence using(word_id)
-            join sentence using(sentence_id)
-            join user_info using(user_id)
-            join sentence_to_text using(sentence_id)
-            group by user_name
-            order by 2 desc
-            Limit 10;
-        """))
-        leaderboard = result.fetchall()
+        leaderboard = await load_leaderboard(session, period)
 
         if leaderboard:
             table = pt.PrettyTable(['User', 'Слов', 'Файлов загружено'])
@@ -77,7 +116,7 @@ async def leaderboard_command(message: Message):
             for row in leaderboard:
                 table.add_row([row.user_name, row.uniq_words, row.uniq_files])
 
-            await message.answer(f"<pre>{table}</pre>", parse_mode="HTML")
+            await message.answer(f"Таблица лидеров {PERIOD_TITLES[period]}:\n<pre>{table}</pre>", parse_mode="HTML")
         else:
             await message.answer("Нет данных для отображения.")
 
@@ -92,100 +131,139 @@ async def stats_command(message: Message):
     await message.answer("Выберите категорию:", reply_markup=builder.as_markup())
     
 
-@router.message(F.document | F.text)
-async def handle_file(message: Message):
-    if waiting_for_file.get(message.from_user.id):
-        file = message.document
-        text_content = message.text # Если в сообщении есть файл, то текст из файла перепишет эту переменную
-
-        if file:
-            file_info = await bot.get_file(file.file_id)
-            file_content = await bot.download_file(file_info.file_path)
-            file_extension = os.path.splitext(file.file_name)[1].lower()
-
-            try:
-                text_content = await process_file(file_content, file_extension)
-            except Exception as e:
-                await message.answer(f"Произошла ошибка при обработке файла: {str(e)}")
-            
-        async with async_session() as session:
-            await parse_text_and_save(text_content, message.from_user.id, session, message.from_user.full_name)
+@router.message(Command("jobs"))
+async def jobs_command(message: Message):
+    async with async_session() as session:
+        result = await session.execute(queries.USER_JOBS, {"user_id": message.from_user.id, "limit": 10})
+        jobs = result.fetchall()
 
-        waiting_for_file[message.from_user.id] = False
+    if not jobs:
+        await message.answer("Ты ещё ничего не загружал.")
+        return
 
-        builder = InlineKeyboardBuilder()
-        builder.add(InlineKeyboardButton(text="Текст", callback_data="text_choice"))
-        builder.add(InlineKeyboardButton(text="Картинка", callback_data="image_choice"))
-        builder.add(InlineKeyboardButton(text="Статистика", callback_data="stats_choice"))
-        builder.adjust(1)
-        await message.answer("Текст получен. Как ты хочешь увидеть результат: в виде текста, картинки или статистики?",
-                                reply_markup=builder.as_markup())
+    lines = []
+    for job in jobs:
+        line = f"{job.created_at:%d.%m %H:%M} {job.file_name or 'текст'}: {JOB_STATUS_TITLES.get(job.status, job.status)}"
+        if job.status == 'failed' and job.last_error:
+            line += f" ({job.last_error})"
+        lines.append(line)
+    await message.answer("Последние загрузки:\n" + "\n".join(lines))
+
+
+async def send_search_page(message: Message, search: SearchQuery, after: UUID):
+    async with async_session() as session:
+        page = await search_page(session, search, after)
+
+    if not page.lines:
+        await message.answer("Ничего не найдено.")
+        return
+
+    builder = InlineKeyboardBuilder()
+    if page.has_more:
+        builder.add(InlineKeyboardButton(text="Дальше", callback_data=SearchMore(after=page.last_id).pack()))
+    await message.answer('\n'.join(page.lines), parse_mode="HTML", reply_markup=builder.as_markup())
+
+
+@router.message(Command("search"))
+async def search_command(message: Message, command: CommandObject, state: FSMContext):
+    async with async_session() as session:
+        search, error = await parse_search(session, command.args)
+    if error:
+        await message.answer(error)
+        return
+
+    # Запрос хранится в FSM, в кнопке остаётся только позиция следующей страницы
+    await state.update_data(search=search._asdict())
+    await send_search_page(message, search, FIRST_PAGE)
+
+
+@router.callback_query(SearchMore.filter())
+async def search_more(call: CallbackQuery, callback_data: SearchMore, state: FSMContext):
+    data = await state.get_data()
+    if 'search' not in data:
+        await call.answer("Поиск устарел, повтори /search.")
+        return
+    await call.answer()
+    await send_search_page(call.message, SearchQuery(**data['search']), callback_data.after)
+
+
+@router.message(IngestStates.waiting_for_text, F.document | F.text)
+async def handle_file(message: Message, state: FSMContext):
+    # Разбор идёт в фоне: в очередь кладётся текст или file_id документа, ответ приходит сразу
+    ack_message = await message.answer("Текст принят, ставлю в очередь...")
+    try:
+        async with async_session() as session:
+            ahead = await enqueue_ingest(session, message, ack_message, text_content=message.text,
+                                         document=message.document)
+    except Exception as e:
+        await ack_message.edit_text(f"Не удалось поставить текст в очередь: {str(e)}")
+        return
+
+    # Сбрасывается только ожидание текста, данные /search нужны кнопке «Ещё» и после загрузки
+    await state.set_state(None)
 
+    if ahead:
+        await ack_message.edit_text(f"Текст в очереди, задач перед ним: {ahead}. Я пришлю результат, "
+                                    f"когда закончу. Состояние можно посмотреть командой /jobs.")
     else:
-        await message.answer("Сначала используй команду /init, чтобы отправить файл или текст.")
+        await ack_message.edit_text("Текст принят, начинаю обработку. Я пришлю результат, когда закончу.")
 
 
-@router.callback_query(F.data.in_({"text_choice", "image_choice", "stats_choice"}))
-async def handle_choice(call: CallbackQuery):
+@router.message(F.document | F.text)
+async def handle_without_init(message: Message):
+    await message.answer("Сначала используй команду /init, чтобы отправить файл или текст.")
+
+
+@router.callback_query(ResultChoice.filter())
+async def handle_choice(call: CallbackQuery, callback_data: ResultChoice):
     async with async_session() as session:
-        if call.data == "text_choice":
-            result = await session.execute(text("""
-                    with words as (
-                                    select
-                                        word_id,
-                                        coalesce(start_format_string, '') || coalesce(text, '') || coalesce(end_format_string, '') as text
-                                    from word w
-                                    left join dep_mapping dm on w.dep = dm.code
-                                    left join dep_formats df using(description)
-                                ), raw as (
-                                select ws.sentence_id,
-                                        sentence_number,
-                                                STRING_AGG(w.text, ' ' ORDER BY word_number)
-                        AS full_text
-                                FROM sentence_to_text stt
-                                    JOIN sentence s USING (sentence_id)
-                                    join word_to_sentence ws using (sentence_id)
-                                    join words w using (word_id)
-                                where meta_timestamp = (select max(meta_timestamp) from sentence_to_text)
-                                group by ws.sentence_id, sentence_number
-                                )
-                                select STRING_AGG(full_text, ' ' ORDER BY sentence_number) AS full_text from raw
-                    """))
-            last_file = result.fetchone()
+        if callback_data.uploaded is not None:
+            uploaded = datetime.fromtimestamp(callback_data.uploaded, timezone.utc).replace(tzinfo=None)
+        else:
+            result = await session.execute(queries.TEXT_UPLOADED, {"text_id": callback_data.text_id})
+            uploaded = result.scalar()
+        params = {"text_id": callback_data.text_id, "uploaded": uploaded, "user_id": call.from_user.id}
+
+        if callback_data.view == "text":
+            result = await session.execute(queries.RESULT_TEXT, params)
+            last_file = result.fetchall()
             if last_file:
-                full_text = last_file[0]
+                # Разметка сохраняется при загрузке, на лету размечаются только старые предложения без неё
+                dep_formats = None
+                sentences_html = []
+                for row in last_file:
+                    if row.html is None:
+                        dep_formats = dep_formats or await load_dep_formats(session)
+                        sentences_html.append(render_sentence_html(unpack_sentence(row), dep_formats))
+                    else:
+                        sentences_html.append(row.html)
+                full_text = ' '.join(sentences_html)
 
                 if len(full_text) <= 4096:
                     await call.message.answer(f"Вот содержимое файла:\n{DEP_DESCRIPTION}\n\n{full_text}", parse_mode="HTML")
                 else:
-                    with open("text_data.html", "w", encoding="utf-8") as file:
-                        file.write(f'<body><div>Памятка к тексту:<br>{DEP_DESCRIPTION}<br></div><br><div>{full_text}</div></body>')
-
-                    md_file = FSInputFile("text_data.html")
+                    html_text = f'<body><div>Памятка к тексту:<br>{DEP_DESCRIPTION}<br></div><br><div>{full_text}</div></body>'
+                    md_file = BufferedInputFile(html_text.encode("utf-8"), filename="text_data.html")
                     await call.message.answer_document(md_file, caption="Текст слишком большой, вот файл с текстом.")
 
-        elif call.data == "image_choice":
-            status = await create_and_send_graph(session)
-            if status:
-                if os.path.exists('graph.png'):
-                    photo_file = FSInputFile(path='graph.png')
-                    await call.message.answer_photo(photo=photo_file, caption="Вот ваша картинка:")
+        elif callback_data.view == "image":
+            graph = await create_and_send_graph(session, callback_data.text_id, call.from_user.id, uploaded)
+            if graph and graph.document:
+                pdf_file = BufferedInputFile(graph.document, filename='graph.pdf')
+                await call.message.answer_document(pdf_file, caption="Разбор по предложениям, по одному на странице.")
+            elif graph and len(graph.images) == 1:
+                photo_file = BufferedInputFile(graph.images[0], filename='graph.png')
+                await call.message.answer_photo(photo=photo_file, caption="Вот ваша картинка:")
+            elif graph:
+                album = MediaGroupBuilder(caption="Вот ваши картинки по предложениям:")
+                for number, image in enumerate(graph.images, start=1):
+                    album.add_photo(media=BufferedInputFile(image, filename=f'graph_{number}.png'))
+                await call.message.answer_media_group(media=album.build())
             else:
                 await call.message.answer("Не удалось создать картинку.")
 
-        elif call.data == "stats_choice":
-            result = await session.execute(text("""
-                        select w.lemma, dm.description as dep, count(*) from word w
-                            join word_to_sentence using(word_id)
-                            join sentence using(sentence_id)
-                            join sentence_to_text using(sentence_id)
-                            join dep_mapping dm on w.dep = dm.code
-                        where 1=1
-                            and meta_timestamp = (select max(meta_timestamp) from sentence_to_text)
-                            and pos != 'PUNCT'
-                        group by 1, 2
-                        order by 3 desc
-                        """))
+        elif callback_data.view == "stats":
+            result = await session.execute(queries.RESULT_STATS, params)
             stats = result.fetchall()
 
             if stats:
@@ -223,9 +301,9 @@ async def stats_choice(call: CallbackQuery):
 @router.callback_query(F.data == "generate_excel_report")
 async def handle_excel_report(call: CallbackQuery):
     try:
-        report_file_path = await generate_excel_report()
-        if os.path.exists(report_file_path):
-            excel_file = FSInputFile(path=report_file_path)
+        report = await generate_excel_report()
+        if report:
+            excel_file = BufferedInputFile(report, filename="report.xlsx")
             await call.message.answer_document(excel_file, caption="Вот ваш отчет в Excel.")
         else:
             await call.message.answer("Не удалось создать отчет.")
@@ -259,9 +337,60 @@ async def handle_graph_choice(call: CallbackQuery):
     if graph_function:
         await graph_function(call)
 
+async def warm_up():
+    await parser.start()
+    await asyncio.to_thread(charts.warm_up)
+    startup.mark('warm')
+
+
+async def on_startup():
+    global warmup_task
+    startup.mark('ready')
+    if STARTUP_WARMUP == 'background':
+        warmup_task = asyncio.create_task(warm_up())
+
+
+async def run_webhook():
+    app = web.Application()
+    SimpleRequestHandler(dispatcher=dp, bot=bot, secret_token=WEBHOOK_SECRET).register(app, path=WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT).start()
+    # Каждый экземпляр ставит один и тот же адрес, повторный вызов ничего не меняет
+    await bot.set_webhook(f"{WEBHOOK_URL.rstrip('/')}{WEBHOOK_PATH}", secret_token=WEBHOOK_SECRET,
+                          allowed_updates=dp.resolve_used_update_types())
+    logging.info("Вебхук слушает %s:%d%s", WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
 async def start_bot():
     dp.include_router(router)
-    await dp.start_polling(bot)
+    dp.startup.register(on_startup)
+    instrument_engine(engine)
+    start_metrics_server()
+    partitions = asyncio.create_task(maintain_partitions())
+    if STARTUP_WARMUP == 'eager':
+        await warm_up()
+    await ingest_workers.start(bot)
+    try:
+        if WEBHOOK_URL:
+            await run_webhook()
+        else:
+            await bot.delete_webhook()
+            await dp.start_polling(bot)
+    finally:
+        await ingest_workers.stop()
+        partitions.cancel()
+        if warmup_task:
+            warmup_task.cancel()
+        await dp.storage.close()
+        await shutdown_parser()
+        chart_renderer.shutdown()
 
 
 if __name__ == "__main__":
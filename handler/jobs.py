@@ -0,0 +1,303 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import timezone
+from typing import Optional
+from uuid import UUID, uuid4
+
+import aiohttp
+from aiogram.exceptions import TelegramAPIError, TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+from aiogram.filters.callback_data import CallbackData
+from aiogram.types import InlineKeyboardButton
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+
+from db import queries
+from db.database import async_session, engine
+from utils.extract import extract_paragraphs
+from utils.metrics import INGEST_JOBS, INGEST_JOB_RESULTS, stage
+from utils.parser import parse_text_and_save
+
+logger = logging.getLogger(__name__)
+
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", 2))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 3))
+JOB_RETRY_DELAY = int(os.getenv("JOB_RETRY_DELAY", 30))  # Секунды до первой повторной попытки, дальше удваивается
+JOB_POLL_INTERVAL = 5
+JOB_METRICS_INTERVAL = 15
+JOB_HEARTBEAT_INTERVAL = 30
+JOB_STALE_AFTER = 120  # Задача без отметки дольше этого считается брошенной упавшим экземпляром бота
+
+PROGRESS_EDIT_INTERVAL = 2
+
+TRANSIENT_ERRORS = (TelegramNetworkError, TelegramRetryAfter, TelegramServerError, OperationalError, InterfaceError,
+                    ConnectionError, asyncio.TimeoutError, aiohttp.ClientConnectionError)
+
+CLAIM_JOB = text("""
+    update ingest_job set status = 'running', attempts = attempts + 1, updated_at = now()
+    where job_id = (
+        select job_id from ingest_job
+        where status = 'queued' and run_after <= now()
+        order by run_after
+        for update skip locked
+        limit 1)
+    returning job_id, user_id, user_name, chat_id, message_id, text, file_id, file_name, attempts, text_id
+""").execution_options(query_name="jobs.claim")
+
+# Экземпляров бота может быть несколько, поэтому выполняемая задача регулярно обновляет updated_at,
+# а в очередь возвращаются только задачи, переставшие это делать
+RECOVER_JOBS = text("""
+    update ingest_job set status = 'queued', run_after = now(), updated_at = now()
+    where status = 'running' and updated_at < now() - make_interval(secs => :stale_after)
+""").execution_options(query_name="jobs.recover")
+
+HEARTBEAT_JOB = text("""
+    update ingest_job set updated_at = now() where job_id = :job_id and status = 'running'
+""").execution_options(query_name="jobs.heartbeat")
+
+RETRY_JOB = text("""
+    update ingest_job
+    set status = 'queued', last_error = :error, run_after = now() + make_interval(secs => :delay), updated_at = now()
+    where job_id = :job_id
+""").execution_options(query_name="jobs.retry")
+
+FAIL_JOB = text("""
+    update ingest_job set status = 'failed', last_error = :error, text = null, updated_at = now()
+    where job_id = :job_id
+""").execution_options(query_name="jobs.fail")
+
+FINISH_JOB = text("""
+    update ingest_job set status = 'done', uploaded = :uploaded, text = null, updated_at = now()
+    where job_id = :job_id
+""").execution_options(query_name="jobs.finish")
+
+TEXT_PROGRESS = text("""
+    select max(sentence_number) as saved, min(meta_timestamp) as uploaded from sentence_to_text where text_id = :text_id
+""").execution_options(query_name="jobs.text_progress")
+
+
+class ResultChoice(CallbackData, prefix="result"):
+    view: str
+    text_id: UUID
+    uploaded: Optional[int] = None  # Время загрузки в секундах, по нему выбирается секция с текстом
+
+
+def result_keyboard(text_id, uploaded):
+    # Время без часового пояса кодируется как UTC, обратное преобразование не зависит от TZ и перехода на летнее время
+    choice = {"text_id": text_id, "uploaded": int(uploaded.replace(tzinfo=timezone.utc).timestamp())}
+    builder = InlineKeyboardBuilder()
+    builder.add(InlineKeyboardButton(text="Текст", callback_data=ResultChoice(view="text", **choice).pack()))
+    builder.add(InlineKeyboardButton(text="Картинка", callback_data=ResultChoice(view="image", **choice).pack()))
+    builder.add(InlineKeyboardButton(text="Статистика", callback_data=ResultChoice(view="stats", **choice).pack()))
+    builder.adjust(1)
+    return builder.as_markup()
+
+
+class IngestProgress:
+    # Telegram ограничивает частоту редактирования сообщений, поэтому обновляем не чаще раза в интервал
+    def __init__(self, bot, chat_id, message_id, interval=PROGRESS_EDIT_INTERVAL):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.interval = interval
+        self.last_edit = time.monotonic()
+
+    async def edit(self, status, reply_markup=None):
+        try:
+            if self.message_id is None:
+                await self.bot.send_message(self.chat_id, status, reply_markup=reply_markup)
+            else:
+                await self.bot.edit_message_text(status, chat_id=self.chat_id, message_id=self.message_id,
+                                                 reply_markup=reply_markup)
+        except (TelegramAPIError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+            # Статус в чате вторичен, из-за него задача не должна падать
+            logger.warning("Не удалось обновить сообщение в чате %s: %s", self.chat_id, e)
+
+    async def update(self, done, total):
+        now = time.monotonic()
+        if now - self.last_edit < self.interval:
+            return
+        self.last_edit = now
+
+        if total:
+            await self.edit(f"Обрабатываю текст: {min(100, done * 100 // total)}%")
+        else:
+            await self.edit(f"Обрабатываю текст: {done} символов")
+
+
+async def enqueue_ingest(session, message, ack_message, text_content=None, document=None):
+    # text_id выдаётся заранее, чтобы повторная попытка могла продолжить частично записанный текст.
+    # Подзапрос в returning видит снимок до вставки, поэтому считает только задачи перед новой
+    result = await session.execute(text("""
+        insert into ingest_job(job_id, user_id, user_name, chat_id, message_id, status, text, file_id, file_name,
+                               text_id)
+        values (:job_id, :user_id, :user_name, :chat_id, :message_id, 'queued', :text, :file_id, :file_name,
+                :text_id)
+        returning (select count(*) from ingest_job where status in ('queued', 'running'))
+    """).execution_options(query_name="jobs.enqueue"), {
+        "job_id": uuid4(),
+        "user_id": message.from_user.id,
+        "user_name": message.from_user.full_name,
+        "chat_id": message.chat.id,
+        "message_id": ack_message.message_id,
+        "text": text_content,
+        "file_id": document.file_id if document else None,
+        "file_name": document.file_name if document else None,
+        "text_id": uuid4(),
+    })
+    ahead = result.scalar()
+    await session.commit()
+    ingest_workers.notify()
+    return ahead
+
+
+def _is_transient(error):
+    if isinstance(error, DBAPIError) and error.connection_invalidated:
+        return True
+    return isinstance(error, TRANSIENT_ERRORS)
+
+
+class IngestWorkers:
+    def __init__(self, concurrency=INGEST_WORKERS):
+        self.concurrency = concurrency
+        self.bot = None
+        self._wakeup = asyncio.Event()
+        self._tasks = []
+
+    def notify(self):
+        self._wakeup.set()
+
+    async def start(self, bot):
+        self.bot = bot
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.concurrency)]
+        self._tasks.append(asyncio.create_task(self._maintain_queue()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _claim(self):
+        async with engine.begin() as conn:
+            result = await conn.execute(CLAIM_JOB)
+            return result.fetchone()
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                job = await self._claim()
+            except Exception:
+                logger.exception("Не удалось взять задачу из очереди")
+                job = None
+
+            if job is None:
+                # Новая задача будит воркеры сразу, опрос нужен для отложенных повторов
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), JOB_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            heartbeat = asyncio.create_task(self._heartbeat(job.job_id))
+            try:
+                with stage('ingest_job'):
+                    await self._process(job)
+            except Exception:
+                # Воркер должен пережить любую ошибку, иначе очередь останется без обработчика
+                logger.exception("Задача %s: необработанная ошибка", job.job_id)
+            finally:
+                heartbeat.cancel()
+
+    async def _heartbeat(self, job_id):
+        while True:
+            await asyncio.sleep(JOB_HEARTBEAT_INTERVAL)
+            try:
+                async with engine.begin() as conn:
+                    await conn.execute(HEARTBEAT_JOB, {"job_id": job_id})
+            except Exception:
+                logger.exception("Не удалось обновить отметку задачи %s", job_id)
+
+    async def _process(self, job):
+        progress = IngestProgress(self.bot, job.chat_id, job.message_id)
+        try:
+            # Прерванная попытка могла успеть записать часть предложений, повтор продолжает с того же места
+            async with async_session() as session:
+                progress_row = (await session.execute(TEXT_PROGRESS, {"text_id": job.text_id})).fetchone()
+            resume = (progress_row.saved, progress_row.uploaded) if progress_row.saved else None
+
+            content = job.text
+            if job.file_id:
+                file_info = await self.bot.get_file(job.file_id)
+                file_content = await self.bot.download_file(file_info.file_path)
+                content = await extract_paragraphs(file_content, os.path.splitext(job.file_name)[1].lower())
+
+            await progress.edit("Обрабатываю текст...")
+            async with async_session() as session:
+                saved = await parse_text_and_save(content, job.user_id, session, job.user_name,
+                                                  progress=progress.update, text_id=job.text_id, resume=resume)
+        except Exception as e:
+            await self._fail(job, e, progress)
+            return
+
+        async with engine.begin() as conn:
+            await conn.execute(FINISH_JOB, {"job_id": job.job_id, "uploaded": saved.uploaded})
+        INGEST_JOB_RESULTS.labels('done').inc()
+        await progress.edit("Текст получен. Как ты хочешь увидеть результат: в виде текста, картинки или статистики?",
+                            reply_markup=result_keyboard(saved.text_id, saved.uploaded))
+
+    async def _fail(self, job, error, progress):
+        message = str(error) or type(error).__name__
+        # Повтор продолжит запись текста с последнего зафиксированного предложения
+        retry = _is_transient(error) and job.attempts < JOB_MAX_ATTEMPTS
+        saved = None
+        try:
+            async with engine.begin() as conn:
+                if retry:
+                    delay = JOB_RETRY_DELAY * 2 ** (job.attempts - 1)
+                    logger.warning("Задача %s: временная ошибка, повтор через %d с: %s", job.job_id, delay, message)
+                    await conn.execute(RETRY_JOB, {"job_id": job.job_id, "error": message, "delay": delay})
+                else:
+                    logger.error("Задача %s завершилась ошибкой: %s", job.job_id, message)
+                    await conn.execute(FAIL_JOB, {"job_id": job.job_id, "error": message})
+                    saved = (await conn.execute(TEXT_PROGRESS, {"text_id": job.text_id})).fetchone()
+        except Exception:
+            # Задача останется в статусе running и вернётся в очередь после JOB_STALE_AFTER
+            logger.exception("Задача %s: не удалось записать результат попытки", job.job_id)
+            return
+
+        if retry:
+            INGEST_JOB_RESULTS.labels('retry').inc()
+            await progress.edit("Временная ошибка при обработке, попробую ещё раз через несколько секунд.")
+        elif saved is not None and saved.saved:
+            # Записанная часть уже учтена в корпусе и статистике, поэтому сообщаем о ней, а не только об ошибке
+            INGEST_JOB_RESULTS.labels('failed').inc()
+            await progress.edit(f"Произошла ошибка при обработке файла: {message}\n"
+                                f"Успел сохранить предложений: {saved.saved}, их можно посмотреть.",
+                                reply_markup=result_keyboard(job.text_id, saved.uploaded))
+        else:
+            INGEST_JOB_RESULTS.labels('failed').inc()
+            await progress.edit(f"Произошла ошибка при обработке файла: {message}")
+
+    async def _maintain_queue(self):
+        while True:
+            try:
+                async with engine.begin() as conn:
+                    recovered = await conn.execute(RECOVER_JOBS, {"stale_after": JOB_STALE_AFTER})
+                if recovered.rowcount:
+                    logger.info("Возвращено в очередь прерванных задач: %d", recovered.rowcount)
+                    self.notify()
+
+                async with async_session() as session:
+                    counts = dict((await session.execute(queries.JOB_COUNTS)).fetchall())
+                for status in ('queued', 'running'):
+                    INGEST_JOBS.labels(status).set(counts.get(status, 0))
+            except Exception:
+                logger.exception("Не удалось обновить метрики очереди")
+            await asyncio.sleep(JOB_METRICS_INTERVAL)
+
+
+ingest_workers = IngestWorkers()
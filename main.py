@@ -1,5 +1,10 @@
+import logging
+
+from utils import startup
 from handler.bot import start_bot
 
 if __name__ == '__main__':
     import asyncio
+    logging.basicConfig(level=logging.INFO)
+    startup.mark('import')
     asyncio.run(start_bot())
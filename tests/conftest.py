@@ -0,0 +1,43 @@
+import asyncio
+import os
+
+import pytest
+
+# Тесты с базой очищают таблицы текстов, поэтому запускаются только против отдельной базы из TEST_DATABASE_URL.
+# Адрес подставляется до импорта db.database, чтобы движок приложения и миграции смотрели в неё же
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+if TEST_DATABASE_URL:
+    os.environ["DATABASE_URL"] = TEST_DATABASE_URL
+
+DATA_TABLES = ('token', 'sentence_to_text', 'sentence', 'ingest_job', 'fsm_state', 'parse_cache', 'user_info',
+               'stats_pos_dep', 'stats_lemma', 'stats_sentence_length', 'stats_length_pos', 'stats_user_dep',
+               'stats_daily_length', 'user_stats', 'user_stats_bucket')
+
+
+@pytest.fixture
+def database():
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL не задан")
+
+    from sqlalchemy import text
+
+    from db.database import engine, populate_initial_data
+    from db.migrate import upgrade_database
+
+    def run(coroutine):
+        # Соединения asyncpg привязаны к своему event loop, поэтому пул закрывается в конце каждого запуска
+        async def wrapper():
+            try:
+                return await coroutine
+            finally:
+                await engine.dispose()
+        return asyncio.run(wrapper())
+
+    async def prepare():
+        await upgrade_database()
+        await populate_initial_data()
+        async with engine.begin() as conn:
+            await conn.execute(text(f"truncate {', '.join(DATA_TABLES)} cascade"))
+
+    run(prepare())
+    return run
@@ -0,0 +1,23 @@
+from utils.charts import layout_dependency_tree
+
+
+def test_depths_follow_heads():
+    # «Мама мыла раму»: корень - «мыла», остальные слова зависят от него
+    xs, depths = layout_dependency_tree([1, 1, 1])
+    assert xs == [0, 1, 2]
+    assert depths == [1, 0, 1]
+
+
+def test_chain():
+    assert layout_dependency_tree([0, 0, 1, 2])[1] == [0, 1, 2, 3]
+
+
+def test_cycle_and_out_of_range_head_do_not_hang():
+    _, depths = layout_dependency_tree([1, 0, 7])
+    assert len(depths) == 3
+    assert depths[2] == 0
+    assert all(depth >= 0 for depth in depths)
+
+
+def test_empty_sentence():
+    assert layout_dependency_tree([]) == ([], [])
@@ -0,0 +1,32 @@
+import asyncio
+import io
+import os
+import shutil
+
+import pytest
+
+from utils.extract import extract_paragraphs
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+def _extract(data, extension):
+    async def run():
+        return list(await extract_paragraphs(io.BytesIO(data), extension))
+    return asyncio.run(run())
+
+
+def test_txt_paragraphs_are_normalized():
+    assert _extract("  Первый   абзац.\n\n\tВторой\n".encode('utf-8'), '.txt') == ["Первый абзац.", "Второй"]
+
+
+# Документ Word 97-2003 из тестовых данных olefile (BSD)
+@pytest.mark.skipif(shutil.which('antiword') is None, reason="antiword не установлен")
+def test_doc_is_extracted_with_antiword():
+    with open(os.path.join(FIXTURES, 'sample.doc'), 'rb') as document:
+        assert _extract(document.read(), '.doc') == ["Test OLE file, saved as Word 97-2003 Document."]
+
+
+def test_unsupported_extension():
+    with pytest.raises(Exception, match="Неподдерживаемый формат"):
+        _extract(b"", '.pdf')
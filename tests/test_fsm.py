@@ -0,0 +1,33 @@
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.fsm.storage.base import StorageKey
+
+from db.fsm import PostgresStorage
+
+
+class Form(StatesGroup):
+    name = State()
+
+
+FIRST = StorageKey(bot_id=1, chat_id=10, user_id=10)
+SECOND = StorageKey(bot_id=1, chat_id=20, user_id=20)
+
+
+async def _shared_between_instances():
+    # Два хранилища - как два экземпляра бота за балансировщиком
+    first, second = PostgresStorage(), PostgresStorage()
+    await first.set_state(FIRST, Form.name)
+    await first.set_data(FIRST, {"query": "мама", "page": 2})
+    shared = await second.get_state(FIRST), await second.get_data(FIRST)
+
+    await second.set_state(FIRST, None)
+    cleared = await first.get_state(FIRST), await first.get_data(FIRST)
+    other = await first.get_state(SECOND), await first.get_data(SECOND)
+    return shared, cleared, other
+
+
+def test_state_is_shared_between_instances(database):
+    shared, cleared, other = database(_shared_between_instances())
+    assert shared == (Form.name.state, {"query": "мама", "page": 2})
+    # Сброс состояния не трогает данные, например страницы поиска
+    assert cleared == (None, {"query": "мама", "page": 2})
+    assert other == (None, {})
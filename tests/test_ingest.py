@@ -0,0 +1,41 @@
+from utils.ingest import _split_long, split_into_chunks
+
+
+def test_short_paragraphs_share_a_chunk():
+    assert list(split_into_chunks("Первый абзац.\n\nВторой абзац.", chunk_chars=100)) == \
+        ["Первый абзац.\nВторой абзац."]
+
+
+def test_chunks_break_on_paragraphs():
+    chunks = list(split_into_chunks(["Раз два три.", "Четыре пять.", "Шесть."], chunk_chars=20))
+    assert chunks == ["Раз два три.", "Четыре пять.\nШесть."]
+    assert all(len(chunk) <= 20 for chunk in chunks)
+
+
+def test_long_paragraph_is_split_by_sentences():
+    paragraph = "Первое предложение. Второе предложение! Третье?"
+    assert list(split_into_chunks(paragraph, chunk_chars=25)) == \
+        ["Первое предложение.", "Второе предложение!", "Третье?"]
+
+
+def test_overlong_sentence_is_cut_on_spaces():
+    pieces = list(_split_long("слово " * 10, chunk_chars=15))
+    assert all(len(piece) <= 15 for piece in pieces)
+    assert ' '.join(pieces).split() == ["слово"] * 10
+
+
+def test_word_longer_than_chunk_is_cut_hard():
+    assert list(_split_long("а" * 25, chunk_chars=10)) == ["а" * 10, "а" * 10, "а" * 5]
+
+
+def test_empty_text_has_no_chunks():
+    assert list(split_into_chunks("\n \n")) == []
+
+
+def test_hard_wrapped_lines_stay_in_one_paragraph():
+    text = "Это длинное предложение,\nперенесённое   на другую\nстроку.\n\n  Второй абзац.  "
+    assert list(split_into_chunks(text)) == ["Это длинное предложение, перенесённое на другую строку.\nВторой абзац."]
+
+
+def test_whitespace_inside_extracted_paragraphs_is_collapsed():
+    assert list(split_into_chunks(["Раз\tдва\n три", "   "])) == ["Раз два три"]
@@ -0,0 +1,197 @@
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime
+from types import SimpleNamespace
+from uuid import uuid4
+
+from aiogram.exceptions import TelegramNetworkError
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+
+from db.database import async_session, engine
+from db.rollups import rebuild_rollups
+from handler import jobs
+from utils.ingest import TextWriter
+from utils.parser_pool import ParsedSentence, ParsedToken
+
+UPLOADED = datetime(2026, 10, 18, 12, 0)
+
+
+class _Connection:
+    def __init__(self, engine):
+        self.engine = engine
+
+    async def execute(self, statement, params=None):
+        name = statement.get_execution_options()['query_name']
+        self.engine.executed.append((name, params))
+        return SimpleNamespace(fetchone=lambda: SimpleNamespace(saved=self.engine.saved, uploaded=UPLOADED))
+
+
+class _Engine:
+    def __init__(self, saved=None, broken=False):
+        self.saved = saved
+        self.broken = broken
+        self.executed = []
+
+    @asynccontextmanager
+    async def begin(self):
+        if self.broken:
+            raise ConnectionError("база недоступна")
+        yield _Connection(self)
+
+
+class _Progress:
+    def __init__(self):
+        self.edits = []
+
+    async def edit(self, status, reply_markup=None):
+        self.edits.append((status, reply_markup))
+
+
+def _job(attempts=1):
+    return SimpleNamespace(job_id=uuid4(), text_id=uuid4(), attempts=attempts)
+
+
+def _fail(monkeypatch, engine, error, attempts=1):
+    monkeypatch.setattr(jobs, 'engine', engine)
+    progress = _Progress()
+    asyncio.run(jobs.IngestWorkers()._fail(_job(attempts), error, progress))
+    return [name for name, _ in engine.executed], progress.edits
+
+
+def test_transient_errors():
+    assert jobs._is_transient(TelegramNetworkError(method=None, message="timeout"))
+    assert jobs._is_transient(ConnectionError())
+    assert not jobs._is_transient(ValueError("битый файл"))
+    assert not jobs._is_transient(IntegrityError("insert", {}, Exception()))
+
+
+def test_transient_error_is_retried(monkeypatch):
+    executed, edits = _fail(monkeypatch, _Engine(), ConnectionError("обрыв"))
+    assert executed == ["jobs.retry"]
+    assert "попробую ещё раз" in edits[0][0]
+
+
+def test_last_attempt_fails_the_job(monkeypatch):
+    executed, edits = _fail(monkeypatch, _Engine(saved=None), ConnectionError("обрыв"), attempts=jobs.JOB_MAX_ATTEMPTS)
+    assert executed == ["jobs.fail", "jobs.text_progress"]
+    assert edits == [("Произошла ошибка при обработке файла: обрыв", None)]
+
+
+def test_failed_job_with_saved_part_shows_it(monkeypatch):
+    executed, edits = _fail(monkeypatch, _Engine(saved=40), ValueError("битый абзац"))
+    assert executed == ["jobs.fail", "jobs.text_progress"]
+    assert "предложений: 40" in edits[0][0]
+    assert edits[0][1] is not None
+
+
+def test_fail_survives_database_errors(monkeypatch):
+    executed, edits = _fail(monkeypatch, _Engine(broken=True), ValueError("битый файл"))
+    assert executed == [] and edits == []
+
+
+def test_worker_survives_job_errors(monkeypatch):
+    claimed = [_job(), _job()]
+    processed = []
+
+    async def claim(self):
+        return claimed.pop(0) if claimed else None
+
+    async def process(self, job):
+        processed.append(job)
+        raise RuntimeError("ошибка после разбора")
+
+    monkeypatch.setattr(jobs.IngestWorkers, '_claim', claim)
+    monkeypatch.setattr(jobs.IngestWorkers, '_process', process)
+    monkeypatch.setattr(jobs, 'JOB_POLL_INTERVAL', 0.01)
+
+    async def run():
+        task = asyncio.create_task(jobs.IngestWorkers()._run())
+        await asyncio.sleep(0.1)
+        task.cancel()
+
+    asyncio.run(run())
+    assert len(processed) == 2
+
+
+def _sentence(*words):
+    return ParsedSentence(' '.join(words), [ParsedToken(word, 'NOUN', 'ROOT', word, 0, i, 0)
+                                             for i, word in enumerate(words)])
+
+
+def test_resumed_writer_skips_saved_sentences():
+    writer = TextWriter(None, uuid4(), 1, UPLOADED, saved_sentences=2)
+    writer.add([_sentence("раз"), _sentence("два", "три")])
+    writer.add([_sentence("четыре")])
+    assert writer.file_counted
+    assert [(number, [token.i for token in sent.tokens]) for number, sent in writer.sentences] == [(3, [3])]
+
+
+async def _enqueue(count):
+    message = SimpleNamespace(from_user=SimpleNamespace(id=1, full_name="first"), chat=SimpleNamespace(id=1))
+    positions = []
+    for i in range(count):
+        async with async_session() as session:
+            positions.append(await jobs.enqueue_ingest(session, message, SimpleNamespace(message_id=i),
+                                                       text_content=f"Текст {i}."))
+    return positions
+
+
+async def _claim_queue():
+    positions = await _enqueue(3)
+    workers = jobs.IngestWorkers()
+    first, second = await asyncio.gather(workers._claim(), workers._claim())
+    third = await workers._claim()
+    empty = await workers._claim()
+
+    # Временная ошибка откладывает задачу, брошенная упавшим экземпляром задача возвращается в очередь
+    async with engine.begin() as conn:
+        await conn.execute(jobs.RETRY_JOB, {"job_id": first.job_id, "error": "обрыв", "delay": 3600})
+        await conn.execute(text("update ingest_job set updated_at = now() - interval '1 hour' where job_id = :job_id"),
+                           {"job_id": second.job_id})
+        recovered = await conn.execute(jobs.RECOVER_JOBS, {"stale_after": jobs.JOB_STALE_AFTER})
+    again = await workers._claim()
+    return positions, (first, second, third, empty), recovered.rowcount, again
+
+
+def test_claim_takes_each_job_once(database):
+    positions, (first, second, third, empty), recovered, again = database(_claim_queue())
+    assert positions == [0, 1, 2]
+    assert len({first.job_id, second.job_id, third.job_id}) == 3
+    assert [first.attempts, second.attempts, third.attempts] == [1, 1, 1]
+    assert empty is None
+    assert recovered == 1
+    assert again.job_id == second.job_id and again.attempts == 2
+
+
+async def _resume_after_failure():
+    async with engine.begin() as conn:
+        await conn.execute(text("insert into user_info(user_id, user_name) values (1, 'first')"))
+    text_id = uuid4()
+    sentences = [_sentence("Мама", "мыла", "раму"), _sentence("Рама", "чистая"), _sentence("Конец")]
+
+    async with async_session() as session:
+        writer = TextWriter(session, text_id, 1, UPLOADED)
+        writer.add(sentences[:2])
+        await writer.flush()
+        # Первая попытка обрывается после первой порции, вторая разбирает текст заново
+    async with async_session() as session:
+        saved, uploaded = (await session.execute(jobs.TEXT_PROGRESS, {"text_id": text_id})).fetchone()
+        writer = TextWriter(session, text_id, 1, uploaded, saved_sentences=saved)
+        writer.add(sentences)
+        await writer.flush()
+
+    async with engine.begin() as conn:
+        numbers = (await conn.execute(text("""
+            select sentence_number, meta_timestamp from sentence_to_text where text_id = :text_id order by 1
+        """), {"text_id": text_id})).fetchall()
+        user_stats = (await conn.execute(text("select words, sentences, files from user_stats"))).fetchall()
+        await rebuild_rollups(conn)
+        rebuilt = (await conn.execute(text("select words, sentences, files from user_stats"))).fetchall()
+    return numbers, user_stats, rebuilt
+
+
+def test_retry_resumes_partially_saved_text(database):
+    numbers, user_stats, rebuilt = database(_resume_after_failure())
+    assert numbers == [(1, UPLOADED), (2, UPLOADED), (3, UPLOADED)]
+    assert user_stats == rebuilt == [(6, 3, 1)]
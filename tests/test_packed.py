@@ -0,0 +1,36 @@
+from types import SimpleNamespace
+
+from db.packed import PackedToken, locate_tokens, pack_sentence, unpack_sentence
+from utils.parser_pool import ParsedToken
+
+POS_IDS = {'NOUN': 1, 'VERB': 2, 'PUNCT': 3}
+DEP_IDS = {'nsubj': 1, 'ROOT': 2, 'obj': 3, 'punct': 4}
+LEMMA_IDS = {'мама': 10, 'мыть': 11, 'рама': 12, '.': 13}
+
+
+def _row(text, packed):
+    columns = ('pos_ids', 'dep_ids', 'lemma_ids', 'heads', 'token_starts', 'token_ends')
+    return SimpleNamespace(text=text, **dict(zip(columns, packed)))
+
+
+def test_pack_and_unpack_round_trip():
+    # Номера токенов идут от начала документа, в упакованном виде главные слова считаются от начала предложения
+    text = "Мама мыла раму."
+    tokens = [ParsedToken("Мама", 'NOUN', 'nsubj', 'мама', 6, 5, 0),
+              ParsedToken("мыла", 'VERB', 'ROOT', 'мыть', 6, 6, 5),
+              ParsedToken("раму", 'NOUN', 'obj', 'рама', 6, 7, 10),
+              ParsedToken(".", 'PUNCT', 'punct', '.', 6, 8, 14)]
+
+    packed = pack_sentence(tokens, POS_IDS, DEP_IDS, LEMMA_IDS)
+    assert packed[3] == [1, 1, 1, 1]
+
+    assert unpack_sentence(_row(text, packed)) == [PackedToken("Мама", 1, 1, 10, 1), PackedToken("мыла", 2, 2, 11, 1),
+                                                   PackedToken("раму", 1, 3, 12, 1), PackedToken(".", 3, 4, 13, 1)]
+
+
+def test_unpack_sentence_without_packed_parse():
+    assert unpack_sentence(_row("Старое предложение.", [None] * 6)) == []
+
+
+def test_locate_tokens():
+    assert locate_tokens("Мама мыла раму.", ["Мама", "мыла", "раму", "."]) == ([0, 5, 10, 14], [4, 9, 14, 15])
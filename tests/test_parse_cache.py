@@ -0,0 +1,72 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+from sqlalchemy.dialects import postgresql
+
+from db.bulk import MAX_QUERY_PARAMS
+from utils import parse_cache as parse_cache_module
+from utils.parse_cache import ParseCache, join_segments, segment_key, split_segments
+from utils.parser_pool import ParsedSentence, ParsedToken
+
+
+def test_segments_are_paragraphs():
+    assert split_segments("Первый абзац.\n\nВторой абзац.\n") == ["Первый абзац.", "Второй абзац."]
+
+
+def test_abbreviations_stay_in_one_segment():
+    text = "А. С. Пушкин родился в Москве, т. е. не в Петербурге."
+    assert split_segments(text) == [text]
+
+
+def test_blank_lines_are_skipped():
+    assert split_segments("\n  \nТекст\n") == ["Текст"]
+
+
+def test_key_ignores_whitespace_but_not_model():
+    assert segment_key("Мама  мыла\tраму", "ru_core_news_sm") == segment_key("Мама мыла раму", "ru_core_news_sm")
+    assert segment_key("Мама мыла раму", "ru_core_news_sm") != segment_key("Мама мыла раму", "ru_core_news_lg")
+
+
+def _sentence(*words):
+    return ParsedSentence(' '.join(words), [ParsedToken(word, 'X', 'ROOT', word, 0, i, 0)
+                                             for i, word in enumerate(words)])
+
+
+def test_join_segments_continues_token_numbers():
+    joined = join_segments([[_sentence("раз", "два")], [_sentence("три")]])
+    assert [[(token.i, token.head) for token in sent.tokens] for sent in joined] == [[(0, 0), (1, 0)], [(2, 2)]]
+
+
+class _Connection:
+    def __init__(self, params):
+        self.params = params
+
+    async def execute(self, statement):
+        # in_ компилируется в один раскрываемый параметр, asyncpg получает каждый элемент списка отдельно
+        params = statement.compile(dialect=postgresql.dialect()).params.values()
+        self.params.append(sum(len(value) if isinstance(value, list) else 1 for value in params))
+        return []
+
+
+class _Engine:
+    def __init__(self):
+        self.params = []
+
+    @asynccontextmanager
+    async def connect(self):
+        yield _Connection(self.params)
+
+    begin = connect
+
+
+def test_load_and_store_stay_under_the_parameter_limit(monkeypatch):
+    engine = _Engine()
+    monkeypatch.setattr(parse_cache_module, 'engine', engine)
+    keys = [segment_key(str(number), "model") for number in range(MAX_QUERY_PARAMS + 10)]
+
+    cache = ParseCache()
+    asyncio.run(cache._load(keys))
+    asyncio.run(cache._store([(key, [_sentence("слово")]) for key in keys]))
+
+    assert len(engine.params) > 2
+    assert all(count <= MAX_QUERY_PARAMS for count in engine.params)
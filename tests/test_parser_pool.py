@@ -0,0 +1,27 @@
+import pytest
+
+from utils.parser_pool import serialize_doc
+
+spacy = pytest.importorskip('spacy')
+
+
+@pytest.fixture(scope='module')
+def nlp():
+    nlp = spacy.blank('ru')
+    nlp.add_pipe('sentencizer')
+    return nlp
+
+
+def test_space_tokens_are_dropped_and_renumbered(nlp):
+    sentences = serialize_doc(nlp("Первый абзац.\nВторой абзац."))
+    assert [sent.text for sent in sentences] == ["Первый абзац.", "Второй абзац."]
+    tokens = [token for sent in sentences for token in sent.tokens]
+    assert [token.text for token in tokens] == ["Первый", "абзац", ".", "Второй", "абзац", "."]
+    assert [token.i for token in tokens] == list(range(6))
+    assert [token.head for token in tokens] == list(range(6))
+    # Смещения считаются от первого непробельного токена предложения
+    assert [(token.offset, token.text) for token in sentences[1].tokens] == [(0, "Второй"), (7, "абзац"), (12, ".")]
+
+
+def test_whitespace_only_sentence_is_skipped(nlp):
+    assert serialize_doc(nlp("\n\n")) == []
@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+from utils.parser_pool import ParsedSentence, ParsedToken, decode_sentences
+from utils.parser_service import BATCHER, MicroBatcher, handle_parse
+
+
+class _Pool:
+    def __init__(self, workers=1, delay=0.0, error=None):
+        self.workers = workers
+        self.delay = delay
+        self.error = error
+        self.batches = []
+
+    async def parse_many(self, texts):
+        texts = list(texts)
+        self.batches.append(texts)
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return [[ParsedSentence(text, [ParsedToken(text, 'X', 'ROOT', text, 0, 0, 0)])] for text in texts]
+
+
+async def _parse_all(batcher, texts):
+    batcher.start()
+    try:
+        return await asyncio.gather(*(batcher.parse(text) for text in texts), return_exceptions=True)
+    finally:
+        await batcher.stop()
+
+
+def test_concurrent_requests_share_one_batch():
+    pool = _Pool()
+    results = asyncio.run(_parse_all(MicroBatcher(pool, max_batch=32, max_wait=0.05), ["раз", "два", "три"]))
+    assert pool.batches == [["раз", "два", "три"]]
+    assert [sentences[0].text for sentences in results] == ["раз", "два", "три"]
+
+
+def test_batch_is_limited_by_max_batch():
+    pool = _Pool(workers=3)
+    asyncio.run(_parse_all(MicroBatcher(pool, max_batch=2, max_wait=0.05), ["1", "2", "3", "4", "5"]))
+    assert [len(batch) for batch in pool.batches] == [2, 2, 1]
+
+
+def test_next_batch_collects_while_workers_are_busy():
+    pool = _Pool(workers=1, delay=0.1)
+
+    async def run():
+        batcher = MicroBatcher(pool, max_batch=32, max_wait=0.01)
+        batcher.start()
+        first = asyncio.create_task(batcher.parse("первый"))
+        await asyncio.sleep(0.03)
+        rest = [asyncio.create_task(batcher.parse(text)) for text in ("второй", "третий")]
+        await asyncio.gather(first, *rest)
+        await batcher.stop()
+
+    asyncio.run(run())
+    assert pool.batches == [["первый"], ["второй", "третий"]]
+
+
+def test_pool_error_fails_only_its_batch():
+    pool = _Pool(error=RuntimeError("воркер упал"))
+
+    async def run():
+        batcher = MicroBatcher(pool, max_batch=32, max_wait=0.01)
+        batcher.start()
+        failed = await asyncio.gather(batcher.parse("раз"), batcher.parse("два"), return_exceptions=True)
+        pool.error = None
+        recovered = await batcher.parse("три")
+        await batcher.stop()
+        return failed, recovered
+
+    failed, recovered = asyncio.run(run())
+    assert [str(error) for error in failed] == ["воркер упал", "воркер упал"]
+    assert recovered[0].text == "три"
+
+
+async def _post(payload):
+    app = web.Application()
+    batcher = app[BATCHER] = MicroBatcher(_Pool(), max_batch=32, max_wait=0.01)
+    app.router.add_post('/parse', handle_parse)
+    async with TestClient(TestServer(app)) as client:
+        batcher.start()
+        try:
+            response = await client.post('/parse', json=payload)
+            if response.status != 200:
+                return response.status, None
+            return response.status, await response.json()
+        finally:
+            await batcher.stop()
+
+
+def test_parse_endpoint_returns_parses_in_request_order():
+    status, body = asyncio.run(_post({"texts": ["раз", "два"]}))
+    assert status == 200
+    assert [decode_sentences(parse)[0].text for parse in body["parses"]] == ["раз", "два"]
+
+
+@pytest.mark.parametrize("payload", [{}, {"texts": "раз"}, {"texts": [1]}])
+def test_parse_endpoint_rejects_bad_payload(payload):
+    status, _ = asyncio.run(_post(payload))
+    assert status == 400
@@ -0,0 +1,25 @@
+import pytest
+
+from utils import parser_pool
+from utils.parser_pool import PARSE_PROFILES, resolve_profile
+
+
+@pytest.fixture
+def overrides(monkeypatch):
+    monkeypatch.setattr(parser_pool, 'PARSE_PROFILE', 'fast')
+    monkeypatch.setattr(parser_pool, 'SPACY_MODEL', 'ru_custom_model')
+    monkeypatch.setattr(parser_pool, 'PARSER_BATCH_SIZE', '8')
+
+
+def test_overrides_apply_to_active_profile(overrides):
+    assert resolve_profile('fast') == PARSE_PROFILES['fast']._replace(model='ru_custom_model', batch_size=8)
+
+
+def test_other_profiles_keep_their_model(overrides):
+    # Иначе эталон bench.profiles разбирал бы той же моделью, что и сравниваемый профиль
+    assert resolve_profile('accurate') == PARSE_PROFILES['accurate']
+
+
+def test_unknown_profile():
+    with pytest.raises(ValueError, match="Неизвестный профиль"):
+        resolve_profile('fastest')
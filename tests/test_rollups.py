@@ -0,0 +1,65 @@
+from datetime import date, datetime
+from uuid import uuid4
+
+from sqlalchemy import text
+
+from db.database import async_session, engine
+from db.rollups import bucket_start, rebuild_rollups
+from utils.ingest import TextWriter
+from utils.parser_pool import ParsedSentence, ParsedToken
+
+ROLLUP_TABLES = ('stats_pos_dep', 'stats_lemma', 'stats_sentence_length', 'stats_length_pos', 'stats_user_dep',
+                 'stats_daily_length', 'user_stats', 'user_stats_bucket')
+
+
+def _sentence(*tokens):
+    return ParsedSentence(' '.join(word for word, _, _ in tokens), [ParsedToken(word, pos, dep, word.lower(), 0, i, 0)
+                                                                     for i, (word, pos, dep) in enumerate(tokens)])
+
+
+SENTENCES = [
+    _sentence(("Мама", "NOUN", "nsubj"), ("мыла", "VERB", "ROOT"), ("раму", "NOUN", "obj"), (".", "PUNCT", "punct")),
+    _sentence(("Рама", "NOUN", "ROOT"), ("чистая", "ADJ", "amod"), ("!", "PUNCT", "punct")),
+    _sentence(("…", "PUNCT", "ROOT")),
+]
+
+
+def test_bucket_start_matches_date_trunc():
+    # 18 октября 2026 - воскресенье
+    assert bucket_start('week', date(2026, 10, 18)) == date(2026, 10, 12)
+    assert bucket_start('week', date(2026, 10, 12)) == date(2026, 10, 12)
+    assert bucket_start('month', date(2026, 10, 18)) == date(2026, 10, 1)
+
+
+async def _snapshot(conn):
+    return {table: sorted(tuple(row) for row in await conn.execute(text(f"select * from {table}")))
+            for table in ROLLUP_TABLES}
+
+
+async def _ingest_and_rebuild():
+    async with engine.begin() as conn:
+        await conn.execute(text("insert into user_info(user_id, user_name) values (1, 'first'), (2, 'second')"))
+
+    # Загрузки попадают в разные месяцы, недели и дни
+    uploads = [(1, datetime(2026, 9, 30, 23, 0)), (1, datetime(2026, 10, 18, 10, 0)),
+               (2, datetime(2026, 10, 18, 11, 0))]
+    for user_id, time in uploads:
+        async with async_session() as session:
+            writer = TextWriter(session, uuid4(), user_id, time)
+            # Две порции одного текста: файл должен засчитаться один раз
+            writer.add(SENTENCES[:2])
+            await writer.flush()
+            writer.add(SENTENCES[2:])
+            await writer.flush()
+
+    async with engine.begin() as conn:
+        incremental = await _snapshot(conn)
+        await rebuild_rollups(conn)
+        rebuilt = await _snapshot(conn)
+    return incremental, rebuilt
+
+
+def test_incremental_rollups_match_rebuild(database):
+    incremental, rebuilt = database(_ingest_and_rebuild())
+    assert incremental['user_stats_bucket']
+    assert incremental == rebuilt
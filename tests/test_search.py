@@ -0,0 +1,88 @@
+import asyncio
+from datetime import datetime
+from uuid import uuid4
+
+from sqlalchemy import text
+
+from db.database import async_session, engine
+from utils import search as search_module
+from utils.ingest import TextWriter
+from utils.parser_pool import ParsedSentence, ParsedToken
+from utils.search import parse_search, search_page
+
+
+def _sentence(*tokens):
+    # Токены задаются как (слово, лемма, часть речи, роль), смещения считаются по тексту через пробел
+    parsed = []
+    offset = 0
+    for i, (word, lemma, pos, dep) in enumerate(tokens):
+        parsed.append(ParsedToken(word, pos, dep, lemma, 0, i, offset))
+        offset += len(word) + 1
+    return ParsedSentence(' '.join(token.text for token in parsed), parsed)
+
+
+def _mother(case, dep, number):
+    return _sentence((case, "мама", "NOUN", dep), ("пришла", "прийти", "VERB", "ROOT"),
+                     (str(number), str(number), "NUM", "nummod"))
+
+
+SENTENCES = [_mother("Мама", "nsubj", number) for number in range(5)] + [
+    _mother("Маму", "obj", 5),
+    _sentence(("Папа", "папа", "NOUN", "nsubj"), ("<спит>", "спать", "VERB", "ROOT")),
+]
+
+
+async def _search(args, pages_limit=3):
+    async with engine.begin() as conn:
+        await conn.execute(text("insert into user_info(user_id, user_name) values (1, 'first')"))
+    async with async_session() as session:
+        writer = TextWriter(session, uuid4(), 1, datetime(2026, 10, 18, 12, 0))
+        writer.add(SENTENCES)
+        await writer.flush()
+
+    results = {}
+    async with async_session() as session:
+        for arg in args:
+            search, error = await parse_search(session, arg)
+            if error:
+                results[arg] = error
+                continue
+            pages = []
+            after = search_module.FIRST_PAGE
+            while True:
+                page = await search_page(session, search, after, limit=pages_limit)
+                pages.append(page.lines)
+                if not page.has_more:
+                    break
+                after = page.last_id
+            results[arg] = pages
+    return results
+
+
+def test_usage_errors_do_not_touch_the_database():
+    for args in ("", "мама папа", "мама case:nom"):
+        search, error = asyncio.run(parse_search(None, args))
+        assert search is None and error.startswith("Используй /search")
+
+
+def test_search_pages_and_filters(database):
+    results = database(_search(["мама", "=Маму", "мама dep:obj", "Папа", "дочь", "мама pos:XYZ", "мама dep:xyz"]))
+
+    pages = results["мама"]
+    assert [len(lines) for lines in pages] == [3, 3]
+    lines = [line for page in pages for line in page]
+    assert sorted(lines) == [f"• <b>Мама</b> пришла {number}" for number in range(5)] + ["• <b>Маму</b> пришла 5"]
+
+    assert results["=Маму"] == [["• <b>Маму</b> пришла 5"]]
+    assert results["мама dep:obj"] == [["• <b>Маму</b> пришла 5"]]
+    assert results["Папа"] == [["• <b>Папа</b> &lt;спит&gt;"]]
+    assert results["дочь"] == "Слово «дочь» в корпусе не встречается."
+    assert results["мама pos:XYZ"] == "Неизвестная часть речи: XYZ"
+    assert results["мама dep:xyz"] == "Неизвестная синтаксическая роль: xyz"
+
+
+def test_long_page_is_cut_before_message_limit(database, monkeypatch):
+    # Вторая строка уже не помещается в сообщение и открывает следующую страницу
+    monkeypatch.setattr(search_module, 'MESSAGE_LIMIT', len("• <b>Мама</b> пришла 0") + 5)
+    pages = database(_search(["мама"], pages_limit=10))["мама"]
+    assert [len(lines) for lines in pages] == [1] * 6
@@ -0,0 +1,79 @@
+import asyncio
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+from sqlalchemy.dialects import postgresql
+
+from db import vocab as vocab_module
+from db.database import WordForm
+from db.vocab import Vocabulary
+
+
+class _Connection:
+    def __init__(self, table):
+        self.table = table
+
+    async def execute(self, statement):
+        params = list(statement.compile(dialect=postgresql.dialect()).params.values())
+        if statement.is_insert:
+            self.table.inserts.append(len(params))
+            for value in params:
+                self.table.ids.setdefault(value, len(self.table.ids) + 1)
+            return None
+        # Запрос id получает список значений одним раскрываемым параметром
+        return [(value, self.table.ids[value]) for value in params[0]]
+
+
+class _Table:
+    def __init__(self):
+        self.ids = {}
+        self.inserts = []
+
+    @asynccontextmanager
+    async def begin(self):
+        yield _Connection(self)
+
+
+def _intern(vocabulary, table, values):
+    return asyncio.run(vocabulary.intern(SimpleNamespace(bind=table), values))
+
+
+def test_new_values_get_stable_ids():
+    table = _Table()
+    vocabulary = Vocabulary(WordForm, 'text')
+    first = _intern(vocabulary, table, ["мама", "мыла", "мама"])
+    assert table.inserts == [2]
+    assert first == {"мама": table.ids["мама"], "мыла": table.ids["мыла"]}
+
+    second = _intern(vocabulary, table, ["раму", "мама"])
+    assert table.inserts == [2, 1]
+    assert second["мама"] == first["мама"] and second["раму"] == table.ids["раму"]
+
+
+def test_cached_values_skip_the_database():
+    table = _Table()
+    vocabulary = Vocabulary(WordForm, 'text')
+    first = _intern(vocabulary, table, ["мама", "мыла"])
+    assert _intern(vocabulary, table, ["мыла", "мама"]) == first
+    assert table.inserts == [2]
+
+
+def test_cache_evicts_least_recently_used():
+    table = _Table()
+    vocabulary = Vocabulary(WordForm, 'text', max_size=2)
+    _intern(vocabulary, table, ["раз"])
+    _intern(vocabulary, table, ["два"])
+    _intern(vocabulary, table, ["раз"])
+    _intern(vocabulary, table, ["три"])
+    assert len(vocabulary) == 2
+    # «два» вытеснено и запрашивается снова, но получает прежний id
+    assert _intern(vocabulary, table, ["два"]) == {"два": 2}
+    assert table.inserts == [1, 1, 1, 1]
+
+
+def test_large_batches_are_chunked(monkeypatch):
+    monkeypatch.setattr(vocab_module, 'MAX_QUERY_PARAMS', 3)
+    table = _Table()
+    ids = _intern(Vocabulary(WordForm, 'text'), table, [str(i) for i in range(7)])
+    assert sorted(table.inserts) == [1, 3, 3]
+    assert sorted(ids.values()) == list(range(1, 8))
@@ -0,0 +1,31 @@
+import html
+
+from db import queries
+
+
+async def load_dep_formats(session):
+    result = await session.execute(queries.DEP_FORMATS)
+    return {row.id: (row.start_format, row.end_format) for row in result}
+
+
+async def load_dep_formats_by_code(session):
+    # При загрузке текста id новых зависимостей ещё не известны, поэтому форматы берутся по коду
+    result = await session.execute(queries.DEP_FORMATS_BY_CODE)
+    return {row.code: (row.start_format, row.end_format) for row in result}
+
+
+async def load_dep_descriptions(session):
+    result = await session.execute(queries.DEP_DESCRIPTIONS)
+    return {row.id: row.description for row in result}
+
+
+def _render(words):
+    return ' '.join(f"{start_format}{html.escape(text)}{end_format}" for text, (start_format, end_format) in words)
+
+
+def render_sentence_html(tokens, dep_formats):
+    return _render((token.text, dep_formats.get(token.dep_id, ('', ''))) for token in tokens)
+
+
+def render_parsed_html(tokens, dep_formats_by_code):
+    return _render((token.text, dep_formats_by_code.get(token.dep, ('', ''))) for token in tokens)
@@ -0,0 +1,182 @@
+from io import BytesIO
+
+
+# Все функции получают простые списки и возвращают PNG (или PDF), глобальное состояние pyplot не используется,
+# поэтому их можно выполнять параллельно в потоках или процессах.
+# matplotlib импортируется при первом рисовании, чтобы не задерживать старт бота
+
+
+def warm_up():
+    # Пустая картинка подгружает backend и шрифты заранее
+    _png_bytes(_new_figure())
+
+
+def _new_figure(figsize=None):
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    figure = Figure(figsize=figsize)
+    FigureCanvasAgg(figure)
+    return figure
+
+
+def _png_bytes(figure):
+    buffer = BytesIO()
+    figure.savefig(buffer, format='png')
+    return buffer.getvalue()
+
+
+def draw_pie(labels, counts):
+    figure = _new_figure()
+    ax = figure.subplots()
+    ax.pie(counts, labels=labels, autopct='%1.1f%%', startangle=90)
+    ax.axis('equal')
+    return _png_bytes(figure)
+
+
+def draw_sentence_length_histogram(word_counts, sentence_counts):
+    figure = _new_figure(figsize=(10, 6))
+    ax = figure.subplots()
+    ax.hist(word_counts, weights=sentence_counts, bins=range(1, max(word_counts) + 2), edgecolor='black', alpha=0.7)
+    ax.set_title('Распределение предложений по количеству слов')
+    ax.set_xlabel('Количество слов в предложении')
+    ax.set_ylabel('Количество предложений')
+    return _png_bytes(figure)
+
+
+def draw_top_words(words, word_counts):
+    figure = _new_figure(figsize=(10, 6))
+    ax = figure.subplots()
+    ax.barh(words, word_counts, color='skyblue')
+    ax.set_xlabel('Количество повторений')
+    ax.set_title('Топ-10 самых частых слов')
+    ax.invert_yaxis()
+    return _png_bytes(figure)
+
+
+def draw_pos_vs_sentence_length(pos_categories):
+    figure = _new_figure(figsize=(12, 6))
+    ax = figure.subplots()
+
+    for pos, freq_data in pos_categories.items():
+        lengths = sorted(freq_data.keys())
+        freqs = [freq_data[length] for length in lengths]
+        ax.plot(lengths, freqs, label=pos)
+
+    ax.set_xlabel('Длина предложения (в словах)')
+    ax.set_ylabel('Частота появления части речи')
+    ax.set_title('Частота появления частей речи в зависимости от длины предложений')
+    ax.legend(title='Часть речи')
+    ax.grid(True)
+    return _png_bytes(figure)
+
+
+def draw_user_syntax_statistics(user_data):
+    figure = _new_figure(figsize=(14, 7))
+    ax = figure.subplots()
+
+    for user_id, dep_freq in user_data.items():
+        deps = list(dep_freq.keys())
+        counts = list(dep_freq.values())
+        ax.bar(deps, counts, alpha=0.6, label=f'User {user_id}')
+
+    ax.set_xlabel('Синтаксические конструкции (dep)')
+    ax.set_ylabel('Частота использования')
+    ax.set_title('Частота использования синтаксических конструкций пользователями')
+    ax.legend(title='Пользователи', loc='upper right')
+    ax.tick_params(axis='x', labelrotation=45)
+    ax.grid(True)
+    return _png_bytes(figure)
+
+
+def draw_sentence_length_over_time(dates, avg_lengths):
+    figure = _new_figure(figsize=(10, 6))
+    ax = figure.subplots()
+    ax.plot(dates, avg_lengths, marker='o', linestyle='-', color='b')
+    ax.set_xlabel('Дата')
+    ax.set_ylabel('Средняя длина предложения (в словах)')
+    ax.set_title('Изменение средней длины предложений со временем')
+    ax.tick_params(axis='x', labelrotation=45)
+    ax.grid(True)
+    return _png_bytes(figure)
+
+
+def draw_pos_dependency_heatmap(pos_labels, dep_labels, matrix):
+    import seaborn as sns
+
+    figure = _new_figure(figsize=(12, 8))
+    ax = figure.subplots()
+    sns.heatmap(matrix, xticklabels=dep_labels, yticklabels=pos_labels, annot=False, cmap='coolwarm',
+                linewidths=.5, vmin=0, vmax=1, ax=ax)
+    ax.set_title('Корреляция между частями речи и синтаксическими зависимостями')
+    ax.set_xlabel('Синтаксическая зависимость')
+    ax.set_ylabel('Часть речи')
+    return _png_bytes(figure)
+
+
+def layout_dependency_tree(heads):
+    # Глубина каждого токена за O(n): каждый узел проходится один раз, корень - токен, ссылающийся на себя
+    n = len(heads)
+    depths = [-1] * n
+    for start in range(n):
+        path = []
+        node = start
+        while depths[node] == -1:
+            depths[node] = -2  # Узел на текущем пути, защищает от циклов
+            path.append(node)
+            head = heads[node]
+            if head == node or not 0 <= head < n:
+                depths[node] = 0
+                path.pop()
+                break
+            node = head
+        depth = max(depths[node], 0)
+        for node in reversed(path):
+            depth += 1
+            depths[node] = depth
+    # По горизонтали слова стоят в порядке текста, по вертикали - по глубине в дереве
+    return list(range(n)), depths
+
+
+def _sentence_tree_figure(words):
+    xs, depths = layout_dependency_tree([word["head"] for word in words])
+    max_depth = max(depths, default=0)
+
+    width = max(4.0, 1.3 * len(words))
+    figure = _new_figure(figsize=(width, 1.5 + 1.2 * (max_depth + 1)))
+    ax = figure.subplots()
+
+    for word, x, depth in zip(words, xs, depths):
+        head = word["head"]
+        if head != x and 0 <= head < len(words):
+            ax.annotate('', xy=(x, -depth), xytext=(xs[head], -depths[head]),
+                        arrowprops=dict(arrowstyle='-|>', color='gray', shrinkA=14, shrinkB=14))
+
+    for word, x, depth in zip(words, xs, depths):
+        ax.text(x, -depth, f"{word['text']}\n({word['dep']})", ha='center', va='center', fontsize=10,
+                bbox=dict(boxstyle='round', facecolor='lightblue', edgecolor='steelblue'))
+
+    ax.set_xlim(-0.8, len(words) - 0.2)
+    ax.set_ylim(-max_depth - 0.6, 0.6)
+    ax.axis('off')
+    figure.tight_layout()
+    return figure
+
+
+def draw_sentence_tree(words):
+    figure = _sentence_tree_figure(words)
+    # Длинные предложения сжимаются, чтобы картинка оставалась в пределах ограничений Telegram
+    width, _ = figure.get_size_inches()
+    buffer = BytesIO()
+    figure.savefig(buffer, format='png', dpi=min(100, 8000 / width))
+    return buffer.getvalue()
+
+
+def draw_sentence_trees_pdf(sentences):
+    from matplotlib.backends.backend_pdf import PdfPages
+
+    buffer = BytesIO()
+    with PdfPages(buffer) as pdf:
+        for words in sentences:
+            pdf.savefig(_sentence_tree_figure(words))
+    return buffer.getvalue()
@@ -0,0 +1,68 @@
+import asyncio
+import os
+import re
+import tempfile
+
+EXTRACT_CONCURRENCY = int(os.getenv("EXTRACT_CONCURRENCY", 2))
+ANTIWORD_TIMEOUT = float(os.getenv("ANTIWORD_TIMEOUT", 60))
+
+# Ограничивает число одновременных конвертаций .doc/.docx
+_conversions = asyncio.Semaphore(EXTRACT_CONCURRENCY)
+
+# Абзацы разделяет пустая строка, одиночный перевод строки - просто перенос внутри абзаца
+PARAGRAPH_BREAK = re.compile(r'\n\s*\n')
+
+
+def _normalize(paragraphs):
+    for paragraph in paragraphs:
+        paragraph = ' '.join(paragraph.split())
+        if paragraph:
+            yield paragraph
+
+
+def split_paragraphs(text):
+    return _normalize(PARAGRAPH_BREAK.split(text))
+
+
+def _write_file(file, data):
+    file.write(data)
+    file.flush()
+
+
+async def _antiword(data):
+    # antiword перемещается по контейнеру OLE внутри файла, поэтому документ передаётся временным файлом, а не через
+    # stdin. -w 0 - абзац в одну строку
+    with tempfile.NamedTemporaryFile(suffix='.doc') as document:
+        await asyncio.to_thread(_write_file, document, data)
+        process = await asyncio.create_subprocess_exec(
+            'antiword', '-m', 'UTF-8.txt', '-w', '0', document.name,
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+        )
+        try:
+            stdout, stderr = await asyncio.wait_for(process.communicate(), ANTIWORD_TIMEOUT)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            raise Exception("Превышено время чтения .doc файла")
+
+    if process.returncode != 0:
+        raise Exception(f"Ошибка при чтении .doc файла: {stderr.decode('utf-8', errors='replace')}")
+    return stdout.decode('utf-8').splitlines()
+
+
+async def extract_paragraphs(file_content, file_extension):
+    if file_extension == '.txt':
+        # Декодируем сразу, чтобы ошибка кодировки всплыла до начала разбора
+        return split_paragraphs(file_content.getvalue().decode('utf-8'))
+
+    async with _conversions:
+        if file_extension == '.docx':
+            from docx import Document
+
+            document = await asyncio.to_thread(Document, file_content)
+            return _normalize(paragraph.text for paragraph in document.paragraphs)
+
+        if file_extension == '.doc':
+            return _normalize(await _antiword(file_content.getvalue()))
+
+    raise Exception(f"Неподдерживаемый формат файла: {file_extension}")
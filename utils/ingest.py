@@ -0,0 +1,146 @@
+import asyncio
+import os
+import re
+from collections import deque
+from uuid import uuid4
+
+from db import vocab
+from db.bulk import ParsedRows, write_parsed_rows
+from db.packed import pack_sentence
+from db.rollups import RollupDeltas, apply_rollup_deltas
+from utils.annotate import load_dep_formats_by_code, render_parsed_html
+from utils.extract import split_paragraphs
+from utils.metrics import stage
+from utils.parse_cache import parse_cache
+from utils.parser_client import parser
+
+INGEST_CHUNK_CHARS = int(os.getenv("INGEST_CHUNK_CHARS", 100000))
+INGEST_FLUSH_SENTENCES = int(os.getenv("INGEST_FLUSH_SENTENCES", 2000))
+
+SENTENCE_END = re.compile(r'(?<=[.!?…])\s+')
+
+
+def _split_long(paragraph, chunk_chars):
+    # Абзац длиннее чанка режем по концам предложений, а сверхдлинные предложения - по пробелам
+    for sentence in SENTENCE_END.split(paragraph):
+        while len(sentence) > chunk_chars:
+            cut = sentence.rfind(' ', 0, chunk_chars)
+            if cut <= 0:
+                cut = chunk_chars
+            yield sentence[:cut]
+            sentence = sentence[cut:].lstrip()
+        if sentence:
+            yield sentence
+
+
+def split_into_chunks(paragraphs, chunk_chars=INGEST_CHUNK_CHARS):
+    # Абзацы идут в чанке по одному на строку, пробелы и переносы строк внутри абзаца схлопываются, как раньше
+    # во всём тексте, поэтому жёстко перенесённые строки .txt не становятся отдельными предложениями
+    if isinstance(paragraphs, str):
+        paragraphs = split_paragraphs(paragraphs)
+
+    chunk = []
+    size = 0
+    for paragraph in paragraphs:
+        paragraph = ' '.join(paragraph.split())
+        if not paragraph:
+            continue
+        for piece in _split_long(paragraph, chunk_chars) if len(paragraph) > chunk_chars else (paragraph,):
+            if chunk and size + len(piece) > chunk_chars:
+                yield '\n'.join(chunk)
+                chunk, size = [], 0
+            chunk.append(piece)
+            size += len(piece) + 1
+    if chunk:
+        yield '\n'.join(chunk)
+
+
+async def parse_chunks(chunks, max_in_flight=None):
+    # Держим в работе не больше max_in_flight чанков, чтобы память не зависела от размера документа
+    max_in_flight = max_in_flight or parser.workers
+    pending = deque()
+    try:
+        for chunk in chunks:
+            pending.append((chunk, asyncio.ensure_future(parse_cache.parse(chunk))))
+            if len(pending) >= max_in_flight:
+                chunk, task = pending.popleft()
+                yield chunk, await task
+        while pending:
+            chunk, task = pending.popleft()
+            yield chunk, await task
+    finally:
+        for _, task in pending:
+            task.cancel()
+
+
+class TextWriter:
+    def __init__(self, session, text_id, user_id, time, saved_sentences=0):
+        self.session = session
+        self.text_id = text_id
+        self.user_id = user_id
+        self.time = time
+        self.sentence_number = 0
+        self.token_offset = 0  # Номера токенов продолжаются между чанками
+        # Повторная попытка пропускает предложения, уже записанные прерванной: разбор того же текста той же моделью
+        # даёт те же предложения, а каждая порция фиксируется вместе со своими счётчиками
+        self.saved_sentences = saved_sentences
+        self.file_counted = saved_sentences > 0
+        self.dep_formats = None
+        self.sentences = []
+
+    @property
+    def pending(self):
+        return len(self.sentences)
+
+    def add(self, sentences):
+        tokens_in_chunk = 0
+        for sent in sentences:
+            self.sentence_number += 1
+            tokens_in_chunk += len(sent.tokens)
+            if self.sentence_number <= self.saved_sentences:
+                continue
+            tokens = [token._replace(i=token.i + self.token_offset, head=token.head + self.token_offset)
+                      for token in sent.tokens]
+            self.sentences.append((self.sentence_number, sent._replace(tokens=tokens)))
+        self.token_offset += tokens_in_chunk
+
+    async def flush(self):
+        if not self.sentences:
+            return
+
+        session = self.session
+        tokens = [token for _, sent in self.sentences for token in sent.tokens]
+        form_ids = await vocab.forms.intern(session, (token.text for token in tokens))
+        lemma_ids = await vocab.lemmas.intern(session, (token.lemma for token in tokens))
+        pos_ids = await vocab.pos_tags.intern(session, (token.pos for token in tokens))
+        dep_ids = await vocab.dep_tags.intern(session, (token.dep for token in tokens))
+        # Разметка для кнопки «Текст» строится один раз здесь, а не при каждом просмотре
+        if self.dep_formats is None:
+            self.dep_formats = await load_dep_formats_by_code(session)
+
+        rows = ParsedRows()
+        deltas = RollupDeltas()
+        for sentence_number, sent in self.sentences:
+            sentence_id = uuid4()
+            rows.sentences.append((sentence_id, sent.text, self.user_id,
+                                   *pack_sentence(sent.tokens, pos_ids, dep_ids, lemma_ids),
+                                   render_parsed_html(sent.tokens, self.dep_formats)))
+            rows.sentence_to_text.append((sentence_id, self.text_id, sentence_number, self.time))
+
+            for token in sent.tokens:
+                rows.tokens.append((sentence_id, token.i, form_ids[token.text], lemma_ids[token.lemma],
+                                    pos_ids[token.pos], dep_ids[token.dep], token.head, self.time))
+
+            deltas.add_sentence(self.user_id, self.time.date(), sent.tokens, pos_ids, dep_ids, lemma_ids)
+
+        # Файл засчитывается в таблицу лидеров один раз, с первой порцией предложений
+        deltas.touch(self.user_id, self.time)
+        if not self.file_counted:
+            deltas.add_file(self.user_id, self.time)
+            self.file_counted = True
+
+        with stage('db_write'):
+            await write_parsed_rows(session, rows)
+            await apply_rollup_deltas(session, deltas)
+            await session.commit()
+        self.sentences = []
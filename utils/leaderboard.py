@@ -0,0 +1,16 @@
+from datetime import datetime, timezone
+
+from db import queries
+from db.rollups import LEADERBOARD_PERIODS, bucket_start
+
+PERIOD_TITLES = {'week': 'за неделю', 'month': 'за месяц', 'all': 'за всё время'}
+
+
+async def load_leaderboard(session, period='all', limit=10):
+    if period in LEADERBOARD_PERIODS:
+        result = await session.execute(queries.LEADERBOARD_PERIOD, {
+            "period": period, "bucket_start": bucket_start(period, datetime.now(timezone.utc).date()), "limit": limit,
+        })
+    else:
+        result = await session.execute(queries.LEADERBOARD_ALL, {"limit": limit})
+    return result.fetchall()
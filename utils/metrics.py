@@ -0,0 +1,100 @@
+import logging
+import os
+import re
+import time
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, Message
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+METRICS_ADDR = os.getenv("METRICS_ADDR", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", 9000))  # 0 - не поднимать endpoint
+
+HANDLER_SECONDS = Histogram('bot_handler_seconds', 'Время обработки сообщений и нажатий кнопок',
+                            ['handler', 'status'])
+SQL_SECONDS = Histogram('db_query_seconds', 'Время выполнения SQL-запросов', ['query'])
+SQL_ROWS = Histogram('db_query_rows', 'Число строк, возвращённых или изменённых запросом', ['query'],
+                     buckets=(1, 10, 100, 1000, 10000, 100000, 1000000))
+STAGE_SECONDS = Histogram('pipeline_stage_seconds', 'Время этапов разбора и записи', ['stage'])
+RENDER_SECONDS = Histogram('chart_render_seconds', 'Время рисования графиков и деревьев зависимостей', ['chart'])
+INGEST_JOBS = Gauge('ingest_jobs', 'Задачи загрузки в очереди по статусам', ['status'])
+INGEST_JOB_RESULTS = Counter('ingest_job_results', 'Завершённые попытки задач загрузки', ['result'])
+PARSER_IN_FLIGHT = Gauge('parser_in_flight', 'Пакеты текстов, отправленные в пул разбора и ещё не разобранные')
+PARSER_QUEUE_DEPTH = Gauge('parser_queue_depth', 'Пакеты, которые ждут свободного воркера пула разбора')
+PARSER_BATCH_SIZE = Histogram('parser_batch_size', 'Число текстов в одном вызове nlp.pipe сервиса разбора',
+                              buckets=(1, 2, 4, 8, 16, 32, 64, 128))
+PARSER_QUEUE_SECONDS = Histogram('parser_queue_seconds', 'Ожидание текста в очереди сервиса разбора до начала разбора',
+                                 buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10))
+PARSE_CACHE_LOOKUPS = Counter('parse_cache_lookups', 'Поиск абзацев в кэше разборов: memory, db или miss', ['result'])
+PARSE_CACHE_TOKENS_SAVED = Counter('parse_cache_tokens_saved', 'Токены, которые не пришлось разбирать благодаря кэшу')
+STARTUP_SECONDS = Gauge('bot_startup_seconds', 'Время от запуска процесса до этапа старта', ['phase'])
+
+STATEMENT_TABLE = re.compile(r'\b(?:from|into|update|copy)\s+"?(\w+)', re.IGNORECASE)
+
+
+def stage(name):
+    # with stage('parse'): ... - замер этапа в pipeline_stage_seconds
+    return STAGE_SECONDS.labels(name).time()
+
+
+def query_name(statement, execution_options):
+    # Именованные запросы помечаются execution_options(query_name=...), остальные - глаголом и первой таблицей
+    name = execution_options.get('query_name')
+    if name:
+        return name
+    verb = statement.lstrip().split(None, 1)[0].lower() if statement.strip() else 'unknown'
+    match = STATEMENT_TABLE.search(statement)
+    return f"{verb}:{match.group(1).lower()}" if match else verb
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    name = query_name(statement, context.execution_options)
+    SQL_SECONDS.labels(name).observe(time.perf_counter() - context._metrics_started)
+    if cursor.rowcount is not None and cursor.rowcount >= 0:
+        SQL_ROWS.labels(name).observe(cursor.rowcount)
+
+
+def instrument_engine(engine):
+    sync_engine = getattr(engine, 'sync_engine', engine)
+    if not event.contains(sync_engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(sync_engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(sync_engine, 'after_cursor_execute', _after_cursor_execute)
+
+
+def handler_name(event):
+    # Метка должна быть из небольшого набора значений: без аргументов команд и id в callback_data
+    if isinstance(event, Message):
+        if event.text and event.text.startswith('/'):
+            return event.text.split(None, 1)[0].split('@', 1)[0]
+        return f"message:{event.content_type}"
+    if isinstance(event, CallbackQuery):
+        parts = (event.data or '').split(':')
+        return ':'.join(parts[:2]) if len(parts) > 2 else parts[0]
+    return type(event).__name__
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    async def __call__(self, handler, event, data):
+        started = time.perf_counter()
+        status = 'ok'
+        try:
+            return await handler(event, data)
+        except Exception:
+            status = 'error'
+            raise
+        finally:
+            HANDLER_SECONDS.labels(handler_name(event), status).observe(time.perf_counter() - started)
+
+
+def start_metrics_server(addr=METRICS_ADDR, port=METRICS_PORT):
+    if not port:
+        return
+    start_http_server(port, addr=addr)
+    logger.info("Метрики Prometheus доступны на http://%s:%d/metrics", addr, port)
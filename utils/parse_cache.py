@@ -0,0 +1,126 @@
+import hashlib
+import logging
+import os
+import re
+import unicodedata
+from collections import OrderedDict
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+
+from db.bulk import MAX_QUERY_PARAMS
+from db.database import engine, ParseCacheEntry
+from utils.metrics import PARSE_CACHE_LOOKUPS, PARSE_CACHE_TOKENS_SAVED
+from utils.parser_client import parser
+from utils.parser_pool import decode_sentences, encode_sentences
+
+logger = logging.getLogger(__name__)
+
+PARSE_CACHE_ENABLED = os.getenv("PARSE_CACHE", "1") == "1"
+PARSE_CACHE_SIZE = int(os.getenv("PARSE_CACHE_SIZE", 100000))
+
+# Чанк режется только на абзацы: граница абзаца - граница предложения и для spaCy, а резать по точкам нельзя,
+# иначе инициалы и сокращения («А. С. Пушкин», «т. е.») разбирались бы как отдельные предложения
+SEGMENT_BOUNDARY = re.compile(r'\n+')
+
+
+def split_segments(text):
+    return [segment for segment in SEGMENT_BOUNDARY.split(text) if segment.strip()]
+
+
+def join_segments(parses):
+    # Склеиваем разборы сегментов, сдвигая номера токенов так, будто чанк разбирался целиком
+    result = []
+    offset = 0
+    for sentences in parses:
+        for sent in sentences:
+            tokens = [token._replace(i=token.i + offset, head=token.head + offset) for token in sent.tokens]
+            result.append(sent._replace(tokens=tokens))
+            offset += len(tokens)
+    return result
+
+
+def segment_key(segment, model):
+    # Разборы разных моделей не смешиваются, отключённые компоненты на сохраняемые поля не влияют
+    normalized = ' '.join(unicodedata.normalize('NFC', segment).split())
+    return hashlib.blake2b(f"{model}\0{normalized}".encode('utf-8'), digest_size=16).digest()
+
+
+class ParseCache:
+    def __init__(self, max_size=PARSE_CACHE_SIZE):
+        self.max_size = max_size
+        self._items = OrderedDict()
+
+    def _remember(self, key, sentences):
+        self._items[key] = sentences
+        self._items.move_to_end(key)
+        if len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+    async def _load(self, keys):
+        loaded = {}
+        async with engine.connect() as conn:
+            for start in range(0, len(keys), MAX_QUERY_PARAMS):
+                result = await conn.execute(select(ParseCacheEntry.hash, ParseCacheEntry.parse)
+                                            .where(ParseCacheEntry.hash.in_(keys[start:start + MAX_QUERY_PARAMS])))
+                loaded.update((key, decode_sentences(parse)) for key, parse in result)
+        return loaded
+
+    async def _store(self, entries):
+        # Два параметра на запись: хэш и разбор
+        chunk_size = MAX_QUERY_PARAMS // 2
+        async with engine.begin() as conn:
+            for start in range(0, len(entries), chunk_size):
+                await conn.execute(insert(ParseCacheEntry)
+                                   .values([{"hash": key, "parse": encode_sentences(sentences)}
+                                            for key, sentences in entries[start:start + chunk_size]])
+                                   .on_conflict_do_nothing(index_elements=['hash']))
+
+    async def parse(self, text):
+        if not PARSE_CACHE_ENABLED:
+            # Абзацы разбираются по отдельности и без кэша, чтобы границы предложений не зависели от PARSE_CACHE
+            return join_segments(await parser.parse_many(split_segments(text)))
+
+        if parser.model_name is None:
+            # Модель сервиса разбора становится известна после первого обращения к нему
+            await parser.start()
+        segments = split_segments(text)
+        keys = [segment_key(segment, parser.model_name) for segment in segments]
+
+        parsed = {}
+        missing = {}
+        for key, segment in zip(keys, segments):
+            if key in parsed or key in missing:
+                continue
+            sentences = self._items.get(key)
+            if sentences is None:
+                missing[key] = segment
+            else:
+                self._items.move_to_end(key)
+                parsed[key] = sentences
+                PARSE_CACHE_LOOKUPS.labels('memory').inc()
+
+        if missing:
+            for key, sentences in (await self._load(list(missing))).items():
+                parsed[key] = sentences
+                self._remember(key, sentences)
+                del missing[key]
+                PARSE_CACHE_LOOKUPS.labels('db').inc()
+
+        if missing:
+            # Промахи одного чанка разбираются одним вызовом nlp.pipe
+            results = await parser.parse_many(missing.values())
+            entries = list(zip(missing, results))
+            for key, sentences in entries:
+                parsed[key] = sentences
+                self._remember(key, sentences)
+            PARSE_CACHE_LOOKUPS.labels('miss').inc(len(entries))
+            await self._store(entries)
+
+        for key in keys:
+            if key not in missing:
+                PARSE_CACHE_TOKENS_SAVED.inc(sum(len(sent.tokens) for sent in parsed[key]))
+        return join_segments(parsed[key] for key in keys)
+
+
+parse_cache = ParseCache()
@@ -0,0 +1,61 @@
+import logging
+import os
+
+import aiohttp
+
+from utils.metrics import stage
+from utils.parser_pool import decode_sentences, parser_pool
+
+logger = logging.getLogger(__name__)
+
+# Адрес сервиса разбора (python -m utils.parser_service), без него модель грузится в процессе бота
+PARSER_URL = os.getenv("PARSER_URL")
+PARSER_REMOTE_IN_FLIGHT = int(os.getenv("PARSER_REMOTE_IN_FLIGHT", 4))
+PARSER_TIMEOUT = int(os.getenv("PARSER_TIMEOUT", 300))
+
+
+class RemoteParser:
+    def __init__(self, url, workers=PARSER_REMOTE_IN_FLIGHT, timeout=PARSER_TIMEOUT):
+        self.url = url.rstrip('/')
+        self.workers = workers  # Сколько чанков одного текста отправлять, не дожидаясь ответа
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.model_name = None  # Модель сервиса, сообщается им при старте
+        self._session = None
+
+    def _get_session(self):
+        if self._session is None:
+            self._session = aiohttp.ClientSession(timeout=self.timeout)
+        return self._session
+
+    async def start(self):
+        async with self._get_session().get(f"{self.url}/health") as response:
+            response.raise_for_status()
+            health = await response.json()
+        self.model_name = health["model"]
+        logger.info("Разбор выполняет сервис %s, профиль %s", self.url, health["profile"])
+
+    async def parse_many(self, texts):
+        with stage('parse'):
+            async with self._get_session().post(f"{self.url}/parse", json={"texts": list(texts)}) as response:
+                response.raise_for_status()
+                result = await response.json()
+        return [decode_sentences(parse) for parse in result["parses"]]
+
+    async def parse(self, text):
+        result = await self.parse_many([text])
+        return result[0]
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+parser = RemoteParser(PARSER_URL) if PARSER_URL else parser_pool
+
+
+async def shutdown_parser():
+    if parser is parser_pool:
+        parser_pool.shutdown()
+    else:
+        await parser.close()
@@ -0,0 +1,173 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple
+
+from utils.metrics import PARSER_IN_FLIGHT, PARSER_QUEUE_DEPTH, stage
+
+
+class ParseProfile(NamedTuple):
+    model: str
+    exclude: tuple  # Компоненты конвейера, которые не загружаются вовсе
+    batch_size: int
+
+
+# Боту нужны только части речи, зависимости, леммы и границы предложений, поэтому NER не загружается.
+# full - полный конвейер маленькой модели, accurate - эталон для сравнения в bench.profiles
+PARSE_PROFILES = {
+    'fast': ParseProfile('ru_core_news_sm', ('ner',), 64),
+    'full': ParseProfile('ru_core_news_sm', (), 64),
+    'balanced': ParseProfile('ru_core_news_md', ('ner',), 32),
+    'accurate': ParseProfile('ru_core_news_lg', ('ner',), 32),
+}
+
+PARSE_PROFILE = os.getenv("PARSE_PROFILE", "fast")
+SPACY_MODEL = os.getenv("SPACY_MODEL")  # Переопределяет модель профиля PARSE_PROFILE
+PARSER_WORKERS = int(os.getenv("PARSER_WORKERS", os.cpu_count() or 1))
+PARSER_BATCH_SIZE = os.getenv("PARSER_BATCH_SIZE")  # Переопределяет размер пачки профиля PARSE_PROFILE
+PARSER_N_PROCESS = int(os.getenv("PARSER_N_PROCESS", 1))
+NLP_MAX_LENGTH = 3000000
+
+
+def resolve_profile(name=PARSE_PROFILE):
+    if name not in PARSE_PROFILES:
+        raise ValueError(f"Неизвестный профиль разбора {name}, доступны: {', '.join(PARSE_PROFILES)}")
+    profile = PARSE_PROFILES[name]
+    # Переопределения относятся только к рабочему профилю: остальные, в том числе эталон в bench.profiles,
+    # должны разбирать своей моделью, иначе сравнение профилей сравнивает модель саму с собой
+    if name != PARSE_PROFILE:
+        return profile
+    if SPACY_MODEL:
+        profile = profile._replace(model=SPACY_MODEL)
+    if PARSER_BATCH_SIZE:
+        profile = profile._replace(batch_size=int(PARSER_BATCH_SIZE))
+    return profile
+
+
+class ParsedToken(NamedTuple):
+    text: str
+    pos: str
+    dep: str
+    lemma: str
+    head: int
+    i: int
+    offset: int  # Смещение начала токена в тексте предложения
+
+
+class ParsedSentence(NamedTuple):
+    text: str
+    tokens: list
+
+
+def encode_sentences(sentences):
+    # Компактный вид разбора для JSON: в кэше разборов и в ответах сервиса разбора
+    return [[sent.text, [list(token) for token in sent.tokens]] for sent in sentences]
+
+
+def decode_sentences(parse):
+    return [ParsedSentence(text, [ParsedToken(*token) for token in tokens]) for text, tokens in parse]
+
+
+# Модель загружается один раз при старте каждого воркера
+_nlp = None
+
+
+def _init_worker(model_name, exclude, max_length):
+    global _nlp
+    import spacy
+
+    _nlp = spacy.load(model_name, exclude=list(exclude))
+    _nlp.max_length = max_length
+
+
+def _warmup():
+    return os.getpid()
+
+
+def serialize_doc(doc):
+    # Пробельные токены (переводы строк между абзацами) не сохраняются, номера остальных токенов идут подряд
+    index = {}
+    for token in doc:
+        if not token.is_space:
+            index[token.i] = len(index)
+
+    sentences = []
+    for sent in doc.sents:
+        words = [token for token in sent if not token.is_space]
+        if not words:
+            continue
+        start = words[0].idx
+        tokens = []
+        for token in words:
+            head = token.head
+            while head.is_space and head.head.i != head.i:
+                head = head.head
+            # Однородные члены получают роль главного слова
+            dep = token.head.dep_ if token.dep_ == 'conj' else token.dep_
+            tokens.append(ParsedToken(token.text, token.pos_, dep, token.lemma_, index.get(head.i, index[token.i]),
+                                      index[token.i], token.idx - start))
+        sentences.append(ParsedSentence(doc.text[start:words[-1].idx + len(words[-1])], tokens))
+    return sentences
+
+
+def _parse_batch(texts, batch_size, n_process):
+    return [serialize_doc(doc) for doc in _nlp.pipe(texts, batch_size=batch_size, n_process=n_process)]
+
+
+class ParserPool:
+    def __init__(self, profile_name=PARSE_PROFILE, workers=PARSER_WORKERS, n_process=PARSER_N_PROCESS):
+        profile = resolve_profile(profile_name)
+        self.profile_name = profile_name
+        self.workers = workers
+        self.batch_size = profile.batch_size
+        self.n_process = n_process
+        self.model_name = profile.model
+        self.exclude = profile.exclude
+        self._executor = None
+        self._in_flight = 0
+
+    def _update_load(self, delta):
+        self._in_flight += delta
+        PARSER_IN_FLIGHT.set(self._in_flight)
+        # Сверх числа воркеров пакеты ждут в очереди исполнителя
+        PARSER_QUEUE_DEPTH.set(max(0, self._in_flight - self.workers))
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                # fork копировал бы потоки и блокировки event loop, воркеры запускаются из чистого процесса
+                mp_context=multiprocessing.get_context("forkserver"),
+                initializer=_init_worker,
+                initargs=(self.model_name, self.exclude, NLP_MAX_LENGTH),
+            )
+        return self._executor
+
+    async def start(self):
+        # Прогреваем все воркеры, чтобы первая загрузка не пришлась на пользователя
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        await asyncio.gather(*(loop.run_in_executor(executor, _warmup) for _ in range(self.workers)))
+
+    async def parse_many(self, texts):
+        loop = asyncio.get_running_loop()
+        self._update_load(1)
+        try:
+            with stage('parse'):
+                return await loop.run_in_executor(self._get_executor(), _parse_batch, list(texts), self.batch_size,
+                                                  self.n_process)
+        finally:
+            self._update_load(-1)
+
+    async def parse(self, text):
+        result = await self.parse_many([text])
+        return result[0]
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+parser_pool = ParserPool()
@@ -0,0 +1,131 @@
+import asyncio
+import logging
+import os
+import time
+
+from aiohttp import web
+
+from utils.metrics import PARSER_BATCH_SIZE, PARSER_QUEUE_SECONDS, start_metrics_server
+from utils.parser_pool import encode_sentences, parser_pool
+
+logger = logging.getLogger(__name__)
+
+PARSER_SERVICE_HOST = os.getenv("PARSER_SERVICE_HOST", "127.0.0.1")
+PARSER_SERVICE_PORT = int(os.getenv("PARSER_SERVICE_PORT", 8090))
+# Окно сбора: тексты от разных запросов и экземпляров бота ждут до PARSER_MAX_WAIT_MS
+# или пока не наберётся PARSER_MAX_BATCH, и разбираются одним nlp.pipe
+PARSER_MAX_BATCH = int(os.getenv("PARSER_MAX_BATCH", 32))
+PARSER_MAX_WAIT_MS = float(os.getenv("PARSER_MAX_WAIT_MS", 10))
+
+
+class MicroBatcher:
+    def __init__(self, pool, max_batch=PARSER_MAX_BATCH, max_wait=PARSER_MAX_WAIT_MS / 1000):
+        self.pool = pool
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue = asyncio.Queue()
+        # Пачка уходит в работу только при свободном воркере, пока все заняты, в очереди копится следующая
+        self._slots = asyncio.Semaphore(pool.workers)
+        self._task = None
+        self._running = set()
+
+    def start(self):
+        self._task = asyncio.create_task(self._collect())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def parse(self, text):
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, future, time.perf_counter()))
+        return await future
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._slots.acquire()
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            task = asyncio.create_task(self._run(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch):
+        started = time.perf_counter()
+        PARSER_BATCH_SIZE.observe(len(batch))
+        for _, _, queued in batch:
+            PARSER_QUEUE_SECONDS.observe(started - queued)
+        try:
+            results = await self.pool.parse_many(text for text, _, _ in batch)
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            for (_, future, _), sentences in zip(batch, results):
+                if not future.done():
+                    future.set_result(sentences)
+        finally:
+            self._slots.release()
+
+
+BATCHER = web.AppKey('batcher', MicroBatcher)
+
+
+async def handle_parse(request):
+    payload = await request.json()
+    texts = payload.get("texts")
+    if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+        raise web.HTTPBadRequest(text="Ожидается {\"texts\": [строки]}")
+
+    batcher = request.app[BATCHER]
+    parsed = await asyncio.gather(*(batcher.parse(text) for text in texts))
+    return web.json_response({"parses": [encode_sentences(sentences) for sentences in parsed]})
+
+
+async def handle_health(request):
+    return web.json_response({"profile": parser_pool.profile_name, "model": parser_pool.model_name,
+                              "workers": parser_pool.workers, "max_batch": PARSER_MAX_BATCH,
+                              "max_wait_ms": PARSER_MAX_WAIT_MS})
+
+
+async def _on_startup(app):
+    await parser_pool.start()
+    app[BATCHER].start()
+
+
+async def _on_cleanup(app):
+    await app[BATCHER].stop()
+    parser_pool.shutdown()
+
+
+def create_app():
+    app = web.Application(client_max_size=64 * 1024 * 1024)
+    app[BATCHER] = MicroBatcher(parser_pool)
+    app.router.add_post('/parse', handle_parse)
+    app.router.add_get('/health', handle_health)
+    app.on_startup.append(_on_startup)
+    app.on_cleanup.append(_on_cleanup)
+    return app
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    start_metrics_server()
+    logger.info("Сервис разбора слушает %s:%d, пачка до %d текстов, окно %.1f мс", PARSER_SERVICE_HOST,
+                PARSER_SERVICE_PORT, PARSER_MAX_BATCH, PARSER_MAX_WAIT_MS)
+    web.run_app(create_app(), host=PARSER_SERVICE_HOST, port=PARSER_SERVICE_PORT, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from utils.metrics import RENDER_SECONDS
+
+# thread - пул потоков в процессе бота, process - отдельные процессы для полного параллелизма
+RENDER_EXECUTOR = os.getenv("RENDER_EXECUTOR", "thread")
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", 4))
+
+
+class ChartRenderer:
+    def __init__(self, executor_kind=RENDER_EXECUTOR, workers=RENDER_WORKERS):
+        self.executor_kind = executor_kind
+        self.workers = workers
+        self._executor = None
+
+    def _get_executor(self):
+        if self._executor is None:
+            if self.executor_kind == "process":
+                # Как и у пула разбора, без fork: в процессе бота уже работают потоки и event loop
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context("forkserver"))
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="render")
+        return self._executor
+
+    async def render(self, name, draw, *args):
+        loop = asyncio.get_running_loop()
+        with RENDER_SECONDS.labels(name).time():
+            return await loop.run_in_executor(self._get_executor(), draw, *args)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+chart_renderer = ChartRenderer()
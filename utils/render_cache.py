@@ -0,0 +1,60 @@
+import os
+from collections import OrderedDict
+
+from sqlalchemy import text
+
+RENDER_CACHE_BYTES = int(os.getenv("RENDER_CACHE_BYTES", 64 * 1024 * 1024))
+
+
+class RenderCache:
+    def __init__(self, max_bytes=RENDER_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, key):
+        data = self._items.get(key)
+        if data is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._items.move_to_end(key)
+        return data
+
+    def put(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        old = self._items.pop(key, None)
+        if old is not None:
+            self.size -= len(old)
+        self._items[key] = data
+        self.size += len(data)
+        while self.size > self.max_bytes:
+            _, evicted = self._items.popitem(last=False)
+            self.size -= len(evicted)
+
+    def clear(self):
+        self._items.clear()
+        self.size = 0
+
+
+render_cache = RenderCache()
+
+
+# Версия данных растёт после каждой загрузки текста и входит в ключ кэша корпусных графиков
+async def get_data_version(session):
+    # До первого nextval last_value уже равен 1, поэтому без is_called версия не менялась бы после первой загрузки
+    result = await session.execute(text("select case when is_called then last_value else 0 end from data_version_seq")
+                                   .execution_options(query_name="data_version.get"))
+    return result.scalar()
+
+
+async def bump_data_version(session):
+    await session.execute(text("select nextval('data_version_seq')")
+                          .execution_options(query_name="data_version.bump"))
+    await session.commit()
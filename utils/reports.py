@@ -1,54 +1,83 @@
-import pandas as pd
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import text
+import asyncio
+import logging
+import time
+from io import BytesIO
 
+from db import queries
 from db.database import async_session
+from utils.render_cache import render_cache, get_data_version
+
+logger = logging.getLogger(__name__)
+
+
+class ReportStats:
+    def __init__(self):
+        self.rows = 0
+        self.elapsed = 0.0
+
+
+last_report_stats = ReportStats()
+
+
+async def _write_sheet(session, worksheet, header, query, header_format):
+    # constant_memory требует писать строки по порядку, поэтому строки идут прямо из серверного курсора
+    worksheet.write_row(0, 0, header, header_format)
+    row_number = 0
+    result = await session.stream(query)
+    async for row in result:
+        row_number += 1
+        worksheet.write_row(row_number, 0, row)
+    return row_number
+
+
+async def _build_report(session, stats):
+    import xlsxwriter
+
+    buffer = BytesIO()
+    workbook = xlsxwriter.Workbook(buffer, {'constant_memory': True})
+    format_header = workbook.add_format({'bold': True, 'bg_color': '#ADD8E6'})
+
+    sentences = workbook.add_worksheet('Sentences')
+    summary = workbook.add_worksheet('Summary')
+    words = workbook.add_worksheet('Word Frequency')
+
+    stats.rows += await _write_sheet(session, sentences, ['Sentence ID', 'Sentence Text', 'User', 'Word Count'],
+                                     queries.REPORT_SENTENCES, None)
+    users = await _write_sheet(session, summary, ['User', 'Total_Sentences', 'Avg_Word_Count'],
+                               queries.REPORT_SUMMARY, format_header)
+    stats.rows += users
+    stats.rows += await _write_sheet(session, words, ['Слово', 'Часть речи', 'Частота'], queries.REPORT_WORDS, None)
+
+    chart = workbook.add_chart({'type': 'column'})
+    chart.add_series({
+        'categories': ['Summary', 1, 0, users, 0],
+        'values': ['Summary', 1, 2, users, 2],
+        'name': 'Avg Word Count',
+    })
+    summary.insert_chart('E2', chart)
+
+    # Сборка zip-архива - синхронная и долгая, выносим её из event loop
+    await asyncio.to_thread(workbook.close)
+    return buffer.getvalue()
 
 
 async def generate_excel_report():
     async with async_session() as session:
-        sentence_data = await session.execute(text("""
-            SELECT s.sentence_id, s.text, u.user_name, COUNT(w.word_id) AS word_count
-            FROM sentence s
-            JOIN word_to_sentence wts ON s.sentence_id = wts.sentence_id
-            JOIN word w ON wts.word_id = w.word_id
-            JOIN user_info u ON s.user_id = u.user_id
-            GROUP BY s.sentence_id, s.text, u.user_name;
-        """))
-
-        sentences_df = pd.DataFrame(sentence_data.fetchall(),
-                                    columns=['Sentence ID', 'Sentence Text', 'User', 'Word Count'])
-
-        sentence_summary = sentences_df.groupby('User').agg(
-            Total_Sentences=('Sentence ID', 'count'),
-            Avg_Word_Count=('Word Count', 'mean')
-        ).reset_index()
-
-        word_data = await session.execute(text("""
-            SELECT w.text, w.pos, COUNT(*) as frequency
-            FROM word w
-            GROUP BY w.text, w.pos
-            ORDER BY frequency DESC;
-        """))
-
-        words_df = pd.DataFrame(word_data.fetchall(), columns=['Слово', 'Часть речи', 'Частота'])
-        with pd.ExcelWriter('report.xlsx', engine='xlsxwriter') as writer:
-            sentences_df.to_excel(writer, sheet_name='Sentences', index=False)
-            sentence_summary.to_excel(writer, sheet_name='Summary', index=False)
-            words_df.to_excel(writer, sheet_name='Word Frequency', index=False)
-
-            workbook = writer.book
-            worksheet = writer.sheets['Summary']
-
-            format_header = workbook.add_format({'bold': True, 'bg_color': '#ADD8E6'})
-            worksheet.set_row(0, None, format_header)
-
-            chart = workbook.add_chart({'type': 'column'})
-            chart.add_series({
-                'categories': ['Summary', 1, 0, len(sentence_summary), 0],
-                'values': ['Summary', 1, 2, len(sentence_summary), 2],
-                'name': 'Avg Word Count',
-            })
-            worksheet.insert_chart('E2', chart)
-
-        return "report.xlsx"
\ No newline at end of file
+        cache_key = ('report', await get_data_version(session))
+        report = render_cache.get(cache_key)
+        if report is not None:
+            return report
+
+        stats = ReportStats()
+        started = time.perf_counter()
+        report = await _build_report(session, stats)
+        stats.elapsed = time.perf_counter() - started
+
+    global last_report_stats
+    last_report_stats = stats
+    # Память отчета меряет бенчмарк (bench.run, сценарий report): в боте tracemalloc замедлил бы все аллокации,
+    # а пиковый RSS процесса отражает весь срок его жизни, а не сборку отчета
+    logger.info("Отчет Excel: %d строк, %.2f с", stats.rows, stats.elapsed)
+
+    render_cache.put(cache_key, report)
+    return report
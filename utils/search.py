@@ -0,0 +1,103 @@
+import html
+from typing import NamedTuple, Optional
+from uuid import UUID
+
+from db import queries
+from db.packed import unpack_sentence
+
+SEARCH_PAGE_SIZE = 10
+MESSAGE_LIMIT = 4000
+FIRST_PAGE = UUID(int=0)
+
+
+class SearchQuery(NamedTuple):
+    word: str
+    by_form: bool  # =слово ищет точную словоформу, иначе ищется лемма
+    value_id: int
+    pos_id: Optional[int] = None
+    dep_id: Optional[int] = None
+
+
+class SearchPage(NamedTuple):
+    lines: list
+    last_id: Optional[UUID]
+    has_more: bool
+
+
+async def parse_search(session, args):
+    # /search слово [pos:NOUN] [dep:nsubj], возвращает запрос или текст ошибки
+    parts = (args or '').split()
+    words = [part for part in parts if ':' not in part]
+    filters = dict(part.split(':', 1) for part in parts if ':' in part)
+    if len(words) != 1 or set(filters) - {'pos', 'dep'}:
+        return None, "Используй /search слово [pos:NOUN] [dep:nsubj], =слово ищет точную словоформу."
+
+    word = words[0]
+    by_form = word.startswith('=')
+    if by_form:
+        word = word[1:]
+        value_id = (await session.execute(queries.SEARCH_FORM, {"word": word})).scalar()
+    else:
+        word = word.lower()
+        value_id = (await session.execute(queries.SEARCH_LEMMA, {"word": word})).scalar()
+    if value_id is None:
+        return None, f"Слово «{word}» в корпусе не встречается."
+
+    pos_id = dep_id = None
+    if 'pos' in filters:
+        pos_id = (await session.execute(queries.SEARCH_POS, {"code": filters['pos'].upper()})).scalar()
+        if pos_id is None:
+            return None, f"Неизвестная часть речи: {filters['pos']}"
+    if 'dep' in filters:
+        dep_id = (await session.execute(queries.SEARCH_DEP, {"code": filters['dep'].lower()})).scalar()
+        if dep_id is None:
+            return None, f"Неизвестная синтаксическая роль: {filters['dep']}"
+
+    return SearchQuery(word, by_form, value_id, pos_id, dep_id), None
+
+
+def _matches(token, search):
+    if search.by_form and token.text != search.word:
+        return False
+    if not search.by_form and token.lemma_id != search.value_id:
+        return False
+    return (search.pos_id is None or token.pos_id == search.pos_id) and \
+        (search.dep_id is None or token.dep_id == search.dep_id)
+
+
+def highlight_sentence(row, search):
+    tokens = unpack_sentence(row)
+    if not tokens:
+        return html.escape(row.text)
+
+    parts = []
+    cursor = 0
+    for token, start, end in zip(tokens, row.token_starts, row.token_ends):
+        if _matches(token, search):
+            parts.append(html.escape(row.text[cursor:start]))
+            parts.append(f"<b>{html.escape(row.text[start:end])}</b>")
+            cursor = end
+    parts.append(html.escape(row.text[cursor:]))
+    return ''.join(parts)
+
+
+async def search_page(session, search, after=FIRST_PAGE, limit=SEARCH_PAGE_SIZE):
+    query = queries.SEARCH_BY_FORM if search.by_form else queries.SEARCH_BY_LEMMA
+    result = await session.execute(query, {"value_id": search.value_id, "pos_id": search.pos_id,
+                                           "dep_id": search.dep_id, "after": after, "limit": limit + 1})
+    rows = result.fetchall()
+
+    lines = []
+    size = 0
+    last_id = None
+    for row in rows[:limit]:
+        line = f"• {highlight_sentence(row, search)}"
+        # Следующая страница начнётся с первого не поместившегося предложения
+        if lines and size + len(line) > MESSAGE_LIMIT:
+            return SearchPage(lines, last_id, True)
+        if len(line) > MESSAGE_LIMIT:
+            line = f"• {html.escape(row.text[:MESSAGE_LIMIT // 2])}…"
+        lines.append(line)
+        size += len(line) + 1
+        last_id = row.sentence_id
+    return SearchPage(lines, last_id, len(rows) > limit)
@@ -0,0 +1,56 @@
+import argparse
+import logging
+import re
+import subprocess
+import sys
+import time
+
+# Модуль импортируется первым и без тяжёлых зависимостей, поэтому время считается почти от запуска процесса
+logger = logging.getLogger(__name__)
+
+_started = time.perf_counter()
+phases = {}
+
+IMPORT_TIME_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+
+def mark(phase):
+    from utils.metrics import STARTUP_SECONDS
+
+    phases[phase] = time.perf_counter() - _started
+    STARTUP_SECONDS.labels(phase).set(phases[phase])
+    logger.info("Старт: %s через %.2f с", phase, phases[phase])
+
+
+def import_times(module):
+    # Отдельный интерпретатор с -X importtime, чтобы уже загруженные модули не искажали замер
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            capture_output=True, text=True)
+    if result.returncode:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    times = []
+    for line in result.stderr.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if match:
+            own, cumulative, indent, name = match.groups()
+            times.append((name, int(own) / 1e6, int(cumulative) / 1e6, (len(indent) - 1) // 2))
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Время импорта модулей бота")
+    parser.add_argument('module', nargs='?', default='handler.bot')
+    parser.add_argument('--top', type=int, default=25)
+    args = parser.parse_args()
+
+    times = import_times(args.module)
+    total = next(cumulative for name, _, cumulative, _ in times if name == args.module)
+    print(f"Импорт {args.module}: {total:.3f} с\n")
+    print(f"{'модуль':<50} {'свой, с':>10} {'всего, с':>10}")
+    for name, own, cumulative, depth in sorted(times, key=lambda item: item[2], reverse=True)[:args.top]:
+        print(f"{'  ' * min(depth, 5) + name:<50} {own:>10.3f} {cumulative:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,340 +1,185 @@
-import matplotlib.pyplot as plt
-from aiogram.types import FSInputFile
-from sqlalchemy import text
+from aiogram.types import BufferedInputFile
 
+from db import queries
 from db.database import async_session
+from utils import charts
+from utils.render import chart_renderer
+from utils.render_cache import render_cache, get_data_version
 
 
-async def plot_part_of_speech_distribution(call):
+async def _send_chart(call, name, load, caption, empty_message):
+    # load читает данные и возвращает функцию рисования с аргументами, рисование идёт вне event loop
     async with async_session() as session:
-        result = await session.execute(text("""
-                    SELECT pm.description as pos, COUNT(*) AS count
-                    FROM word w
-                    join pos_mapping pm on pm.code = w.pos 
-                    where pos not in ('DET', 'ADP', 'PRT', 'INTJ', 'PART', 'PUNCT')
-                    GROUP BY 1;
-                """))
+        cache_key = (name, await get_data_version(session))
+        image = render_cache.get(cache_key)
+        if image is None:
+            chart = await load(session)
+            if chart is not None:
+                draw, *args = chart
+                image = await chart_renderer.render(name, draw, *args)
+                render_cache.put(cache_key, image)
+
+    if image:
+        photo_file = BufferedInputFile(image, filename=f'{name}.png')
+        await call.message.answer_photo(photo=photo_file, caption=caption)
+    else:
+        await call.message.answer(empty_message)
+
 
-        pos_data = result.fetchall()
+async def _load_part_of_speech_distribution(session):
+    result = await session.execute(queries.STATS_PART_OF_SPEECH_DISTRIBUTION)
+
+    pos_data = result.fetchall()
 
     if pos_data:
         labels = [row.pos for row in pos_data]
-        counts = [row.count for row in pos_data]
+        counts = [int(row.count) for row in pos_data]
 
-        fig, ax = plt.subplots()
-        ax.pie(counts, labels=labels, autopct='%1.1f%%', startangle=90)
-        ax.axis('equal')
+        return charts.draw_pie, labels, counts
 
-        plt.savefig('pos_distribution.png')
-        plt.close()
 
-        photo_file = FSInputFile('pos_distribution.png')
-        await call.message.answer_photo(photo=photo_file, caption="Процентное распределение частей речи в тексте")
-    else:
-        await call.message.answer("Нет данных для отображения распределения частей речи.")
+async def plot_part_of_speech_distribution(call):
+    await _send_chart(call, 'pos_distribution', _load_part_of_speech_distribution,
+                      "Процентное распределение частей речи в тексте",
+                      "Нет данных для отображения распределения частей речи.")
 
 
-async def plot_syntax_dependency_distribution(call):
-    async with async_session() as session:
+async def _load_syntax_dependency_distribution(session):
+    result = await session.execute(queries.STATS_SYNTAX_DEPENDENCY_DISTRIBUTION)
 
-        result = await session.execute(text("""
-            SELECT description as dep, COUNT(*) AS count
-            FROM word w
-            join dep_mapping dm on dm.code = w.dep 
-            where dm.description not in ('детерминант', 'знак препинания', 'маркер')
-            GROUP BY 1;
-        """))
+    dep_data = result.fetchall()
 
-        dep_data = result.fetchall()
+    if dep_data:
 
-        if dep_data:
+        labels = [row.dep for row in dep_data]
+        counts = [int(row.count) for row in dep_data]
 
-            labels = [row.dep for row in dep_data]
-            counts = [row.count for row in dep_data]
+        return charts.draw_pie, labels, counts
 
-            fig, ax = plt.subplots()
-            ax.pie(counts, labels=labels, autopct='%1.1f%%', startangle=90)
-            ax.axis('equal')
 
-            plt.savefig('dep_distribution.png')
-            plt.close()
+async def plot_syntax_dependency_distribution(call):
+    await _send_chart(call, 'dep_distribution', _load_syntax_dependency_distribution,
+                      "Процентное распределение синтаксических зависимостей",
+                      "Нет данных для отображения распределения синтаксических зависимостей.")
 
-            photo_file = FSInputFile('dep_distribution.png')
-            await call.message.answer_photo(photo=photo_file,
-                                            caption="Процентное распределение синтаксических зависимостей")
-        else:
-            await call.message.answer("Нет данных для отображения распределения синтаксических зависимостей.")
+
+async def _load_sentence_length_distribution(session):
+    result = await session.execute(queries.STATS_SENTENCE_LENGTH_DISTRIBUTION)
+
+    sentence_data = result.fetchall()
+
+    if sentence_data:
+
+        word_counts = [row.word_count for row in sentence_data]
+        sentence_counts = [row.sentence_count for row in sentence_data]
+
+        return charts.draw_sentence_length_histogram, word_counts, sentence_counts
 
 
 async def plot_sentence_length_distribution(call):
-    async with async_session() as session:
-        result = await session.execute(text("""
-            SELECT sentence_id, count(word_id) AS word_count
-            FROM word_to_sentence
-            group by 1
-        """))
+    await _send_chart(call, 'sentence_length_distribution', _load_sentence_length_distribution,
+                      "Распределение предложений по количеству слов",
+                      "Нет данных для отображения распределения длины предложений.")
 
-        sentence_data = result.fetchall()
 
-        if sentence_data:
+async def _load_top_10_frequent_words(session):
+    result = await session.execute(queries.STATS_TOP_10_FREQUENT_WORDS)
 
-            word_counts = [row.word_count for row in sentence_data]
+    word_data = result.fetchall()
 
-            plt.figure(figsize=(10, 6))
-            plt.hist(word_counts, bins=range(1, max(word_counts) + 2), edgecolor='black', alpha=0.7)
-            plt.title('Распределение предложений по количеству слов')
-            plt.xlabel('Количество слов в предложении')
-            plt.ylabel('Количество предложений')
+    if word_data:
 
-            plt.savefig('sentence_length_distribution.png')
-            plt.close()
+        words = [row.text for row in word_data]
+        word_counts = [int(row.word_count) for row in word_data]
 
-            photo_file = FSInputFile('sentence_length_distribution.png')
-            await call.message.answer_photo(photo=photo_file, caption="Распределение предложений по количеству слов")
-        else:
-            await call.message.answer("Нет данных для отображения распределения длины предложений.")
+        return charts.draw_top_words, words, word_counts
 
 
 async def plot_top_10_frequent_words(call):
-    async with async_session() as session:
+    await _send_chart(call, 'top_10_words', _load_top_10_frequent_words, "Топ-10 самых частых слов",
+                      "Нет данных для отображения топ-10 самых частых слов.")
+
 
-        result = await session.execute(text("""
-            SELECT lemma as text, COUNT(*) as word_count
-            FROM word
-            where pos not in ('DET', 'ADP', 'PRT', 'INTJ', 'PART', 'PUNCT', 'CONJ', 'X', 'PRON')
-                and dep not in ('dep', 'case', 'cc', 'mark', 'punct')
-            GROUP BY 1
-            ORDER BY 2 DESC
-            LIMIT 10;
-        """))
+async def _load_word_part_of_speech_vs_sentence_length(session):
+    result = await session.execute(queries.STATS_WORD_PART_OF_SPEECH_VS_SENTENCE_LENGTH)
 
-        word_data = result.fetchall()
+    data = result.fetchall()
 
-        if word_data:
+    if data:
 
-            words = [row.text for row in word_data]
-            word_counts = [row.word_count for row in word_data]
+        pos_categories = {}
+        for row in data:
+            sentence_length, pos, pos_count = row.sentence_length, row.pos, row.pos_count
+            if pos not in pos_categories:
+                pos_categories[pos] = {}
+            pos_categories[pos][sentence_length] = pos_categories[pos].get(sentence_length, 0) + pos_count
 
-            plt.figure(figsize=(10, 6))
-            plt.barh(words, word_counts, color='skyblue')
-            plt.xlabel('Количество повторений')
-            plt.title('Топ-10 самых частых слов')
+        return charts.draw_pos_vs_sentence_length, pos_categories
 
-            plt.gca().invert_yaxis()
 
-            plt.savefig('top_10_words.png')
-            plt.close()
+async def plot_word_part_of_speech_vs_sentence_length(call):
+    await _send_chart(call, 'pos_vs_sentence_length', _load_word_part_of_speech_vs_sentence_length,
+                      "Частота появления частей речи в зависимости от длины предложений",
+                      "Нет данных для отображения частот частей речи.")
 
-            photo_file = FSInputFile('top_10_words.png')
-            await call.message.answer_photo(photo=photo_file, caption="Топ-10 самых частых слов")
-        else:
-            await call.message.answer("Нет данных для отображения топ-10 самых частых слов.")
 
+async def _load_user_syntax_statistics(session):
+    result = await session.execute(queries.STATS_USER_SYNTAX_STATISTICS)
 
-async def plot_word_part_of_speech_vs_sentence_length(call):
-    async with async_session() as session:
+    data = result.fetchall()
+
+    if data:
+
+        user_data = {}
+        for row in data:
+            user_id, dep, dep_count = row.user_id, row.dep, row.dep_count
+            if user_id not in user_data:
+                user_data[user_id] = {}
+            user_data[user_id][dep] = int(dep_count)
 
-        result = await session.execute(text("""
-            WITH sentence_lengths AS (
-                SELECT
-                    s.sentence_id,
-                    count(distinct word_id) AS sentence_length
-                FROM word_to_sentence s
-                group by 1),
-            pos_frequency AS (
-                SELECT
-                    sl.sentence_length,
-                    w.pos,
-                    COUNT(*) AS pos_count
-                FROM word w
-                JOIN word_to_sentence ws ON w.word_id = ws.word_id
-                JOIN sentence_lengths sl ON ws.sentence_id = sl.sentence_id
-                GROUP BY sl.sentence_length, w.pos
-            )
-            SELECT sentence_length, pm.description as pos, pos_count
-            FROM pos_frequency ps
-            join pos_mapping pm on pm.code= ps.pos
-            ORDER BY 1, 2;
-        """))
-
-        data = result.fetchall()
-
-        if data:
-
-            pos_categories = {}
-            for row in data:
-                sentence_length, pos, pos_count = row.sentence_length, row.pos, row.pos_count
-                if pos not in pos_categories:
-                    pos_categories[pos] = {}
-                pos_categories[pos][sentence_length] = pos_categories[pos].get(sentence_length, 0) + pos_count
-
-            plt.figure(figsize=(12, 6))
-
-            for pos, freq_data in pos_categories.items():
-                lengths = sorted(freq_data.keys())
-                freqs = [freq_data[length] for length in lengths]
-                plt.plot(lengths, freqs, label=pos)
-
-            plt.xlabel('Длина предложения (в словах)')
-            plt.ylabel('Частота появления части речи')
-            plt.title('Частота появления частей речи в зависимости от длины предложений')
-            plt.legend(title='Часть речи')
-            plt.grid(True)
-
-            plt.savefig('pos_vs_sentence_length.png')
-            plt.close()
-
-            photo_file = FSInputFile('pos_vs_sentence_length.png')
-            await call.message.answer_photo(photo=photo_file,
-                                            caption="Частота появления частей речи в зависимости от длины предложений")
-        else:
-            await call.message.answer("Нет данных для отображения частот частей речи.")
+        return charts.draw_user_syntax_statistics, user_data
 
 
 async def plot_user_syntax_statistics(call):
-    async with async_session() as session:
+    await _send_chart(call, 'user_syntactic_structure_usage', _load_user_syntax_statistics,
+                      "Частота использования синтаксических конструкций пользователями",
+                      "Нет данных для отображения использования синтаксических конструкций.")
+
+
+async def _load_sentence_length_over_time(session):
+    result = await session.execute(queries.STATS_SENTENCE_LENGTH_OVER_TIME)
+
+    data = result.fetchall()
 
-        result = await session.execute(text("""
-            SELECT 
-                user_name as user_id, 
-                dm.description as dep, 
-                COUNT(*) AS dep_count
-            FROM word w
-            JOIN word_to_sentence ws USING(word_id)
-            join sentence s USING(sentence_id)
-            join user_info ui USING(user_id)
-            join dep_mapping dm on dm.code= w.dep
-            GROUP BY 
-                1, 2
-            ORDER BY 
-                1, 2;
-        """))
-
-        data = result.fetchall()
-
-        if data:
-
-            user_data = {}
-            for row in data:
-                user_id, dep, dep_count = row.user_id, row.dep, row.dep_count
-                if user_id not in user_data:
-                    user_data[user_id] = {}
-                user_data[user_id][dep] = dep_count
-
-            plt.figure(figsize=(14, 7))
-
-            for user_id, dep_freq in user_data.items():
-                deps = list(dep_freq.keys())
-                counts = list(dep_freq.values())
-                plt.bar(deps, counts, alpha=0.6, label=f'User {user_id}')
-
-            plt.xlabel('Синтаксические конструкции (dep)')
-            plt.ylabel('Частота использования')
-            plt.title('Частота использования синтаксических конструкций пользователями')
-            plt.legend(title='Пользователи', loc='upper right')
-            plt.xticks(rotation=45)
-            plt.grid(True)
-
-            plt.savefig('user_syntactic_structure_usage.png')
-            plt.close()
-
-            photo_file = FSInputFile('user_syntactic_structure_usage.png')
-            await call.message.answer_photo(photo=photo_file,
-                                            caption="Частота использования синтаксических конструкций пользователями")
-        else:
-            await call.message.answer("Нет данных для отображения использования синтаксических конструкций.")
+    if data:
+        dates = [row.date for row in data]
+        avg_lengths = [row.avg_sentence_length for row in data]
+
+        return charts.draw_sentence_length_over_time, dates, avg_lengths
 
 
 async def plot_sentence_length_over_time(call):
-    async with async_session() as session:
+    await _send_chart(call, 'sentence_length_over_time', _load_sentence_length_over_time,
+                      "Изменение средней длины предложений со временем",
+                      "Нет данных для отображения изменения длины предложений.")
 
-        result = await session.execute(text("""
-            select
-                date_trunc('day',
-                meta_timestamp) as date,
-                AVG(lenght) as avg_sentence_length
-            from
-                (select
-                    sentence_id,
-                    count(word_id) as lenght
-                from word_to_sentence
-                join sentence_to_text stt2 using(sentence_id)
-                join word w using(word_id)
-                where 1=1
-                    and dep not ilike 'punct'
-                    and pos not ilike 'punct'
-                group by sentence_id ) s
-            join sentence_to_text
-                    using(sentence_id)
-            group by date
-            order by date
-        """))
-
-        data = result.fetchall()
-
-        if data:
-            dates = [row.date for row in data]
-            avg_lengths = [row.avg_sentence_length for row in data]
-
-            plt.figure(figsize=(10, 6))
-            plt.plot(dates, avg_lengths, marker='o', linestyle='-', color='b')
-
-            plt.xlabel('Дата')
-            plt.ylabel('Средняя длина предложения (в словах)')
-            plt.title('Изменение средней длины предложений со временем')
-            plt.xticks(rotation=45)
-            plt.grid(True)
-
-            plt.savefig('sentence_length_over_time.png')
-            plt.close()
-
-            photo_file = FSInputFile('sentence_length_over_time.png')
-            await call.message.answer_photo(photo=photo_file, caption="Изменение средней длины предложений со временем")
-        else:
-            await call.message.answer("Нет данных для отображения изменения длины предложений.")
 
+async def _load_pos_dependency_correlation(session):
+    result = await session.execute(queries.STATS_POS_DEPENDENCY_CORRELATION)
 
-async def plot_pos_dependency_correlation(call):
-    import seaborn as sns
-    import pandas as pd
+    data = result.fetchall()
 
-    async with async_session() as session:
+    if data:
 
-        result = await session.execute(text("""
-            with raw as (SELECT pm.description as pos,
-                    dm.description as dep,
-                    COUNT(*)       AS frequency
-             FROM word w
-                      join pos_mapping pm on pm.code = w.pos
-                      join dep_mapping dm on dm.code = w.dep
-             where 1 = 1
-               and dm.description not in ('детерминант', 'знак препинания', 'маркер')
-               and pm.code not in ('DET', 'ADP', 'PRT', 'INTJ', 'PART', 'PUNCT')
-             GROUP BY 1, 2
-             ORDER BY 1, 2)
-            select pos, dep, round(frequency/sum(frequency) over (partition by pos), 3) as frequency from raw
-        """))
-
-        data = result.fetchall()
-
-        if data:
-
-            df = pd.DataFrame(data, columns=["pos", "dep", "frequency"])
-            df["frequency"] = pd.to_numeric(df["frequency"], errors='coerce')
-            pivot_table = df.pivot(index='pos', columns='dep', values='frequency').fillna(0)
-
-            plt.figure(figsize=(12, 8))
-            sns.heatmap(pivot_table, annot=False, cmap='coolwarm', linewidths=.5, vmin=0, vmax=1)
-
-            plt.title('Корреляция между частями речи и синтаксическими зависимостями')
-            plt.xlabel('Синтаксическая зависимость')
-            plt.ylabel('Часть речи')
-
-            plt.savefig('pos_dep_correlation.png')
-            plt.close()
-
-            photo_file = FSInputFile('pos_dep_correlation.png')
-            await call.message.answer_photo(photo=photo_file,
-                                            caption="Корреляция между частями речи и синтаксическими зависимостями")
-        else:
-            await call.message.answer("Нет данных для отображения корреляции.")
+        pos_labels = sorted({row.pos for row in data})
+        dep_labels = sorted({row.dep for row in data})
+        frequencies = {(row.pos, row.dep): float(row.frequency) for row in data}
+        matrix = [[frequencies.get((pos, dep), 0.0) for dep in dep_labels] for pos in pos_labels]
+
+        return charts.draw_pos_dependency_heatmap, pos_labels, dep_labels, matrix
+
+
+async def plot_pos_dependency_correlation(call):
+    await _send_chart(call, 'pos_dep_correlation', _load_pos_dependency_correlation,
+                      "Корреляция между частями речи и синтаксическими зависимостями",
+                      "Нет данных для отображения корреляции.")